@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -47,17 +48,23 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "django_recaptcha",
     "store",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "store.middleware.StaticAssetsMiddleware",
+    "store.middleware.MetricsMiddleware",
+    "store.middleware.QueryBudgetMiddleware",
+    "store.middleware.RateLimitMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    "store.middleware.CartCookieMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
@@ -96,6 +103,17 @@ DATABASES = {
 DATABASES["default"]["CONN_MAX_AGE"] = env.int("CONN_MAX_AGE", default=60)
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+}
+# The catalog version and the rate-limit counters must be seen by every worker process.
+if not DEBUG and any(cache["BACKEND"].endswith(".LocMemCache") for cache in CACHES.values()):
+    raise ImproperlyConfigured("CACHE_URL must point to a shared cache such as Redis or Memcached when DEBUG is off")
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -133,16 +151,127 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "store.storage.BundledManifestStaticFilesStorage"},
+}
+# Built into STATIC_ROOT/bundles/ by collectstatic.
+STATIC_BUNDLES = {
+    "base.css": ["css/base.css", "css/header.css", "css/footer.css"],
+    "index.css": ["css/index.css"],
+    "product.css": ["css/product.css"],
+    "cart.css": ["css/cart.css"],
+    "checkout.css": ["css/checkout.css"],
+    "base.js": ["js/navbar.js", "js/flash.js", "js/search.js"],
+    "index.js": ["js/catalog.js"],
+    "product.js": ["js/carousel.js"],
+    "cart.js": ["js/cart.js"],
+    "checkout.js": ["js/phone_mask.js"],
+}
+# Let the app serve STATIC_ROOT itself when there is no web server in front of it.
+STATIC_SERVE = env.bool("STATIC_SERVE", default=False)
+STATIC_ACCEL_REDIRECT_PREFIX = env("STATIC_ACCEL_REDIRECT_PREFIX", default="")
+STATIC_MAX_AGE = env.int("STATIC_MAX_AGE", default=60)
+
+IMAGE_VARIANTS_DIR = "variants"
+IMAGE_VARIANT_WIDTHS = [160, 320, 480, 640, 960, 1280]
+IMAGE_VARIANT_QUALITY = env.int("IMAGE_VARIANT_QUALITY", default=78)
 
 MEDIA_URL = "media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
 CART_SESSION_KEY = "cart"
+CART_STORAGE = env("CART_STORAGE", default="store.services.cart_storage.SessionCartStorage")
+CART_COOKIE_NAME = env("CART_COOKIE_NAME", default="cart")
+CART_COOKIE_AGE = env.int("CART_COOKIE_AGE", default=60 * 60 * 24 * 30)
+CART_COOKIE_SECURE = env.bool("CART_COOKIE_SECURE", default=not DEBUG)
+CART_COOKIE_COMPRESS = env.bool("CART_COOKIE_COMPRESS", default=True)
+# Browsers drop cookies over 4096 bytes including the name and attributes.
+CART_COOKIE_MAX_BYTES = env.int("CART_COOKIE_MAX_BYTES", default=3800)
+CATALOG_CACHE_TIMEOUT = env.int("CATALOG_CACHE_TIMEOUT", default=60 * 60 * 24)
+# Cards per catalog line on the first screen and per infinite-scroll fragment.
+CATALOG_PAGE_SIZE = env.int("CATALOG_PAGE_SIZE", default=12)
+PAGE_CACHE_TIMEOUT = env.int("PAGE_CACHE_TIMEOUT", default=60 * 60)
+# Search results are cached per catalog version, so edits are visible immediately.
+SEARCH_CACHE_TIMEOUT = env.int("SEARCH_CACHE_TIMEOUT", default=60 * 60)
+SEARCH_RESULTS_LIMIT = env.int("SEARCH_RESULTS_LIMIT", default=48)
+SEARCH_AUTOCOMPLETE_LIMIT = env.int("SEARCH_AUTOCOMPLETE_LIMIT", default=8)
+# Autocomplete prefixes up to this many characters are cached.
+SEARCH_HOT_PREFIX_LENGTH = env.int("SEARCH_HOT_PREFIX_LENGTH", default=12)
+QUERY_BUDGET_ENABLED = env.bool("QUERY_BUDGET_ENABLED", default=DEBUG)
+# Exposes X-Query-Budget and Server-Timing; meant for development and staging.
+QUERY_BUDGET_HEADER = env.bool("QUERY_BUDGET_HEADER", default=DEBUG)
+# Worst case per request with a cold catalog cache, session access included.
+QUERY_BUDGETS = {
+    # Both catalog lines share one images query; the cart in the header costs two more.
+    "store:catalog": 7,
+    "store:catalog_more": 3,
+    "store:product_detail": 4,
+    "store:cart": 3,
+    "store:add_to_cart": 6,
+    "store:remove_from_cart": 6,
+    "store:cart_batch": 6,
+    "store:checkout": 3,
+    # Cold cart load, then stock UPDATE, price read, order and item writes and the items read back.
+    "store:checkout_submit": 13,
+    "store:payment_success": 6,
+    "store:search": 4,
+    "store:search_autocomplete": 2,
+    # Paid events also update the sales rollups: one statement per table, plus inserts for a new day.
+    "store:yookassa_webhook": 15,
+}
+
+METRICS_ENABLED = env.bool("METRICS_ENABLED", default=True)
+# Directory shared by all gunicorn workers; empty it before the master starts and call
+# store.metrics.mark_process_dead(worker.pid) from the child_exit hook. Empty keeps
+# metrics in process memory, which is only correct with a single process.
+METRICS_DIR = env("METRICS_DIR", default="")
+# When set, /metrics requires "Authorization: Bearer <token>"; without one it is only served with DEBUG on.
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+
+# Unpaid orders give their reserved stock back after this many minutes (release_expired_reservations).
+STOCK_RESERVATION_MINUTES = env.int("STOCK_RESERVATION_MINUTES", default=60)
+
+RATE_LIMIT_ENABLED = env.bool("RATE_LIMIT_ENABLED", default=True)
+# Counters need a cache shared by all workers (Redis or Memcached) in production.
+RATE_LIMIT_CACHE = env("RATE_LIMIT_CACHE", default="default")
+# META key holding the client address; use HTTP_X_REAL_IP behind a proxy.
+RATE_LIMIT_IP_HEADER = env("RATE_LIMIT_IP_HEADER", default="REMOTE_ADDR")
+# Requests per client address and URL name, as "<count>/<period>" with s, m, h or d (e.g. "5/10m").
+RATE_LIMITS = {
+    "store:add_to_cart": env("RATE_LIMIT_ADD_TO_CART", default="60/m"),
+    "store:remove_from_cart": env("RATE_LIMIT_REMOVE_FROM_CART", default="60/m"),
+    "store:cart_batch": env("RATE_LIMIT_CART_BATCH", default="60/m"),
+    # Each of these creates an order and a YooKassa payment.
+    "store:buy_product": env("RATE_LIMIT_BUY_PRODUCT", default="10/10m"),
+    "store:checkout_submit": env("RATE_LIMIT_CHECKOUT_SUBMIT", default="10/10m"),
+    "store:partnership_submit": env("RATE_LIMIT_PARTNERSHIP_SUBMIT", default="5/h"),
+}
+
+# Above this planner estimate the order changelist shows an approximate count (PostgreSQL only).
+ADMIN_EXACT_COUNT_LIMIT = env.int("ADMIN_EXACT_COUNT_LIMIT", default=10000)
+
+# Change on deploy so ETags issued for old templates stop matching.
+RELEASE_ID = env("RELEASE_ID", default="")
 
 YOOKASSA_SHOP_ID = env("YOOKASSA_SHOP_ID", default="")
 YOOKASSA_SECRET_KEY = env("YOOKASSA_SECRET_KEY", default="")
+YOOKASSA_API_URL = env("YOOKASSA_API_URL", default="https://api.yookassa.ru/v3")
+YOOKASSA_CONNECT_TIMEOUT = env.float("YOOKASSA_CONNECT_TIMEOUT", default=3.05)
+YOOKASSA_READ_TIMEOUT = env.float("YOOKASSA_READ_TIMEOUT", default=10)
+YOOKASSA_MAX_RETRIES = env.int("YOOKASSA_MAX_RETRIES", default=2)
+YOOKASSA_POOL_SIZE = env.int("YOOKASSA_POOL_SIZE", default=10)
+YOOKASSA_BREAKER_FAILURE_THRESHOLD = env.int("YOOKASSA_BREAKER_FAILURE_THRESHOLD", default=5)
+YOOKASSA_BREAKER_RESET_TIMEOUT = env.float("YOOKASSA_BREAKER_RESET_TIMEOUT", default=30)
+# META key holding the webhook caller's address; use HTTP_X_REAL_IP behind a proxy.
+YOOKASSA_WEBHOOK_IP_HEADER = env("YOOKASSA_WEBHOOK_IP_HEADER", default="REMOTE_ADDR")
+TELEGRAM_API_URL = env("TELEGRAM_API_URL", default="https://api.telegram.org")
 TELEGRAM_BOT_TOKEN = env("TELEGRAM_BOT_TOKEN", default="")
 TELEGRAM_CHAT_IDS = env.list("TELEGRAM_CHAT_IDS", default=[])
+NOTIFICATION_MAX_ATTEMPTS = env.int("NOTIFICATION_MAX_ATTEMPTS", default=8)
+NOTIFICATION_RETRY_BASE_DELAY = env.int("NOTIFICATION_RETRY_BASE_DELAY", default=30)
+NOTIFICATION_RETRY_MAX_DELAY = env.int("NOTIFICATION_RETRY_MAX_DELAY", default=60 * 60)
+NOTIFICATION_LEASE_SECONDS = env.int("NOTIFICATION_LEASE_SECONDS", default=5 * 60)
 RECAPTCHA_PUBLIC_KEY = env("RECAPTCHA_PUBLIC_KEY", default="")
 RECAPTCHA_PRIVATE_KEY = env("RECAPTCHA_PRIVATE_KEY", default="")
 
@@ -36,7 +36,7 @@
   };
 
   const ensureEmptyState = () => {
-    if (document.querySelector('.cart__item')) {
+    if (document.querySelector('.cart__item:not([hidden])')) {
       return;
     }
     document.querySelector('.cart__items')?.remove();
@@ -49,22 +49,25 @@
     }
   };
 
-  const setItemLoading = (item, loading) => {
-    item.dataset.loading = loading ? '1' : '';
-    item.querySelectorAll('[data-quantity-action]').forEach((button) => {
-      button.disabled = loading;
-    });
-  };
+  const batchUrl = cartRoot.dataset.batchUrl;
+  const FLUSH_DELAY_MS = 300;
+  // product id -> quantity the visitor asked for and the server has not seen yet.
+  const pending = new Map();
+  let flushTimer = null;
+  let inFlight = null;
 
-  const sendRequest = async (url, params = {}) => {
-    const response = await fetch(url, {
+  const findItem = (productId) => cartRoot.querySelector(`[data-item][data-product-id="${productId}"]`);
+
+  const sendBatch = async (operations, keepalive = false) => {
+    const response = await fetch(batchUrl, {
       method: 'POST',
+      keepalive,
       headers: {
-        'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
+        'Content-Type': 'application/json',
         'X-CSRFToken': csrfToken,
         'X-Requested-With': 'XMLHttpRequest',
       },
-      body: new URLSearchParams({ ...params, csrfmiddlewaretoken: csrfToken }),
+      body: JSON.stringify({ operations }),
     });
     if (!response.ok) {
       throw new Error('Request failed');
@@ -72,64 +75,99 @@
     return response.json();
   };
 
-  const applyResponse = (item, data) => {
-    if (data?.cart) {
+  const takeOperations = () => {
+    const operations = [...pending].map(([productId, quantity]) => ({ product_id: productId, set: quantity }));
+    pending.clear();
+    return operations;
+  };
+
+  const applyDelta = (data) => {
+    // Lines clicked again while this batch was in flight keep their optimistic state.
+    for (const line of data.items) {
+      const item = findItem(line.product_id);
+      if (!item || pending.has(line.product_id)) {
+        continue;
+      }
+      item.hidden = false;
+      item.querySelector('[data-quantity]').textContent = line.quantity;
+      item.querySelector('[data-item-total]').textContent = formatCurrency(line.total_price);
+    }
+    for (const productId of data.removed) {
+      if (!pending.has(productId)) {
+        findItem(productId)?.remove();
+      }
+    }
+    if (!pending.size) {
       updateSummary(data.cart.total_amount);
       updateCartCount(data.cart.total_quantity);
     }
+    ensureEmptyState();
+  };
 
-    if (data?.removed) {
-      item.remove();
-      ensureEmptyState();
-      return;
+  const sendPending = async () => {
+    try {
+      applyDelta(await sendBatch(takeOperations()));
+    } catch (error) {
+      console.error(error);
+      alert('Не удалось обновить корзину. Попробуйте еще раз.');
+      window.location.reload();
     }
+  };
 
-    if (data?.item) {
-      const quantityNode = item.querySelector('[data-quantity]');
-      const totalNode = item.querySelector('[data-item-total]');
-      if (quantityNode) {
-        quantityNode.textContent = data.item.quantity;
-      }
-      if (totalNode) {
-        totalNode.textContent = formatCurrency(data.item.total_price);
+  const flush = async () => {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+    // Clicks made while a batch is in flight go out in the next one; resolve only once both are done.
+    while (inFlight || pending.size) {
+      if (!inFlight) {
+        inFlight = sendPending().finally(() => {
+          inFlight = null;
+        });
       }
+      await inFlight;
     }
   };
 
-  cartRoot.addEventListener('click', async (event) => {
+  const scheduleFlush = () => {
+    clearTimeout(flushTimer);
+    flushTimer = setTimeout(flush, FLUSH_DELAY_MS);
+  };
+
+  cartRoot.addEventListener('click', (event) => {
     const button = event.target.closest('[data-quantity-action]');
     if (!button) {
       return;
     }
     const item = button.closest('[data-item]');
-    if (!item || item.dataset.loading === '1') {
+    if (!item) {
       return;
     }
 
-    const action = button.dataset.quantityAction;
+    const productId = Number(item.dataset.productId);
     const quantityNode = item.querySelector('[data-quantity]');
-    const currentQuantity = Number(quantityNode?.textContent || 0);
-    const nextQuantity = action === 'increase' ? currentQuantity + 1 : currentQuantity - 1;
+    const currentQuantity = Number(quantityNode.textContent || 0);
+    const nextQuantity = Math.max(button.dataset.quantityAction === 'increase' ? currentQuantity + 1 : currentQuantity - 1, 0);
 
-    const addUrl = item.dataset.addUrl;
-    const removeUrl = item.dataset.removeUrl;
+    quantityNode.textContent = nextQuantity;
+    item.hidden = nextQuantity === 0;
+    pending.set(productId, nextQuantity);
+    scheduleFlush();
+  });
 
-    setItemLoading(item, true);
-    try {
-      let data;
-      if (nextQuantity <= 0) {
-        data = await sendRequest(removeUrl);
-      } else {
-        data = await sendRequest(addUrl, { quantity: String(nextQuantity), replace: '1' });
-      }
-      applyResponse(item, data);
-    } catch (error) {
-      console.error(error);
-      alert('Не удалось обновить корзину. Попробуйте еще раз.');
-    } finally {
-      if (document.body.contains(item)) {
-        setItemLoading(item, false);
-      }
+  document.querySelector('.cart__checkout')?.addEventListener('click', async (event) => {
+    if (!pending.size && !inFlight) {
+      return;
+    }
+    // currentTarget is reset once the handler yields, so the link is read up front.
+    const { href } = event.currentTarget;
+    event.preventDefault();
+    await flush();
+    window.location.href = href;
+  });
+
+  window.addEventListener('pagehide', () => {
+    if (pending.size) {
+      sendBatch(takeOperations(), true).catch(() => {});
     }
   });
 })();
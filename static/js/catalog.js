@@ -0,0 +1,31 @@
+(function () {
+  if (!("IntersectionObserver" in window)) {
+    return;
+  }
+
+  const load = (sentinel, observer) => {
+    observer.unobserve(sentinel);
+    fetch(sentinel.dataset.moreUrl, { headers: { "X-Requested-With": "XMLHttpRequest" } })
+      .then((response) => (response.ok ? response.text() : Promise.reject(response)))
+      .then((html) => {
+        const cards = sentinel.parentElement;
+        sentinel.insertAdjacentHTML("afterend", html);
+        sentinel.remove();
+        const next = cards.querySelector("[data-more-url]");
+        if (next) {
+          observer.observe(next);
+        }
+      })
+      .catch(() => setTimeout(() => observer.observe(sentinel), 5000));
+  };
+
+  document.querySelectorAll("[data-more-url]").forEach((sentinel) => {
+    const observer = new IntersectionObserver(
+      (entries) => {
+        entries.filter((entry) => entry.isIntersecting).forEach((entry) => load(entry.target, observer));
+      },
+      { root: sentinel.closest(".catalog__cards--wrapper"), rootMargin: "0px 600px 0px 0px" }
+    );
+    observer.observe(sentinel);
+  });
+})();
@@ -0,0 +1,9 @@
+(function () {
+  const flashes = document.querySelectorAll('.flash__item');
+  flashes.forEach((item) => {
+    setTimeout(() => {
+      item.classList.add('is-hiding');
+      setTimeout(() => item.remove(), 300);
+    }, 3000);
+  });
+})();
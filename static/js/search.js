@@ -0,0 +1,38 @@
+(function () {
+  const input = document.querySelector("[data-autocomplete-url]");
+  if (!input) {
+    return;
+  }
+  const list = document.getElementById(input.getAttribute("list"));
+  let timer = null;
+  let controller = null;
+
+  const update = (suggestions) => {
+    list.replaceChildren(
+      ...suggestions.map((suggestion) => {
+        const option = document.createElement("option");
+        option.value = suggestion.name;
+        return option;
+      })
+    );
+  };
+
+  input.addEventListener("input", () => {
+    clearTimeout(timer);
+    timer = setTimeout(() => {
+      const query = input.value.trim();
+      if (query.length < 2) {
+        update([]);
+        return;
+      }
+      if (controller) {
+        controller.abort();
+      }
+      controller = new AbortController();
+      fetch(`${input.dataset.autocompleteUrl}?q=${encodeURIComponent(query)}`, { signal: controller.signal })
+        .then((response) => (response.ok ? response.json() : { suggestions: [] }))
+        .then((data) => update(data.suggestions))
+        .catch(() => {});
+    }, 150);
+  });
+})();
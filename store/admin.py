@@ -1,6 +1,36 @@
+import itertools
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from store.models import (
+    DailyProductSales,
+    DailySales,
+    NotificationOutbox,
+    Order,
+    OrderItem,
+    Product,
+    ProductImage,
+)
+from store.services import exports
 
-from store.models import Order, OrderItem, Product, ProductImage
+CURSOR_VAR = 'cursor'
 
 admin.site.site_header = 'RML — администрирование'
 admin.site.site_title = 'RML — админ'
@@ -14,7 +44,7 @@ class ProductImageInline(admin.TabularInline):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'first_line', 'slug')
+    list_display = ('name', 'price', 'stock', 'first_line', 'slug')
     prepopulated_fields = {'slug': ('name',)}
     inlines = [ProductImageInline]
 
@@ -22,13 +52,213 @@ class ProductAdmin(admin.ModelAdmin):
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
+    # A product select per row would load the whole catalog once per item.
+    readonly_fields = ('product',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+
+def estimate_count(queryset) -> Optional[int]:
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().values('pk').explain(format='json'))
+    if isinstance(plan, list):
+        plan = plan[0]
+    return int(plan['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    estimated = False
+
+    @cached_property
+    def count(self) -> int:
+        # The planner estimate is free; exact COUNT(*) is only worth it for small results.
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate > settings.ADMIN_EXACT_COUNT_LIMIT:
+            self.estimated = True
+            return estimate
+        return super().count
+
+
+class KeysetChangeList(ChangeList):
+    """Pages by (created_at, id) instead of OFFSET while the default ordering is in use."""
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        return queryset.defer('metadata', 'cart_snapshot')
+
+    def get_results(self, request):
+        self.next_page_url = self.first_page_url = None
+        self.keyset = ORDER_VAR not in self.params and not self.show_all
+        if not self.keyset:
+            return super().get_results(request)
+        queryset = self.queryset.order_by('-created_at', '-id')
+        cursor = self.params.get(CURSOR_VAR)
+        if cursor:
+            created_at, order_id = _parse_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id))
+            self.first_page_url = self.get_query_string(remove=[CURSOR_VAR])
+        rows = list(queryset[: self.list_per_page + 1])
+        if len(rows) > self.list_per_page:
+            last = rows[self.list_per_page - 1]
+            self.next_page_url = self.get_query_string({CURSOR_VAR: f'{last.created_at.isoformat()}|{last.id}'})
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_count = self.paginator.count
+        self.result_list = rows[: self.list_per_page]
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = bool(self.next_page_url or self.first_page_url)
+
+
+def _parse_cursor(cursor: str):
+    created_at, _, order_id = cursor.rpartition('|')
+    try:
+        return datetime.fromisoformat(created_at), int(order_id)
+    except ValueError:
+        raise IncorrectLookupParameters
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ('id', 'status', 'total_amount', 'payment_id', 'created_at')
-    list_filter = ('status', 'created_at')
+    list_display = ('id', 'status', 'total_amount', 'customer_name', 'items_count', 'payment_id', 'created_at')
+    list_filter = ('status',)
+    date_hierarchy = 'created_at'
     search_fields = ('payment_id',)
+    search_help_text = 'Номер заказа или точный ID платежа'
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
     inlines = [OrderItemInline]
 
+    actions = ['export_csv', 'export_jsonl']
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_queryset(self, request):
+        items_count = (
+            OrderItem.objects.filter(order=OuterRef('pk'))
+            .order_by()
+            .values('order')
+            .annotate(count=Count('*'))
+            .values('count')
+        )
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                items_count=Coalesce(Subquery(items_count), 0),
+                customer_name=KeyTextTransform('customer_name', 'metadata'),
+            )
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        # Exact matches only: both hit an index, a LIKE '%...%' would scan every order.
+        term = search_term.strip().lstrip('#')
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(Q(pk=int(term)) | Q(payment_id=term)), False
+        return queryset.filter(payment_id=term), False
+
+    @admin.action(description='Выгрузить для бухгалтерии (CSV)')
+    def export_csv(self, request, queryset):
+        return self._export(queryset, exports.FORMAT_CSV)
+
+    @admin.action(description='Выгрузить для бухгалтерии (JSONL)')
+    def export_jsonl(self, request, queryset):
+        return self._export(queryset, exports.FORMAT_JSONL)
+
+    def _export(self, queryset, export_format: str) -> StreamingHttpResponse:
+        # The changelist queryset defers the JSON columns and carries list annotations; start clean.
+        orders = Order.objects.filter(pk__in=queryset.order_by().values('pk'))
+        lines = exports.export_lines(orders, export_format)
+        if export_format == exports.FORMAT_CSV:
+            # Excel only detects UTF-8 with a BOM.
+            lines = itertools.chain(['\ufeff'], lines)
+        response = StreamingHttpResponse(lines, content_type=exports.CONTENT_TYPES[export_format])
+        filename = f'orders-{timezone.localdate():%Y-%m-%d}.{export_format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @admin.display(description='Покупатель')
+    def customer_name(self, order: Order) -> str:
+        return order.customer_name or '—'
+
+    @admin.display(description='Позиций')
+    def items_count(self, order: Order) -> int:
+        return order.items_count
+
+
+@admin.register(DailySales)
+class SalesDashboardAdmin(admin.ModelAdmin):
+    """Reads only the rollup tables; rebuild them with rebuild_sales_rollups."""
+
+    periods = (7, 30, 90, 365)
+    top_products = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        try:
+            days = int(request.GET.get('days', self.periods[0]))
+        except ValueError:
+            days = self.periods[0]
+        if days not in self.periods:
+            days = self.periods[0]
+        since = timezone.localdate() - timedelta(days=days - 1)
+        daily = list(DailySales.objects.filter(day__gte=since).order_by('day'))
+        products = (
+            DailyProductSales.objects.filter(day__gte=since)
+            .values('product_id')
+            .annotate(
+                name=Max('product_name'),
+                total_orders=Sum('orders'),
+                total_quantity=Sum('quantity'),
+                total_revenue=Sum('revenue'),
+            )
+            .order_by('-total_revenue')[: self.top_products]
+        )
+        peak = max((row.revenue for row in daily), default=0) or 1
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Продажи',
+            'opts': self.model._meta,
+            'periods': self.periods,
+            'days': days,
+            'since': since,
+            'daily': [(row, round(row.revenue / peak * 100)) for row in daily],
+            'products': products,
+            'totals': {
+                'orders': sum(row.orders for row in daily),
+                'quantity': sum(row.quantity for row in daily),
+                'revenue': sum((row.revenue for row in daily), Decimal('0.00')),
+            },
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, 'admin/store/dailysales/dashboard.html', context)
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'order', 'attempts', 'available_at', 'sent_at')
+    list_filter = ('status', 'kind')
+    raw_id_fields = ('order',)
+
 # Register your models here.
@@ -1,14 +1,16 @@
 from __future__ import annotations
 
-from typing import Dict, List
+from typing import Dict
 
-from .services.cart import CartItem, get_cart
+from django.utils.functional import SimpleLazyObject
 
+from .services.cart import get_cart
 
-def cart(request) -> Dict[str, int | List[CartItem]]:
-    cart_state = get_cart(request)
+
+def cart(request) -> Dict[str, SimpleLazyObject]:
+    # Lazy so pages that never read the cart don't pay for resolving it.
     return {
-        'cart_items_count': cart_state.total_quantity,
-        'cart_items': cart_state.items,
-        'cart_total': cart_state.total_amount,
+        'cart_items_count': SimpleLazyObject(lambda: get_cart(request).total_quantity),
+        'cart_items': SimpleLazyObject(lambda: get_cart(request).items),
+        'cart_total': SimpleLazyObject(lambda: get_cart(request).total_amount),
     }
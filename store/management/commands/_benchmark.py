@@ -0,0 +1,54 @@
+import math
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from django.core.management.base import CommandError
+from django.db import connection
+
+# Database names that say the data is disposable.
+DISPOSABLE_DATABASE_MARKERS = ('test', 'bench')
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    # Nearest-rank percentile; sorted_values must be non-empty and ascending.
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies_ms: List[float]) -> Dict[str, float]:
+    values = sorted(latencies_ms)
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 0.50), 2),
+        'p95_ms': round(percentile(values, 0.95), 2),
+        'p99_ms': round(percentile(values, 0.99), 2),
+        'max_ms': round(values[-1], 2),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def is_disposable_database() -> bool:
+    # Judged by the database alone: DEBUG defaults to on, so a deploy that forgot to turn it off would pass.
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        return True
+    name = Path(str(connection.settings_dict['NAME'] or '')).name.lower()
+    return any(marker in name for marker in DISPOSABLE_DATABASE_MARKERS)
+
+
+def ensure_disposable_database(confirmed: bool) -> None:
+    # Benchmarks write to and lock shop tables; on a live database that is an outage, not a measurement.
+    if confirmed or is_disposable_database():
+        return
+    raise CommandError(
+        f"Refusing to run against {connection.settings_dict['NAME']!r}: it is not a test or benchmark database. "
+        'Pass --i-know to run anyway.'
+    )
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import random
+import threading
+import uuid
+from typing import Callable, Dict, Optional, Tuple
+
+from django.utils import timezone
+
+Handler = Callable[[str, str, dict], Tuple[int, dict]]
+
+
+def yookassa_handler(method: str, path: str, body: dict) -> Tuple[int, dict]:
+    if method == 'POST' and path.endswith('/payments'):
+        payment_id = f'loadtest-{uuid.uuid4()}'
+        return 200, _payment(payment_id, 'pending', body)
+    if method == 'GET' and '/payments/' in path:
+        return 200, _payment(path.rsplit('/', 1)[-1], 'succeeded', {})
+    return 404, {'type': 'error', 'code': 'not_found'}
+
+
+def telegram_handler(method: str, path: str, body: dict) -> Tuple[int, dict]:
+    if path.endswith('/sendMessage'):
+        return 200, {'ok': True, 'result': {'message_id': random.randint(1, 10**6)}}
+    return 404, {'ok': False}
+
+
+def _payment(payment_id: str, status: str, body: dict) -> dict:
+    return {
+        'id': payment_id,
+        'status': status,
+        'paid': status == 'succeeded',
+        'amount': body.get('amount') or {'value': '1.00', 'currency': 'RUB'},
+        'confirmation': {
+            'type': 'redirect',
+            'confirmation_url': f'https://yoomoney.ru/checkout/payments/v2/contract?orderId={payment_id}',
+        },
+        'created_at': timezone.now().isoformat(),
+        'description': body.get('description', ''),
+        'metadata': body.get('metadata', {}),
+        'recipient': {'account_id': 'stub', 'gateway_id': 'stub'},
+        'refundable': False,
+        'test': True,
+    }
+
+
+class StubServer:
+    """Minimal keep-alive HTTP/1.1 server with injected latency and errors, run on its own thread."""
+
+    def __init__(self, handler: Handler, latency: float = 0.0, error_rate: float = 0.0):
+        self.handler = handler
+        self.latency = latency
+        self.error_rate = error_rate
+        self.url: Optional[str] = None
+        self._loop = asyncio.new_event_loop()
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> 'StubServer':
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    async def _shutdown(self) -> None:
+        self._server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(asyncio.start_server(self._serve, '127.0.0.1', 0))
+        host, port = self._server.sockets[0].getsockname()[:2]
+        self.url = f'http://{host}:{port}'
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.close()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(' ', 2)
+                headers: Dict[str, str] = {}
+                while True:
+                    line = (await reader.readline()).decode().strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                raw_body = await reader.readexactly(int(headers.get('content-length', 0)))
+                body = _parse_body(raw_body, headers.get('content-type', ''))
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                if random.random() < self.error_rate:
+                    status, payload = 500, {'type': 'error', 'code': 'internal_server_error'}
+                else:
+                    status, payload = self.handler(method, path.split('?', 1)[0], body)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f'HTTP/1.1 {status} STUB\r\nContent-Type: application/json\r\n'
+                    f'Content-Length: {len(data)}\r\n\r\n'.encode()
+                    + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+def _parse_body(raw_body: bytes, content_type: str) -> dict:
+    if not raw_body:
+        return {}
+    if 'json' in content_type:
+        try:
+            return json.loads(raw_body)
+        except ValueError:
+            return {}
+    return {}
@@ -0,0 +1,124 @@
+import random
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from typing import List
+
+from django.db import transaction
+from django.db.models import Max, Min, QuerySet
+from django.utils import timezone
+
+from store.models import Order, OrderItem, Product, ProductImage
+from store.services import catalog, inventory, sales
+
+PRODUCT_SLUG_PREFIX = 'bench-'
+ORDER_PAYMENT_PREFIX = 'bench-'
+IMAGE_PATHS = ['images/main1.jpg', 'images/main2.jpg', 'images/about.jpg', 'images/partnership.jpg']
+ORDER_STATUS_WEIGHTS = {
+    Order.STATUS_PAID: 70,
+    Order.STATUS_CANCELED: 10,
+    Order.STATUS_PENDING: 10,
+    Order.STATUS_AWAITING: 5,
+    Order.STATUS_FAILED: 5,
+}
+
+
+def seed_catalog(count: int, images_per_product: int = 3) -> List[Product]:
+    products = [
+        Product(
+            name=f'Болеро №{index}',
+            slug=f'{PRODUCT_SLUG_PREFIX}{index}',
+            description='Теплое болеро из искусственного меха с атласной подкладкой.',
+            price=Decimal(random.randrange(2000, 20000, 100)),
+            details=['Материал: искусственный мех', 'Подкладка: атлас', f'Артикул: {index:05d}'],
+            first_line=index % 2 == 0,
+        )
+        for index in range(count)
+    ]
+    with transaction.atomic():
+        products = Product.objects.bulk_create(products)
+        ProductImage.objects.bulk_create(
+            ProductImage(
+                product=product,
+                image_path=IMAGE_PATHS[(product.id + position) % len(IMAGE_PATHS)],
+                alt_text=f'{product.name} — фото {position + 1}',
+                sort_order=position,
+            )
+            for product in products
+            for position in range(images_per_product)
+        )
+    # bulk_create does not send the signals that invalidate the catalog cache.
+    catalog.bump_version()
+    return products
+
+
+# Share of paid orders whose seller notification is still in the outbox.
+UNNOTIFIED_SHARE = 0.01
+
+
+def seed_orders(
+    count: int,
+    products: List[Product],
+    days: int = 365,
+    batch_size: int = 1000,
+    with_items: bool = True,
+) -> int:
+    statuses = list(ORDER_STATUS_WEIGHTS)
+    weights = list(ORDER_STATUS_WEIGHTS.values())
+    now = timezone.now()
+    created = 0
+    while created < count:
+        size = min(batch_size, count - created)
+        with transaction.atomic():
+            orders = Order.objects.bulk_create(
+                Order(
+                    status=status,
+                    payment_id=f'{ORDER_PAYMENT_PREFIX}{uuid.uuid4()}',
+                    metadata={'source': 'benchmark'},
+                    notified_at=now if status == Order.STATUS_PAID and random.random() >= UNNOTIFIED_SHARE else None,
+                )
+                for status in random.choices(statuses, weights, k=size)
+            )
+            items = []
+            for order in orders:
+                # auto_now_add ignores the value on insert, so spread the history afterwards.
+                order.created_at = now - timedelta(seconds=random.randrange(days * 24 * 3600))
+                if not with_items:
+                    order.total_amount = random.choice(products).price
+                    continue
+                for product in random.sample(products, k=min(len(products), random.randint(1, 4))):
+                    quantity = random.randint(1, 3)
+                    items.append(
+                        OrderItem(
+                            order=order,
+                            product=product,
+                            product_name=product.name,
+                            unit_price=product.price,
+                            quantity=quantity,
+                        )
+                    )
+                    order.total_amount += product.price * quantity
+            Order.objects.bulk_update(orders, ['created_at', 'total_amount'])
+            OrderItem.objects.bulk_create(items)
+        created += size
+    return created
+
+
+def remove_orders(orders: QuerySet) -> None:
+    # Deleting a reserved order would leave its quantities out of stock for good.
+    for order in orders.filter(stock_reserved=True).prefetch_related('items').iterator(chunk_size=500):
+        inventory.release_order(order)
+    # Paid orders are already counted in the sales rollups, so the days they fell on are recomputed without them.
+    paid = orders.filter(status=Order.STATUS_PAID).aggregate(first=Min('created_at'), last=Max('created_at'))
+    orders.delete()
+    if paid['first'] is not None:
+        sales.rebuild(
+            since=timezone.localdate(paid['first']),
+            until=timezone.localdate(paid['last']) + timedelta(days=1),
+        )
+
+
+def remove_seeded() -> None:
+    remove_orders(Order.objects.filter(payment_id__startswith=ORDER_PAYMENT_PREFIX))
+    Product.objects.filter(slug__startswith=PRODUCT_SLUG_PREFIX).delete()
+    catalog.bump_version()
@@ -0,0 +1,103 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from typing import Dict, List, Tuple
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from store.models import Order
+from store.services.reconciliation import stale_awaiting_orders
+
+from ._benchmark import ensure_disposable_database
+from ._seed import seed_catalog, seed_orders
+
+
+def hot_queries(payment_id: str) -> List[Tuple[str, QuerySet]]:
+    now = timezone.now()
+    paid = Order.objects.filter(status=Order.STATUS_PAID)
+    last_month = Order.objects.filter(created_at__gte=now - timedelta(days=30)).order_by('-created_at', '-id')
+    return [
+        ('payment lookup', Order.objects.filter(payment_id=payment_id)),
+        ('awaiting by age', stale_awaiting_orders(now - timedelta(minutes=30))[:200]),
+        ('paid, not notified', paid.filter(notified_at__isnull=True).order_by('created_at')[:100]),
+        ('admin: status, month', last_month.filter(status=Order.STATUS_PAID)[:100]),
+        ('admin: month', last_month[:100]),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed synthetic orders and print the query plan and timing of the hot order queries '
+        'without and with the order indexes (everything is rolled back unless --keep-data). '
+        'Dropping the indexes holds an ACCESS EXCLUSIVE lock on store_order until the rollback, blocking every '
+        'read and write of orders, so it refuses to run on a database that is not a test or benchmark one'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1_000_000, help='Orders to seed; 0 uses existing rows')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--keep-data', action='store_true', help='Commit the seeded rows')
+        parser.add_argument(
+            '--i-know', action='store_true', help='Run even though the database is not a test or benchmark one'
+        )
+
+    def handle(self, *args, **options):
+        ensure_disposable_database(options['i_know'])
+        random.seed(options['seed'])
+        with transaction.atomic():
+            if options['orders']:
+                started = time.perf_counter()
+                products = seed_catalog(20, images_per_product=0)
+                seed_orders(options['orders'], products, batch_size=options['batch_size'], with_items=False)
+                self.stdout.write(f"Seeded {options['orders']} orders in {time.perf_counter() - started:.1f}s")
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Order._meta.db_table}')
+            payment_id = Order.objects.order_by('-id').values_list('payment_id', flat=True).first() or ''
+            with transaction.atomic():
+                self._drop_order_indexes()
+                before = self._measure(hot_queries(payment_id), options['repeat'])
+                transaction.set_rollback(True)
+            after = self._measure(hot_queries(payment_id), options['repeat'])
+            if not options['keep_data']:
+                transaction.set_rollback(True)
+        for name, (before_ms, before_plan) in before.items():
+            after_ms, after_plan = after[name]
+            self.stdout.write(self.style.MIGRATE_HEADING(f'== {name}'))
+            self.stdout.write(f'-- without order indexes: {before_ms:.2f} ms\n{before_plan}')
+            self.stdout.write(f'-- with order indexes: {after_ms:.2f} ms\n{after_plan}')
+        self.stdout.write(f"{'query':<24} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+        for name, (before_ms, _) in before.items():
+            after_ms = after[name][0]
+            speedup = f'{before_ms / after_ms:.1f}x' if after_ms else 'n/a'
+            self.stdout.write(f'{name:<24} {before_ms:>10.2f} {after_ms:>10.2f} {speedup:>8}')
+
+    def _drop_order_indexes(self) -> None:
+        # Runs inside a rolled-back transaction, so the "before" plans cost nothing to undo.
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for index in Order._meta.indexes:
+                cursor.execute(
+                    editor.sql_delete_index
+                    % {'table': editor.quote_name(Order._meta.db_table), 'name': editor.quote_name(index.name)}
+                )
+
+    def _measure(self, queries: List[Tuple[str, QuerySet]], repeat: int) -> Dict[str, Tuple[float, str]]:
+        results = {}
+        for name, queryset in queries:
+            if connection.vendor == 'postgresql':
+                plan = queryset.explain(analyze=True, buffers=True)
+            else:
+                plan = queryset.explain()
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (statistics.median(timings), plan)
+        return results
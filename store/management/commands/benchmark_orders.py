@@ -0,0 +1,38 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from store.models import Product
+from store.services.cart import Cart, CartItem
+from store.services.orders import create_order_from_cart
+
+
+class Command(BaseCommand):
+    help = 'Benchmark order creation for carts of different sizes (all writes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 20, 200], help='Cart line counts')
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        products = list(Product.objects.all())
+        if not products:
+            raise CommandError('No products to build carts from')
+        self.stdout.write('lines  queries  median ms  max ms')
+        for size in options['sizes']:
+            cart = Cart(items=[CartItem(product=products[i % len(products)], quantity=1) for i in range(size)])
+            timings = []
+            with transaction.atomic():
+                for _ in range(options['iterations']):
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        order = create_order_from_cart(cart, metadata={'source': 'benchmark'})
+                        order.as_human_readable()
+                        timings.append((time.perf_counter() - started) * 1000)
+                transaction.set_rollback(True)
+            self.stdout.write(
+                f'{size:>5}  {len(queries):>7}  {statistics.median(timings):>9.2f}  {max(timings):>6.2f}'
+            )
@@ -0,0 +1,257 @@
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from store.models import Order, OrderItem
+from store.services.notifications import dispatch_pending
+
+from ._benchmark import ensure_disposable_database, git_revision, summarize
+from ._provider_stubs import StubServer, telegram_handler, yookassa_handler
+from ._seed import remove_orders, remove_seeded, seed_catalog, seed_orders
+
+TRUSTED_WEBHOOK_IP = '185.71.76.1'
+UNTRUSTED_WEBHOOK_IP = '203.0.113.10'
+CHECKOUT_FORM = {'full_name': 'Нагрузочный Тест', 'phone': '+7 (999) 123-45-67', 'address': 'Москва, ул. Тестовая, 1'}
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.queries: Dict[str, List[int]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, name: str, seconds: float, queries: int, status: int) -> None:
+        with self._lock:
+            self.latencies[name].append(seconds * 1000)
+            self.queries[name].append(queries)
+            self.statuses[name][status] += 1
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a catalog and order history, then drive browse -> product -> cart -> checkout -> '
+        'payment_success -> webhook against local YooKassa/Telegram stubs and report per-URL latency and queries'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=8, help='Concurrent virtual users')
+        parser.add_argument('--iterations', type=int, default=5, help='Scenario runs per user')
+        parser.add_argument('--products', type=int, default=60, help='Products to seed')
+        parser.add_argument('--orders', type=int, default=2000, help='Historical orders to seed')
+        parser.add_argument('--yookassa-latency', type=float, default=0.05)
+        parser.add_argument('--telegram-latency', type=float, default=0.05)
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of stub responses that are 500s')
+        parser.add_argument(
+            '--webhook-refetch',
+            action='store_true',
+            help='Send webhooks from an untrusted IP so every one is verified with a payment fetch',
+        )
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for data and product choice')
+        parser.add_argument('--output', help='Write machine-readable results to this JSON file')
+        parser.add_argument('--compare', help='Compare with results previously written by --output')
+        parser.add_argument('--keep-data', action='store_true', help='Leave the seeded rows in the database')
+        parser.add_argument(
+            '--i-know', action='store_true', help='Run even though the database is not a test or benchmark one'
+        )
+
+    def handle(self, *args, **options):
+        ensure_disposable_database(options['i_know'])
+        baseline = self._load_baseline(options['compare']) if options['compare'] else None
+        if connection.vendor == 'sqlite' and options['users'] > 1:
+            self.stderr.write('SQLite serialises writers: expect "database is locked" errors with concurrent users.')
+        random.seed(options['seed'])
+        products = seed_catalog(options['products'])
+        seed_orders(options['orders'], products)
+        slugs = [product.slug for product in products]
+        recorder = Recorder()
+        try:
+            with StubServer(
+                yookassa_handler, latency=options['yookassa_latency'], error_rate=options['error_rate']
+            ) as yookassa, StubServer(
+                telegram_handler, latency=options['telegram_latency'], error_rate=options['error_rate']
+            ) as telegram, override_settings(
+                YOOKASSA_API_URL=yookassa.url,
+                YOOKASSA_SHOP_ID='benchmark',
+                YOOKASSA_SECRET_KEY='benchmark',
+                YOOKASSA_POOL_SIZE=max(options['users'], 10),
+                YOOKASSA_WEBHOOK_IP_HEADER='REMOTE_ADDR',
+                TELEGRAM_API_URL=telegram.url,
+                TELEGRAM_BOT_TOKEN='benchmark',
+                TELEGRAM_CHAT_IDS=['1', '2'],
+                # Every virtual user shares one address.
+                RATE_LIMIT_ENABLED=False,
+            ):
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=options['users']) as pool:
+                    for future in [
+                        pool.submit(self._run_user, recorder, slugs, options) for _ in range(options['users'])
+                    ]:
+                        future.result()
+                self._dispatch_notifications(recorder)
+                elapsed = time.perf_counter() - started
+        finally:
+            if not options['keep_data']:
+                # Orders whose payment could not be created have no payment_id, so they are found by their items.
+                scenario_items = OrderItem.objects.filter(product__in=products)
+                remove_orders(Order.objects.filter(id__in=scenario_items.values('order_id')))
+                remove_seeded()
+        results = self._results(recorder, elapsed, options)
+        self._report(results, baseline)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def _load_baseline(self, path: str) -> dict:
+        try:
+            with open(path) as baseline:
+                return json.load(baseline)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Cannot read baseline {path}: {error}')
+
+    def _run_user(self, recorder: Recorder, slugs: List[str], options) -> None:
+        webhook_ip = UNTRUSTED_WEBHOOK_IP if options['webhook_refetch'] else TRUSTED_WEBHOOK_IP
+        # Server errors are part of the measurement, not a reason to stop the run.
+        client = Client(raise_request_exception=False)
+        try:
+            for _ in range(options['iterations']):
+                slug = random.choice(slugs)
+                self._call(recorder, client, 'get', reverse('store:catalog'))
+                self._call(recorder, client, 'get', reverse('store:product_detail', args=[slug]))
+                self._call(
+                    recorder,
+                    client,
+                    'post',
+                    reverse('store:add_to_cart', args=[slug]),
+                    {'quantity': random.randint(1, 2)},
+                    headers={'x-requested-with': 'XMLHttpRequest'},
+                )
+                self._call(recorder, client, 'get', reverse('store:cart'))
+                self._call(recorder, client, 'get', reverse('store:checkout'))
+                self._call(recorder, client, 'post', reverse('store:checkout_submit'), CHECKOUT_FORM)
+                payment_id = client.session.get('last_payment_id')
+                self._call(recorder, client, 'get', reverse('store:payment_success'))
+                if payment_id:
+                    payment = {'id': payment_id, 'status': 'succeeded', 'paid': True}
+                    event = {'type': 'notification', 'event': 'payment.succeeded', 'object': payment}
+                    self._call(
+                        recorder,
+                        client,
+                        'post',
+                        reverse('store:yookassa_webhook'),
+                        json.dumps(event),
+                        content_type='application/json',
+                        REMOTE_ADDR=webhook_ip,
+                    )
+        finally:
+            connection.close()
+
+    def _call(self, recorder: Recorder, client: Client, method: str, url: str, data=None, **extra):
+        name = resolve(urlsplit(url).path).url_name
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data, **extra)
+            seconds = time.perf_counter() - started
+        recorder.record(name, seconds, len(queries), response.status_code)
+        return response
+
+    def _dispatch_notifications(self, recorder: Recorder) -> None:
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                sent = dispatch_pending()
+                seconds = time.perf_counter() - started
+            if not sent:
+                return
+            recorder.record('dispatch_notifications', seconds, len(queries), 200)
+
+    def _results(self, recorder: Recorder, elapsed: float, options) -> dict:
+        endpoints = {}
+        for name, latencies in recorder.latencies.items():
+            queries = recorder.queries[name]
+            statuses = recorder.statuses[name]
+            endpoints[name] = {
+                **summarize(latencies),
+                'throughput_rps': round(len(latencies) / elapsed, 2),
+                'queries_avg': round(sum(queries) / len(queries), 2),
+                'queries_max': max(queries),
+                'errors': sum(count for status, count in statuses.items() if status >= 500),
+                'statuses': {str(status): count for status, count in sorted(statuses.items())},
+            }
+        total = sum(endpoint['count'] for endpoint in endpoints.values())
+        return {
+            'meta': {
+                'revision': git_revision(),
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'database': connection.vendor,
+                'cache': settings.CACHES['default']['BACKEND'],
+                'options': {
+                    key: options[key]
+                    for key in (
+                        'users',
+                        'iterations',
+                        'products',
+                        'orders',
+                        'yookassa_latency',
+                        'telegram_latency',
+                        'error_rate',
+                        'webhook_refetch',
+                        'seed',
+                    )
+                },
+            },
+            'totals': {
+                'requests': total,
+                'elapsed_s': round(elapsed, 3),
+                'throughput_rps': round(total / elapsed, 2),
+                'errors': sum(endpoint['errors'] for endpoint in endpoints.values()),
+            },
+            'endpoints': endpoints,
+        }
+
+    def _report(self, results: dict, baseline) -> None:
+        totals = results['totals']
+        self.stdout.write(
+            f"{totals['requests']} requests in {totals['elapsed_s']:.2f}s: "
+            f"{totals['throughput_rps']:.1f} req/s, {totals['errors']} errors"
+        )
+        self.stdout.write(
+            f"{'url name':<24} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>6}"
+        )
+        for name, endpoint in results['endpoints'].items():
+            line = (
+                f"{name:<24} {endpoint['count']:>6} {endpoint['p50_ms']:>8.1f} {endpoint['p95_ms']:>8.1f} "
+                f"{endpoint['p99_ms']:>8.1f} {endpoint['queries_avg']:>8.1f} {endpoint['errors']:>6}"
+            )
+            previous = (baseline or {}).get('endpoints', {}).get(name)
+            if previous:
+                line += (
+                    f"  p95 {self._delta(previous['p95_ms'], endpoint['p95_ms'])}"
+                    f" queries {endpoint['queries_avg'] - previous['queries_avg']:+.1f}"
+                )
+            self.stdout.write(line)
+        if baseline:
+            self.stdout.write(
+                f"baseline {baseline['meta'].get('revision') or 'unknown'}: "
+                f"throughput {self._delta(baseline['totals']['throughput_rps'], totals['throughput_rps'])}"
+            )
+
+    @staticmethod
+    def _delta(before: float, after: float) -> str:
+        if not before:
+            return 'n/a'
+        return f'{(after - before) / before * 100:+.1f}%'
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from store.models import Order, Product
+from store.services.cart import Cart, CartItem
+from store.services.inventory import OutOfStock
+from store.services.orders import create_order_from_cart
+
+from ._benchmark import ensure_disposable_database, summarize
+from ._seed import remove_orders, seed_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        'Run many parallel checkouts of one stock-tracked product and report throughput, '
+        'rejections and whether any unit was oversold'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=16, help='Threads, each with its own connection')
+        parser.add_argument('--stock', type=int, default=100)
+        parser.add_argument('--quantity', type=int, default=1, help='Units per checkout')
+        parser.add_argument('--keep-data', action='store_true', help='Leave the seeded product and orders')
+        parser.add_argument(
+            '--i-know', action='store_true', help='Run even though the database is not a test or benchmark one'
+        )
+
+    def handle(self, *args, **options):
+        ensure_disposable_database(options['i_know'])
+        if connection.vendor == 'sqlite' and options['workers'] > 1:
+            self.stderr.write('SQLite serialises writers: throughput does not reflect PostgreSQL row locking.')
+        product = seed_catalog(1, images_per_product=0)[0]
+        Product.objects.filter(id=product.id).update(stock=options['stock'])
+        cart = Cart(items=[CartItem(product=product, quantity=options['quantity'])])
+        remaining = iter(range(options['checkouts']))
+        lock = threading.Lock()
+        outcomes: Counter = Counter()
+        latencies: List[float] = []
+
+        def worker() -> None:
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    started = time.perf_counter()
+                    try:
+                        create_order_from_cart(cart, metadata={'source': 'stock-benchmark'})
+                        outcome = 'reserved'
+                    except OutOfStock:
+                        outcome = 'out of stock'
+                    except DatabaseError:
+                        outcome = 'database error'
+                    with lock:
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        outcomes[outcome] += 1
+            finally:
+                connection.close()
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                for future in [pool.submit(worker) for _ in range(options['workers'])]:
+                    future.result()
+            elapsed = time.perf_counter() - started
+            left = Product.objects.values_list('stock', flat=True).get(id=product.id)
+        finally:
+            if not options['keep_data']:
+                remove_orders(Order.objects.filter(items__product=product))
+                product.delete()
+        sold = outcomes['reserved'] * options['quantity']
+        summary = summarize(latencies)
+        self.stdout.write(
+            f"checkouts={options['checkouts']} workers={options['workers']} stock={options['stock']} "
+            f"quantity={options['quantity']} database={connection.vendor}"
+        )
+        self.stdout.write(f"throughput: {len(latencies) / elapsed:.1f} checkouts/s over {elapsed:.2f}s")
+        self.stdout.write(
+            f"latency ms: p50={summary['p50_ms']:.1f} p95={summary['p95_ms']:.1f} "
+            f"p99={summary['p99_ms']:.1f} max={summary['max_ms']:.1f}"
+        )
+        self.stdout.write('outcomes: ' + ', '.join(f'{name}={count}' for name, count in sorted(outcomes.items())))
+        self.stdout.write(f"sold={sold} left={left} oversold={max(sold - options['stock'], 0)}")
+        if sold > options['stock'] or left != options['stock'] - sold:
+            raise CommandError(f"Oversold: {sold} units sold from a stock of {options['stock']}, {left} left")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from store.models import ProductImage
+from store.services import catalog
+from store.services.images import PLACEHOLDER_IMAGE, build_variants
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/JPEG variants and LQIP placeholders for product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Static paths to process (default: every product image)')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+        parser.add_argument('--force', action='store_true', help='Rebuild even if the source has not changed')
+
+    def handle(self, *args, **options):
+        paths = options['paths']
+        if not paths:
+            paths = set(ProductImage.objects.values_list('image_path', flat=True))
+            paths.add(PLACEHOLDER_IMAGE)
+        report = build_variants(
+            paths,
+            workers=options['workers'],
+            force=options['force'],
+            prune=not options['paths'],
+        )
+        if report.changed or report.removed:
+            # Cached pages link the variants by their hashed names.
+            catalog.bump_version()
+        for name in report.missing:
+            self.stderr.write(f'Source not found: {name}')
+        for name in report.failed:
+            self.stderr.write(f'Failed: {name}')
+        self.stdout.write(
+            f'Built {len(report.built)}, unchanged {len(report.skipped)}, missing {len(report.missing)}, '
+            f'failed {len(report.failed)}, removed {report.removed} stale files'
+        )
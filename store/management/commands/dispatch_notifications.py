@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.services.notifications import dispatch_pending
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued Telegram notifications from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        while True:
+            processed = dispatch_pending(batch_size=batch_size)
+            if processed:
+                self.stdout.write(f'Processed {processed} notifications')
+            if options['once'] and processed < batch_size:
+                return
+            if not processed:
+                time.sleep(options['interval'])
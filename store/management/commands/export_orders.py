@@ -0,0 +1,48 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models import Order
+from store.services.exports import DEFAULT_CHUNK_SIZE, FORMAT_CSV, FORMATS, export_lines, orders_between
+
+
+def _parse_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Expected a date as YYYY-MM-DD, got {value!r}')
+
+
+class Command(BaseCommand):
+    help = 'Stream orders with their lines for a date range as CSV (one row per line) or JSONL (one order per line)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=_parse_date, help='First day to include (YYYY-MM-DD, local time)')
+        parser.add_argument('--until', type=_parse_date, help='First day to exclude (YYYY-MM-DD, local time)')
+        parser.add_argument(
+            '--status',
+            action='append',
+            choices=[status for status, _ in Order.STATUS_CHOICES],
+            help='Only these statuses; repeat for several (default: all)',
+        )
+        parser.add_argument('--format', choices=FORMATS, default=FORMAT_CSV)
+        parser.add_argument('--output', help='File to write to (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Orders fetched per round trip')
+
+    def handle(self, *args, **options):
+        queryset = orders_between(options['since'], options['until'], options['status'] or ())
+        lines = export_lines(queryset, options['format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                written = self._write(lines, output)
+            self.stderr.write(f"Wrote {written} lines to {options['output']}")
+        else:
+            self._write(lines, self.stdout)
+
+    @staticmethod
+    def _write(lines, output) -> int:
+        written = 0
+        for line in lines:
+            output.write(line)
+            written += 1
+        return written
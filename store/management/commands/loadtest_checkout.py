@@ -0,0 +1,92 @@
+import asyncio
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from store.models import Order
+
+from ._benchmark import ensure_disposable_database, summarize
+from ._provider_stubs import StubServer, yookassa_handler
+from ._seed import remove_orders, seed_catalog
+
+
+class Command(BaseCommand):
+    help = 'Drive buy_product against a local YooKassa stub with artificial latency and report throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=100, help='In-flight requests in asgi mode')
+        parser.add_argument('--workers', type=int, default=4, help='Worker threads in wsgi mode')
+        parser.add_argument('--latency', type=float, default=0.5, help='Provider latency in seconds')
+        parser.add_argument('--error-rate', type=float, default=0.0)
+        parser.add_argument('--mode', choices=['asgi', 'wsgi'], default='asgi')
+        parser.add_argument(
+            '--i-know', action='store_true', help='Run even though the database is not a test or benchmark one'
+        )
+
+    def handle(self, *args, **options):
+        ensure_disposable_database(options['i_know'])
+        # A product of its own: the run neither sells real stock nor has to guess which orders it created.
+        product = seed_catalog(1, images_per_product=0)[0]
+        url = reverse('store:buy_product', args=[product.slug])
+        try:
+            with StubServer(yookassa_handler, latency=options['latency'], error_rate=options['error_rate']) as stub:
+                with override_settings(
+                    YOOKASSA_API_URL=stub.url,
+                    YOOKASSA_SHOP_ID='loadtest',
+                    YOOKASSA_SECRET_KEY='loadtest',
+                    YOOKASSA_POOL_SIZE=max(options['concurrency'], options['workers']),
+                    # Every simulated buyer shares one address.
+                    RATE_LIMIT_ENABLED=False,
+                ):
+                    started = time.perf_counter()
+                    if options['mode'] == 'asgi':
+                        results = asyncio.run(self._run_asgi(url, options['requests'], options['concurrency']))
+                    else:
+                        results = self._run_wsgi(url, options['requests'], options['workers'])
+                    elapsed = time.perf_counter() - started
+        finally:
+            # Orders whose payment could not be created have no payment_id, so they are found by their items.
+            remove_orders(Order.objects.filter(items__product=product))
+            product.delete()
+        self._report(options, results, elapsed)
+
+    async def _run_asgi(self, url: str, total: int, concurrency: int) -> List[Tuple[int, float]]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one() -> Tuple[int, float]:
+            async with semaphore:
+                started = time.perf_counter()
+                response = await AsyncClient().post(url, {'quantity': 1})
+                return response.status_code, time.perf_counter() - started
+
+        return await asyncio.gather(*(one() for _ in range(total)))
+
+    def _run_wsgi(self, url: str, total: int, workers: int) -> List[Tuple[int, float]]:
+        def one(_) -> Tuple[int, float]:
+            started = time.perf_counter()
+            response = Client().post(url, {'quantity': 1})
+            return response.status_code, time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(one, range(total)))
+
+    def _report(self, options, results: List[Tuple[int, float]], elapsed: float) -> None:
+        summary = summarize([latency * 1000 for _, latency in results])
+        statuses = Counter(status for status, _ in results)
+        parallelism = options['concurrency'] if options['mode'] == 'asgi' else options['workers']
+        self.stdout.write(
+            f"mode={options['mode']} parallelism={parallelism} provider_latency={options['latency']:.3f}s "
+            f"requests={len(results)}"
+        )
+        self.stdout.write(f'throughput: {len(results) / elapsed:.1f} req/s over {elapsed:.2f}s')
+        self.stdout.write(
+            f"latency ms: p50={summary['p50_ms']:.0f} p95={summary['p95_ms']:.0f} "
+            f"p99={summary['p99_ms']:.0f} max={summary['max_ms']:.0f}"
+        )
+        self.stdout.write('statuses: ' + ', '.join(f'{status}={count}' for status, count in sorted(statuses.items())))
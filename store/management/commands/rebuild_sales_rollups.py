@@ -0,0 +1,27 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.services.sales import rebuild
+
+
+def _parse_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Expected a date as YYYY-MM-DD, got {value!r}')
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups from paid orders, one window of days per transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=_parse_date, help='First day to rebuild (default: first paid order)')
+        parser.add_argument('--until', type=_parse_date, help='First day to leave alone (default: tomorrow)')
+        parser.add_argument('--chunk-days', type=int, default=31, help='Days recomputed per transaction')
+
+    def handle(self, *args, **options):
+        if options['chunk_days'] < 1:
+            raise CommandError('--chunk-days must be positive')
+        report = rebuild(options['since'], options['until'], options['chunk_days'])
+        self.stdout.write(f'Rebuilt {report.days} days: {report.rows} rollup rows')
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from store.services.reconciliation import reconcile_awaiting_orders
+
+
+class Command(BaseCommand):
+    help = 'Re-check YooKassa for orders stuck awaiting payment confirmation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=30, help='Minutes since the order was created')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent YooKassa requests')
+        parser.add_argument('--rate', type=float, default=10.0, help='Maximum YooKassa requests per second')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without saving')
+
+    def handle(self, *args, **options):
+        report = reconcile_awaiting_orders(
+            older_than=timedelta(minutes=options['older_than']),
+            workers=options['workers'],
+            rate=options['rate'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(
+            f'{prefix}Checked {report.checked} orders: {report.updated} updated, '
+            f'{report.unchanged} still awaiting, {report.errors} errors'
+        )
+        for status, count in sorted(report.transitions.items()):
+            self.stdout.write(f'  {status}: {count}')
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.services.inventory import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Return the stock held by orders that stayed unpaid for too long'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=None,
+            help='Minutes since the order was created (default: STOCK_RESERVATION_MINUTES)',
+        )
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        minutes = options['older_than'] if options['older_than'] is not None else settings.STOCK_RESERVATION_MINUTES
+        released = release_expired(timedelta(minutes=minutes), batch_size=options['batch_size'])
+        self.stdout.write(f'Released stock of {released} unpaid orders older than {minutes} minutes')
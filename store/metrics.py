@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_HEADER = struct.Struct('<I4x')
+_KEY_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+_INITIAL_SIZE = 64 * 1024
+
+
+class MmapValues:
+    """Append-only key -> float64 file written by a single process and readable by any other.
+
+    Layout: used-bytes header, then entries of (key length, utf-8 key padded to 8 bytes, value).
+    The value is written before the header moves, so readers never see a half-written entry.
+    """
+
+    def __init__(self, path: Path):
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(_INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        self._positions = {key: position for key, _, position in _read_entries(self._map, self._used)}
+
+    def get(self, key: str) -> float:
+        position = self._positions.get(key)
+        return 0.0 if position is None else _VALUE.unpack_from(self._map, position)[0]
+
+    def set(self, key: str, value: float) -> None:
+        position = self._positions.get(key)
+        if position is None:
+            position = self._append(key)
+        _VALUE.pack_into(self._map, position, value)
+
+    def _append(self, key: str) -> int:
+        encoded = key.encode('utf-8')
+        padded = len(encoded) + (-(_KEY_LENGTH.size + len(encoded)) % 8)
+        size = _KEY_LENGTH.size + padded + _VALUE.size
+        while self._used + size > len(self._map):
+            self._map.close()
+            self._file.truncate(os.fstat(self._file.fileno()).st_size * 2)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + _KEY_LENGTH.size:self._used + _KEY_LENGTH.size + len(encoded)] = encoded
+        position = self._used + _KEY_LENGTH.size + padded
+        _VALUE.pack_into(self._map, position, 0.0)
+        self._used += size
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+
+def _read_entries(data, used: int) -> Iterable[Tuple[str, float, int]]:
+    offset = _HEADER.size
+    while offset < used:
+        length = _KEY_LENGTH.unpack_from(data, offset)[0]
+        key = bytes(data[offset + _KEY_LENGTH.size:offset + _KEY_LENGTH.size + length]).decode('utf-8')
+        position = offset + _KEY_LENGTH.size + length + (-(_KEY_LENGTH.size + length) % 8)
+        yield key, _VALUE.unpack_from(data, position)[0], position
+        offset = position + _VALUE.size
+
+
+def read_values_file(path: Path) -> Dict[str, float]:
+    data = path.read_bytes()
+    if len(data) < _HEADER.size:
+        return {}
+    used = min(_HEADER.unpack_from(data, 0)[0], len(data))
+    return {key: value for key, value, _ in _read_entries(data, used)}
+
+
+class _Store:
+    """Per-process values: in memory, or one mmap file per kind and pid under METRICS_DIR."""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory) if directory else None
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._files: Dict[str, MmapValues] = {}
+        self._memory: Dict[str, Dict[str, float]] = {}
+        if self.directory:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def update(self, kind: str, key: str, amount: float = 0.0, value: Optional[float] = None) -> None:
+        with self._lock:
+            if self.directory is None:
+                values = self._memory.setdefault(kind, {})
+                values[key] = value if value is not None else values.get(key, 0.0) + amount
+                return
+            values = self._files.get(kind)
+            if values is None:
+                values = self._files[kind] = MmapValues(self.directory / f'{kind}_{self.pid}.db')
+            values.set(key, value if value is not None else values.get(key) + amount)
+
+    def collect(self) -> Dict[str, List[Dict[str, float]]]:
+        if self.directory is None:
+            with self._lock:
+                return {kind: [dict(values)] for kind, values in self._memory.items()}
+        collected: Dict[str, List[Dict[str, float]]] = {}
+        for path in sorted(self.directory.glob('*.db')):
+            kind, _, _ = path.stem.rpartition('_')
+            try:
+                collected.setdefault(kind, []).append(read_values_file(path))
+            except OSError:
+                continue  # Removed by mark_process_dead while we were reading.
+        return collected
+
+
+_store: Optional[_Store] = None
+_store_lock = threading.Lock()
+
+
+def _get_store() -> _Store:
+    global _store
+    # gunicorn forks after import: a worker must not keep writing to the master's files.
+    if _store is None or _store.pid != os.getpid() or _store.directory != _directory():
+        with _store_lock:
+            if _store is None or _store.pid != os.getpid() or _store.directory != _directory():
+                _store = _Store(settings.METRICS_DIR)
+    return _store
+
+
+def _directory() -> Optional[Path]:
+    return Path(settings.METRICS_DIR) if settings.METRICS_DIR else None
+
+
+def reset() -> None:
+    global _store
+    with _store_lock:
+        _store = None
+
+
+def mark_process_dead(pid: int) -> None:
+    # For gunicorn's child_exit hook: gauges of a dead worker no longer describe anything.
+    if settings.METRICS_DIR:
+        for path in Path(settings.METRICS_DIR).glob(f'gauge_{pid}.db'):
+            path.unlink(missing_ok=True)
+
+
+def _key(sample: str, labels: Dict[str, str]) -> str:
+    return json.dumps([sample, sorted(labels.items())], ensure_ascii=False)
+
+
+class _Metric:
+    kind = 'counter'
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        _REGISTRY[name] = self
+
+    def _labels(self, labels: Dict[str, object]) -> Dict[str, str]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return {name: str(value) for name, value in labels.items()}
+
+    def merge(self, values: List[float]) -> float:
+        return sum(values)
+
+
+class Counter(_Metric):
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        _get_store().update(self.kind, _key(self.name, self._labels(labels)), amount=amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+    type_name = 'gauge'
+
+    def __init__(self, *args, aggregate: str = 'sum', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.aggregate = aggregate
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        _get_store().update(self.kind, _key(self.name, self._labels(labels)), amount=amount)
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        _get_store().update(self.kind, _key(self.name, self._labels(labels)), value=value)
+
+    def merge(self, values: List[float]) -> float:
+        return max(values) if self.aggregate == 'max' else sum(values)
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels) -> None:
+        labels = self._labels(labels)
+        store = _get_store()
+        # Buckets are stored cumulatively so exposition is a plain read.
+        for bound in self.buckets:
+            if value <= bound:
+                store.update(self.kind, _key(f'{self.name}_bucket', {**labels, 'le': _format(bound)}), amount=1)
+        store.update(self.kind, _key(f'{self.name}_sum', labels), amount=value)
+        store.update(self.kind, _key(f'{self.name}_count', labels), amount=1)
+
+
+_REGISTRY: Dict[str, _Metric] = {}
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _metric_name(sample: str) -> str:
+    if sample in _REGISTRY:
+        return sample
+    for suffix in ('_bucket', '_sum', '_count'):
+        if sample.endswith(suffix) and sample[: -len(suffix)] in _REGISTRY:
+            return sample[: -len(suffix)]
+    return sample
+
+
+def _sort_key(item: Tuple[str, float]) -> tuple:
+    sample, labels = json.loads(item[0])
+    le = dict(labels).get('le')
+    # Buckets in numeric order, then _sum and _count, per label set.
+    labels_without_le = [pair for pair in labels if pair[0] != 'le']
+    return (labels_without_le, sample.endswith('_count'), sample.endswith('_sum'), float(le) if le else 0.0)
+
+
+def render() -> str:
+    merged: Dict[str, Dict[str, List[float]]] = {}
+    for sources in _get_store().collect().values():
+        for values in sources:
+            for key, value in values.items():
+                sample, _ = json.loads(key)
+                merged.setdefault(_metric_name(sample), {}).setdefault(key, []).append(value)
+    lines = []
+    for name, metric in sorted(_REGISTRY.items()):
+        samples = merged.get(name, {})
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type_name}')
+        for key, values in sorted(samples.items(), key=_sort_key):
+            sample, labels = json.loads(key)
+            if labels:
+                sample += '{' + ','.join(f'{label}="{_escape(value)}"' for label, value in labels) + '}'
+            lines.append(f'{sample} {_format(metric.merge(values))}')
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_DURATION = Histogram(
+    'rml_http_request_duration_seconds', 'Time spent handling a request.', ('view', 'status')
+)
+REQUESTS_IN_PROGRESS = Gauge('rml_http_requests_in_progress', 'Requests currently being handled.')
+DB_QUERIES = Counter('rml_db_queries_total', 'SQL statements executed while handling requests.', ('view',))
+DB_QUERY_SECONDS = Counter('rml_db_query_seconds_total', 'Time spent in SQL while handling requests.', ('view',))
+DEPENDENCY_DURATION = Histogram(
+    'rml_dependency_duration_seconds',
+    'Calls to external services.',
+    ('service', 'operation', 'outcome'),
+)
+YOOKASSA_CIRCUIT_OPEN = Gauge(
+    'rml_yookassa_circuit_open', 'Whether any worker has the YooKassa circuit breaker open.', aggregate='max'
+)
+ORDER_TRANSITIONS = Counter(
+    'rml_order_status_transitions_total', 'Order status changes.', ('from_status', 'to_status')
+)
+RATE_LIMITED = Counter('rml_rate_limited_total', 'Requests rejected with 429 by the rate limiter.', ('view',))
+
+
+def record_order_transition(previous: str, current: str) -> None:
+    if previous != current:
+        ORDER_TRANSITIONS.inc(from_status=previous, to_status=current)
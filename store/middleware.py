@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import logging
+import mimetypes
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from store import metrics, ratelimit
+from store.query_budget import QueryStats, arecord_queries, record_queries
+from store.services.cart_storage import PENDING_ATTR
+
+logger = logging.getLogger(__name__)
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Preferred first when the client accepts several.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class HybridMiddleware:
+    """Runs in whichever mode the rest of the chain uses, so ASGI requests never hop through a thread here.
+
+    Subclasses hand `__call__` over to `__acall__` when `async_mode` is set, as Django's MiddlewareMixin does.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+class CartCookieMiddleware(HybridMiddleware):
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self._set_cookie(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._set_cookie(request, await self.get_response(request))
+
+    def _set_cookie(self, request, response):
+        value = getattr(request, PENDING_ATTR, None)
+        if value is None:
+            return response
+        if value:
+            response.set_cookie(
+                settings.CART_COOKIE_NAME,
+                value,
+                max_age=settings.CART_COOKIE_AGE,
+                secure=settings.CART_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        else:
+            response.delete_cookie(settings.CART_COOKIE_NAME, samesite='Lax')
+        return response
+
+
+@dataclass
+class StaticAsset:
+    path: Path
+    content_type: str
+    mtime: float
+    immutable: bool
+    encoded: List[Tuple[str, Path]] = field(default_factory=list)
+
+
+def _index_static_root() -> Dict[str, StaticAsset]:
+    root = Path(settings.STATIC_ROOT)
+    hashed = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+    assets = {}
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            path = Path(directory) / filename
+            if path.suffix in {suffix for _, suffix in ENCODINGS}:
+                continue
+            name = path.relative_to(root).as_posix()
+            content_type, _ = mimetypes.guess_type(filename)
+            assets[name] = StaticAsset(
+                path=path,
+                content_type=content_type or 'application/octet-stream',
+                mtime=path.stat().st_mtime,
+                immutable=name in hashed,
+                encoded=[
+                    (encoding, path.with_name(filename + suffix))
+                    for encoding, suffix in ENCODINGS
+                    if path.with_name(filename + suffix).exists()
+                ],
+            )
+    return assets
+
+
+def _accepted_encodings(request) -> set:
+    accepted = set()
+    for part in request.headers.get('accept-encoding', '').split(','):
+        encoding, _, params = part.partition(';')
+        quality = params.strip().removeprefix('q=')
+        try:
+            if quality and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(encoding.strip().lower())
+    return accepted
+
+
+class StaticAssetsMiddleware(HybridMiddleware):
+    """Serves collected static files before the session/CSRF stack runs.
+
+    The file list is read once at startup, so collectstatic needs a restart to be picked up.
+    """
+
+    def __init__(self, get_response):
+        if not settings.STATIC_SERVE:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.prefix = settings.STATIC_URL
+        self.assets = _index_static_root()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        asset = self._match(request)
+        if asset is not None:
+            return self._serve(request, asset)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        asset = self._match(request)
+        if asset is not None:
+            return self._serve(request, asset)
+        return await self.get_response(request)
+
+    def _match(self, request) -> Optional[StaticAsset]:
+        if request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix):
+            return self.assets.get(request.path[len(self.prefix):])
+        return None
+
+    def _serve(self, request, asset: StaticAsset) -> HttpResponse:
+        if not asset.immutable and not was_modified_since(request.headers.get('if-modified-since'), asset.mtime):
+            return HttpResponseNotModified()
+        path, encoding = asset.path, None
+        accepted = _accepted_encodings(request)
+        for candidate, candidate_path in asset.encoded:
+            if candidate in accepted:
+                path, encoding = candidate_path, candidate
+                break
+        if settings.STATIC_ACCEL_REDIRECT_PREFIX:
+            # The front server streams the file with sendfile; we only pick the variant and the headers.
+            response = HttpResponse(content_type=asset.content_type)
+            relative = path.relative_to(settings.STATIC_ROOT).as_posix()
+            response['X-Accel-Redirect'] = settings.STATIC_ACCEL_REDIRECT_PREFIX + relative
+        else:
+            # FileResponse hands the file to wsgi.file_wrapper, which gunicorn and uWSGI send with sendfile().
+            response = FileResponse(path.open('rb'), content_type=asset.content_type)
+            response.headers.pop('Content-Disposition', None)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if asset.encoded:
+            response['Vary'] = 'Accept-Encoding'
+        response['Last-Modified'] = http_date(asset.mtime)
+        response['Cache-Control'] = (
+            IMMUTABLE_CACHE_CONTROL if asset.immutable else f'public, max-age={settings.STATIC_MAX_AGE}'
+        )
+        return response
+
+
+class QueryBudgetMiddleware(HybridMiddleware):
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.QUERY_BUDGET_ENABLED:
+            return self.get_response(request)
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        return self._report(request, response, recorder)
+
+    async def __acall__(self, request):
+        if not settings.QUERY_BUDGET_ENABLED:
+            return await self.get_response(request)
+        async with arecord_queries() as recorder:
+            response = await self.get_response(request)
+        return self._report(request, response, recorder)
+
+    def _report(self, request, response, recorder):
+        match = request.resolver_match
+        if match is None:
+            return response
+        stats = QueryStats.from_recorder(match.view_name, recorder)
+        response.query_stats = stats
+        if stats.over_budget:
+            logger.warning('%s exceeded its query budget: %s', stats.view_name, stats.header_value())
+        if settings.QUERY_BUDGET_HEADER:
+            response['X-Query-Budget'] = stats.header_value()
+            response['Server-Timing'] = f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+        return response
+
+
+class RateLimitMiddleware(HybridMiddleware):
+    """Applies RATE_LIMITS by URL name before the view, the session or CSRF checks do any work."""
+
+    def __init__(self, get_response):
+        if not settings.RATE_LIMIT_ENABLED or not settings.RATE_LIMITS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        rate = settings.RATE_LIMITS.get(match.view_name) if match else None
+        if rate is None:
+            return None
+        return ratelimit.check(request, match.view_name, rate)
+
+
+class MetricsMiddleware(HybridMiddleware):
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics.REQUESTS_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            with record_queries() as recorder:
+                response = self.get_response(request)
+        finally:
+            metrics.REQUESTS_IN_PROGRESS.dec()
+        return self._observe(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        metrics.REQUESTS_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            async with arecord_queries() as recorder:
+                response = await self.get_response(request)
+        finally:
+            metrics.REQUESTS_IN_PROGRESS.dec()
+        return self._observe(request, response, recorder, started)
+
+    def _observe(self, request, response, recorder, started: float):
+        # Unresolved paths share one label so scanners cannot blow up the series count.
+        view = request.resolver_match.view_name if request.resolver_match else 'unmatched'
+        metrics.REQUEST_DURATION.observe(time.perf_counter() - started, view=view, status=response.status_code)
+        if recorder.queries:
+            metrics.DB_QUERIES.inc(len(recorder.queries), view=view)
+            metrics.DB_QUERY_SECONDS.inc(sum(duration for _, duration in recorder.queries), view=view)
+        return response
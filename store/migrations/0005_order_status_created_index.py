@@ -0,0 +1,19 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0004_notification_outbox"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["status", "created_at"], name="store_order_status_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0005_order_status_created_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="productimage",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, db_index=True, verbose_name="Обновлено"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="product",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, db_index=True, verbose_name="Обновлено"
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0006_product_updated_at_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["created_at", "id"], name="store_order_created_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0007_order_created_id_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("notified_at__isnull", True), ("status", "paid")),
+                fields=["created_at"],
+                name="store_order_unnotified_idx",
+            ),
+        ),
+    ]
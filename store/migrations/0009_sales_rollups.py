@@ -0,0 +1,117 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:37
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0008_order_unnotified_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(unique=True, verbose_name="День")),
+                (
+                    "orders",
+                    models.PositiveIntegerField(default=0, verbose_name="Заказов"),
+                ),
+                (
+                    "quantity",
+                    models.PositiveIntegerField(default=0, verbose_name="Товаров"),
+                ),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        max_digits=14,
+                        verbose_name="Выручка",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Продажи за день",
+                "verbose_name_plural": "Продажи по дням",
+                "ordering": ["-day"],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyProductSales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(verbose_name="День")),
+                (
+                    "product_name",
+                    models.CharField(max_length=255, verbose_name="Название товара"),
+                ),
+                (
+                    "orders",
+                    models.PositiveIntegerField(default=0, verbose_name="Заказов"),
+                ),
+                (
+                    "quantity",
+                    models.PositiveIntegerField(default=0, verbose_name="Количество"),
+                ),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        max_digits=14,
+                        verbose_name="Выручка",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        blank=True,
+                        db_constraint=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="store.product",
+                        verbose_name="Товар",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Продажи товара за день",
+                "verbose_name_plural": "Продажи товаров по дням",
+                "ordering": ["-day", "product_name"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("product__isnull", False)),
+                        fields=("day", "product"),
+                        name="store_daily_product_unique",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("product__isnull", True)),
+                        fields=("day",),
+                        name="store_daily_orphan_unique",
+                    ),
+                ],
+            },
+        ),
+    ]
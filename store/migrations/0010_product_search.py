@@ -0,0 +1,63 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:40
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# The vector is maintained by the database so bulk writes and raw SQL keep it current too.
+CREATE_SEARCH_SQL = [
+    """
+    CREATE FUNCTION store_product_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('pg_catalog.russian', coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('pg_catalog.russian', coalesce(NEW.description, '')), 'B')
+            || setweight(jsonb_to_tsvector('pg_catalog.russian', coalesce(NEW.details, '[]'::jsonb), '["string"]'), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER store_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, description, details ON store_product
+    FOR EACH ROW EXECUTE FUNCTION store_product_search_vector_update()
+    """,
+    'UPDATE store_product SET name = name',
+    'CREATE INDEX store_product_search_idx ON store_product USING gin (search_vector)',
+    'CREATE INDEX store_product_name_trgm_idx ON store_product USING gin (name gin_trgm_ops)',
+]
+DROP_SEARCH_SQL = [
+    'DROP INDEX IF EXISTS store_product_name_trgm_idx',
+    'DROP INDEX IF EXISTS store_product_search_idx',
+    'DROP TRIGGER IF EXISTS store_product_search_vector_trigger ON store_product',
+    'DROP FUNCTION IF EXISTS store_product_search_vector_update()',
+]
+
+
+def _run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0009_sales_rollups"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(_run_on_postgresql(CREATE_SEARCH_SQL), _run_on_postgresql(DROP_SEARCH_SQL)),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0010_product_search"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["first_line", "id"], name="store_product_line_id_idx"
+            ),
+        ),
+    ]
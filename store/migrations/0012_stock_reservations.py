@@ -0,0 +1,38 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0011_product_line_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="stock_reserved",
+            field=models.BooleanField(
+                default=False, verbose_name="Товар зарезервирован"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="stock",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="Остаток"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(
+                    ("status__in", ["pending", "awaiting_confirmation"]),
+                    ("stock_reserved", True),
+                ),
+                fields=["created_at"],
+                name="store_order_reserved_idx",
+            ),
+        ),
+    ]
@@ -1,7 +1,9 @@
 from decimal import Decimal
 
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
 
 
 class Product(models.Model):
@@ -11,11 +13,16 @@ class Product(models.Model):
     price = models.DecimalField('Цена', max_digits=10, decimal_places=2)
     details = models.JSONField('Детали', default=list, blank=True)
     first_line = models.BooleanField('Первая линия', default=True)
+    # Empty means the product is not stock-tracked and can always be ordered.
+    stock = models.PositiveIntegerField('Остаток', null=True, blank=True)
     created_at = models.DateTimeField('Создано', auto_now_add=True)
-    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True, db_index=True)
+    # Filled by a database trigger on PostgreSQL (migration 0010); stays empty elsewhere.
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ['-first_line', 'id']
+        indexes = [models.Index(fields=['first_line', 'id'], name='store_product_line_id_idx')]
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
 
@@ -26,7 +33,8 @@ class Product(models.Model):
         return reverse('store:product_detail', args=[self.slug])
 
     def main_image(self):
-        return self.images.first()
+        # Reads the prefetched images instead of issuing a query per product.
+        return next(iter(self.images.all()), None)
 
 
 class ProductImage(models.Model):
@@ -34,6 +42,7 @@ class ProductImage(models.Model):
     image_path = models.CharField('Путь к изображению', max_length=255)
     alt_text = models.CharField('Описание', max_length=255, blank=True)
     sort_order = models.PositiveIntegerField('Порядок', default=0)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True, db_index=True)
 
     class Meta:
         ordering = ['sort_order', 'id']
@@ -67,11 +76,30 @@ class Order(models.Model):
     metadata = models.JSONField('Метаданные', default=dict, blank=True)
     notified_at = models.DateTimeField('Уведомлено продавцов', null=True, blank=True)
     cart_snapshot = models.JSONField('Состав заказа (слепок)', default=list, blank=True)
+    # Set while the order holds stock; cleared when the reservation is released.
+    stock_reserved = models.BooleanField('Товар зарезервирован', default=False)
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='store_order_status_created_idx'),
+            # Admin date_hierarchy ranges and keyset pages ordered by (-created_at, -id).
+            models.Index(fields=['created_at', 'id'], name='store_order_created_id_idx'),
+            # Paid orders whose seller notification has not gone out yet: a handful of rows at any time.
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(status='paid', notified_at__isnull=True),
+                name='store_order_unnotified_idx',
+            ),
+            # Unpaid orders still holding stock, scanned by release_expired_reservations.
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(stock_reserved=True, status__in=['pending', 'awaiting_confirmation']),
+                name='store_order_reserved_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return f'Order #{self.pk or "draft"} — {self.status}'
@@ -106,4 +134,112 @@ class OrderItem(models.Model):
     def line_total(self) -> Decimal:
         return self.unit_price * self.quantity
 
+
+class NotificationOutbox(models.Model):
+    KIND_ORDER_PAID = 'order_paid'
+    KIND_PARTNERSHIP = 'partnership'
+    KIND_CHOICES = [
+        (KIND_ORDER_PAID, 'Оплата заказа'),
+        (KIND_PARTNERSHIP, 'Заявка на сотрудничество'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Ожидает отправки'),
+        (STATUS_SENT, 'Отправлено'),
+        (STATUS_DEAD, 'Не доставлено'),
+    ]
+
+    kind = models.CharField('Тип', max_length=32, choices=KIND_CHOICES)
+    status = models.CharField('Статус', max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    order = models.ForeignKey(
+        Order,
+        related_name='notifications',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        verbose_name='Заказ',
+    )
+    text = models.TextField('Текст')
+    pending_chat_ids = models.JSONField('Ожидают получатели', default=list, blank=True)
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    available_at = models.DateTimeField('Следующая попытка', default=timezone.now)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    sent_at = models.DateTimeField('Отправлено', null=True, blank=True)
+
+    class Meta:
+        ordering = ['available_at', 'id']
+        verbose_name = 'Уведомление'
+        verbose_name_plural = 'Очередь уведомлений'
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='store_outbox_due_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'order'],
+                condition=models.Q(order__isnull=False),
+                name='store_outbox_unique_order_kind',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.get_kind_display()} #{self.pk} — {self.status}'
+
+
+class DailySales(models.Model):
+    day = models.DateField('День', unique=True)
+    orders = models.PositiveIntegerField('Заказов', default=0)
+    quantity = models.PositiveIntegerField('Товаров', default=0)
+    revenue = models.DecimalField('Выручка', max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        ordering = ['-day']
+        verbose_name = 'Продажи за день'
+        verbose_name_plural = 'Продажи по дням'
+
+    def __str__(self) -> str:
+        return f'{self.day}: {self.orders} заказов, {self.revenue}'
+
+
+class DailyProductSales(models.Model):
+    day = models.DateField('День')
+    # Rollups outlive the catalog: keep the id of a deleted product instead of cascading.
+    product = models.ForeignKey(
+        Product,
+        null=True,
+        blank=True,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+        verbose_name='Товар',
+    )
+    product_name = models.CharField('Название товара', max_length=255)
+    orders = models.PositiveIntegerField('Заказов', default=0)
+    quantity = models.PositiveIntegerField('Количество', default=0)
+    revenue = models.DecimalField('Выручка', max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        ordering = ['-day', 'product_name']
+        verbose_name = 'Продажи товара за день'
+        verbose_name_plural = 'Продажи товаров по дням'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'product'],
+                condition=models.Q(product__isnull=False),
+                name='store_daily_product_unique',
+            ),
+            # Lines whose product was deleted share one row per day.
+            models.UniqueConstraint(
+                fields=['day'],
+                condition=models.Q(product__isnull=True),
+                name='store_daily_orphan_unique',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.day}: {self.product_name} x{self.quantity}'
+
 # Create your models here.
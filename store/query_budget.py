@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import time
+from collections import Counter
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+
+
+class QueryRecorder:
+    """Execute wrapper that records every statement on the connections it is installed on."""
+
+    def __init__(self):
+        self.queries: List[Tuple[str, float]] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+
+@contextmanager
+def record_queries() -> Iterator[QueryRecorder]:
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+@asynccontextmanager
+async def arecord_queries() -> AsyncIterator[QueryRecorder]:
+    # Connections are per thread; an async request runs its ORM calls in the thread-sensitive sync thread.
+    stack = ExitStack()
+    recorder = await sync_to_async(stack.enter_context)(record_queries())
+    try:
+        yield recorder
+    finally:
+        await sync_to_async(stack.close)()
+
+
+@dataclass
+class QueryStats:
+    view_name: str
+    count: int
+    duration: float
+    duplicates: int
+    budget: Optional[int]
+
+    @classmethod
+    def from_recorder(cls, view_name: str, recorder: QueryRecorder) -> 'QueryStats':
+        # Same statement text with different parameters is the usual shape of an N+1.
+        statements = Counter(sql for sql, _ in recorder.queries)
+        return cls(
+            view_name=view_name,
+            count=len(recorder.queries),
+            duration=sum(duration for _, duration in recorder.queries),
+            duplicates=sum(times - 1 for times in statements.values()),
+            budget=settings.QUERY_BUDGETS.get(view_name),
+        )
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.count > self.budget
+
+    def header_value(self) -> str:
+        budget = '-' if self.budget is None else self.budget
+        return (
+            f'view={self.view_name}; queries={self.count}; budget={budget}; '
+            f'duplicates={self.duplicates}; db_ms={self.duration * 1000:.1f}'
+        )
+
+
+class QueryBudgetTestMixin:
+    """For TestCase: requests made through self.client are measured against QUERY_BUDGETS."""
+
+    def assertWithinQueryBudget(self, response) -> QueryStats:
+        stats = getattr(response, 'query_stats', None)
+        if stats is None:
+            self.fail('Response has no query stats; is QueryBudgetMiddleware enabled?')
+        if stats.budget is None:
+            self.fail(f'No query budget declared for {stats.view_name}')
+        if stats.over_budget:
+            self.fail(f'{stats.view_name} ran {stats.count} queries, budget is {stats.budget}')
+        return stats
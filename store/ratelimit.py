@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from functools import lru_cache, wraps
+from typing import Dict, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest, HttpResponse, JsonResponse
+
+from store import metrics
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED_MESSAGE = 'Слишком много запросов. Попробуйте ещё раз чуть позже.'
+_UNITS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+_PREVIOUS_MEMO_SIZE = 10_000
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate: str) -> Tuple[int, int]:
+    # '30/m' -> (30, 60); '5/10m' -> (5, 600).
+    count, _, period = rate.partition('/')
+    try:
+        return int(count), int(period[:-1] or 1) * _UNITS[period[-1:]]
+    except (KeyError, ValueError):
+        raise ValueError(f'Invalid rate {rate!r}; expected "<count>/<n><s|m|h|d>"') from None
+
+
+def client_ip(request: HttpRequest) -> str:
+    value = request.META.get(settings.RATE_LIMIT_IP_HEADER, '')
+    return value.split(',')[0].strip() or 'unknown'
+
+
+class _PreviousWindows:
+    """Counts of finished windows, remembered per process.
+
+    A window stops changing once it is over, so each process reads it from the cache only once and
+    the usual cost of a check is the single incr of the current window.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+
+    def get(self, key: str) -> int:
+        count = self._counts.get(key)
+        if count is None:
+            count = caches[settings.RATE_LIMIT_CACHE].get(key, 0)
+            with self._lock:
+                if len(self._counts) >= _PREVIOUS_MEMO_SIZE:
+                    self._counts.clear()
+                self._counts[key] = count
+        return count
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+_previous = _PreviousWindows()
+
+
+def reset() -> None:
+    _previous.clear()
+
+
+def _incr(key: str, timeout: int) -> int:
+    cache = caches[settings.RATE_LIMIT_CACHE]
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # First hit in this window; add() loses to a concurrent first hit, which then already counted.
+        if cache.add(key, 1, timeout=timeout):
+            return 1
+        return cache.incr(key)
+
+
+def hit(scope: str, identity: str, rate: str, now: Optional[float] = None) -> Optional[int]:
+    """Count one request; return the seconds to wait if it is over the limit, otherwise None.
+
+    Sliding window counter: the current window's count plus the previous window's count weighted by
+    how much of it still overlaps the last `period` seconds.
+    """
+    limit, period = parse_rate(rate)
+    now = time.time() if now is None else now
+    window, offset = divmod(now, period)
+    key = f'ratelimit:{scope}:{identity}:{int(window)}'
+    retry_after = max(math.ceil(period - offset), 1)
+    try:
+        count = _incr(key, timeout=period * 2)
+        if count > limit:
+            return retry_after
+        previous = _previous.get(f'ratelimit:{scope}:{identity}:{int(window) - 1}')
+    except Exception:  # noqa: BLE001
+        # A cache outage must not take the shop down with it.
+        logger.exception('Rate limit cache is unavailable, letting the request through')
+        return None
+    if count + previous * (1 - offset / period) > limit:
+        return retry_after
+    return None
+
+
+def too_many_requests(request: HttpRequest, scope: str, retry_after: int) -> HttpResponse:
+    metrics.RATE_LIMITED.inc(view=scope)
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest' or request.content_type == 'application/json':
+        response = JsonResponse({'error': RATE_LIMITED_MESSAGE}, status=429)
+    else:
+        response = HttpResponse(RATE_LIMITED_MESSAGE, status=429, content_type='text/plain; charset=utf-8')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def check(request: HttpRequest, scope: str, rate: str) -> Optional[HttpResponse]:
+    if not settings.RATE_LIMIT_ENABLED:
+        return None
+    retry_after = hit(scope, client_ip(request), rate)
+    if retry_after is None:
+        return None
+    return too_many_requests(request, scope, retry_after)
+
+
+def rate_limit(rate: str, scope: Optional[str] = None):
+    """Limit a view that is not covered by RATE_LIMITS, e.g. `@rate_limit('10/m')`."""
+
+    def decorator(view):
+        name = scope or f'{view.__module__}.{view.__qualname__}'
+        if iscoroutinefunction(view):
+
+            @wraps(view)
+            async def async_wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+                return check(request, name, rate) or await view(request, *args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+            return check(request, name, rate) or view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
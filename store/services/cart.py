@@ -1,12 +1,13 @@
 from __future__ import annotations
 
+import hashlib
 from dataclasses import dataclass
 from decimal import Decimal
-from typing import Dict, List
-
-from django.conf import settings
+from typing import Dict, Iterable, List, Set, Tuple
 
 from store.models import Product
+from store.services import catalog
+from store.services.cart_storage import get_storage
 
 
 @dataclass
@@ -32,19 +33,37 @@ class Cart:
         return sum((item.total_price for item in self.items), Decimal('0.00'))
 
 
-def _get_session_cart(request) -> Dict[str, int]:
-    return dict(request.session.get(settings.CART_SESSION_KEY, {}))
+_REQUEST_CART_ATTR = '_store_cart'
+_OPERATIONS = ('delta', 'set', 'remove')
 
 
-def _persist_session_cart(request, cart_data: Dict[str, int]) -> None:
-    request.session[settings.CART_SESSION_KEY] = cart_data
-    request.session.modified = True
+def _get_cart_data(request) -> Dict[str, int]:
+    return get_storage().load(request)
 
 
-def get_cart(request) -> Cart:
-    cart_data = _get_session_cart(request)
-    products = Product.objects.filter(id__in=cart_data.keys()).prefetch_related('images')
-    product_map = {str(product.id): product for product in products}
+def _persist_cart_data(request, cart_data: Dict[str, int]) -> None:
+    get_storage().save(request, cart_data)
+    _forget_cart(request)
+
+
+def _forget_cart(request) -> None:
+    request.__dict__.pop(_REQUEST_CART_ATTR, None)
+
+
+def get_cart_version(request) -> str:
+    # Identifies the cart contents without resolving products; empty for an empty cart.
+    cart_data = _get_cart_data(request)
+    if not cart_data:
+        return ''
+    raw = ','.join(f'{product_id}:{quantity}' for product_id, quantity in sorted(cart_data.items()))
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+def _load_cart(cart_data: Dict[str, int]) -> Cart:
+    if not cart_data:
+        return Cart(items=[])
+    products = catalog.get_products_by_ids(cart_data.keys())
+    product_map = {str(product_id): product for product_id, product in products.items()}
     items: List[CartItem] = []
     for product_id, quantity in cart_data.items():
         product = product_map.get(str(product_id))
@@ -54,34 +73,66 @@ def get_cart(request) -> Cart:
     return Cart(items=items)
 
 
+def get_cart(request) -> Cart:
+    # Resolved once per request and shared by the views and the context processor.
+    cart = getattr(request, _REQUEST_CART_ATTR, None)
+    if cart is None:
+        cart = _load_cart(_get_cart_data(request))
+        setattr(request, _REQUEST_CART_ATTR, cart)
+    return cart
+
+
 def add_to_cart(request, product_id: int, quantity: int = 1, replace: bool = False) -> Cart:
-    cart_data = _get_session_cart(request)
+    cart_data = _get_cart_data(request)
     current = cart_data.get(str(product_id), 0)
     cart_data[str(product_id)] = quantity if replace else current + quantity
-    _persist_session_cart(request, cart_data)
+    _persist_cart_data(request, cart_data)
     return get_cart(request)
 
 
 def remove_from_cart(request, product_id: int) -> Cart:
-    cart_data = _get_session_cart(request)
+    cart_data = _get_cart_data(request)
     cart_data.pop(str(product_id), None)
-    _persist_session_cart(request, cart_data)
+    _persist_cart_data(request, cart_data)
     return get_cart(request)
 
 
+def _parse_operation(operation) -> Tuple[int, str, int]:
+    if not isinstance(operation, dict):
+        raise ValueError('Cart operation must be an object')
+    product_id = operation.get('product_id')
+    actions = [action for action in _OPERATIONS if action in operation]
+    if not isinstance(product_id, int) or isinstance(product_id, bool) or len(actions) != 1:
+        raise ValueError('Cart operation needs a product_id and exactly one of delta, set or remove')
+    action = actions[0]
+    if action == 'remove':
+        return product_id, action, 0
+    value = operation[action]
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f'Cart operation {action} must be an integer')
+    return product_id, action, value
+
+
+def apply_operations(request, operations: Iterable[dict]) -> Tuple[Cart, Set[int]]:
+    parsed = [_parse_operation(operation) for operation in operations]
+    # Served from the catalog cache; get_cart below hits the same entries.
+    products = catalog.get_products_by_ids(product_id for product_id, _, _ in parsed)
+    cart_data = _get_cart_data(request)
+    changed: Set[int] = set()
+    for product_id, action, value in parsed:
+        key = str(product_id)
+        quantity = 0
+        if product_id in products and action != 'remove':
+            quantity = cart_data.get(key, 0) + value if action == 'delta' else value
+        if quantity > 0:
+            cart_data[key] = quantity
+        else:
+            cart_data.pop(key, None)
+        changed.add(product_id)
+    _persist_cart_data(request, cart_data)
+    return get_cart(request), changed
+
+
 def clear_cart(request) -> None:
-    if settings.CART_SESSION_KEY in request.session:
-        del request.session[settings.CART_SESSION_KEY]
-        request.session.modified = True
-
-
-def serialize_cart(cart: Cart) -> List[dict]:
-    return [
-        {
-            'product_id': item.product.id,
-            'product_name': item.product.name,
-            'quantity': item.quantity,
-            'unit_price': str(item.product.price),
-        }
-        for item in cart.items
-    ]
+    get_storage().clear(request)
+    _forget_cart(request)
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import logging
+from typing import Dict
+
+from django.conf import settings
+from django.core import signing
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_COOKIE_SALT = 'store.cart'
+_PARSED_ATTR = '_cart_cookie_data'
+PENDING_ATTR = '_cart_cookie_pending'
+
+
+class CartTooLarge(ValueError):
+    pass
+
+
+class SessionCartStorage:
+    def load(self, request) -> Dict[str, int]:
+        return dict(request.session.get(settings.CART_SESSION_KEY, {}))
+
+    def save(self, request, cart_data: Dict[str, int]) -> None:
+        request.session[settings.CART_SESSION_KEY] = cart_data
+        request.session.modified = True
+
+    def clear(self, request) -> None:
+        if settings.CART_SESSION_KEY in request.session:
+            del request.session[settings.CART_SESSION_KEY]
+            request.session.modified = True
+
+
+class SignedCookieCartStorage:
+    """Keeps the cart in a signed cookie so anonymous carts never touch the session table.
+
+    The cookie is written by ``store.middleware.CartCookieMiddleware``.
+    """
+
+    def load(self, request) -> Dict[str, int]:
+        if not hasattr(request, _PARSED_ATTR):
+            setattr(request, _PARSED_ATTR, self._decode(request.COOKIES.get(settings.CART_COOKIE_NAME)))
+        return dict(getattr(request, _PARSED_ATTR))
+
+    def save(self, request, cart_data: Dict[str, int]) -> None:
+        value = self.encode(cart_data)
+        if len(value) > settings.CART_COOKIE_MAX_BYTES:
+            raise CartTooLarge(f'Encoded cart is {len(value)} bytes')
+        setattr(request, _PARSED_ATTR, dict(cart_data))
+        setattr(request, PENDING_ATTR, value)
+
+    def clear(self, request) -> None:
+        setattr(request, _PARSED_ATTR, {})
+        setattr(request, PENDING_ATTR, '')
+
+    def encode(self, cart_data: Dict[str, int]) -> str:
+        return signing.dumps(cart_data, salt=_COOKIE_SALT, compress=settings.CART_COOKIE_COMPRESS)
+
+    def _decode(self, value) -> Dict[str, int]:
+        if not value:
+            return {}
+        try:
+            data = signing.loads(value, salt=_COOKIE_SALT, max_age=settings.CART_COOKIE_AGE)
+        except signing.BadSignature:
+            logger.warning('Rejected a tampered or expired cart cookie')
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        return {
+            str(product_id): quantity
+            for product_id, quantity in data.items()
+            if str(product_id).isdigit() and isinstance(quantity, int) and quantity > 0
+        }
+
+
+def get_storage():
+    return import_string(settings.CART_STORAGE)()
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Subquery, prefetch_related_objects
+
+from store.models import Product, ProductImage
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'catalog:version'
+# Catalog lines by the value of Product.first_line.
+LINES = {'first': True, 'second': False}
+
+
+def _products_queryset():
+    # The search vector is only read by the database; keep it out of the cached objects.
+    return Product.objects.defer('search_vector').prefetch_related('images')
+
+
+def _listing_queryset():
+    # Cards only show the name, price and images.
+    return Product.objects.defer('description', 'details', 'search_vector')
+
+
+@dataclass
+class CatalogPage:
+    products: List[Product]
+    next_after: Optional[int]
+
+
+def _initial_version() -> int:
+    # Starting from the clock keeps a lost key from reusing versions that stale entries are still stored under.
+    return int(time.time())
+
+
+def get_version() -> Optional[int]:
+    try:
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            initial = _initial_version()
+            cache.add(VERSION_KEY, initial, timeout=None)
+            version = cache.get(VERSION_KEY, initial)
+        return version
+    except Exception:  # noqa: BLE001
+        logger.exception('Catalog cache is unavailable, falling back to the database')
+        return None
+
+
+def _cache_get_many(keys: Iterable[str], version: Optional[int]) -> Dict[str, object]:
+    if version is None:
+        return {}
+    try:
+        return cache.get_many(list(keys), version=version)
+    except Exception:  # noqa: BLE001
+        logger.exception('Failed to read from the catalog cache')
+        return {}
+
+
+def _cache_set_many(data: Dict[str, object], version: Optional[int]) -> None:
+    if version is None or not data:
+        return
+    try:
+        cache.set_many(data, timeout=settings.CATALOG_CACHE_TIMEOUT, version=version)
+    except Exception:  # noqa: BLE001
+        logger.exception('Failed to write to the catalog cache')
+
+
+def _product_keys(product: Product) -> Dict[str, Product]:
+    return {f'catalog:product:id:{product.id}': product, f'catalog:product:slug:{product.slug}': product}
+
+
+def bump_version() -> None:
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, _initial_version(), timeout=None)
+    except Exception:  # noqa: BLE001
+        logger.exception('Failed to invalidate the catalog cache')
+
+
+def get_last_modified() -> Optional[datetime]:
+    version = get_version()
+    key = 'catalog:last_modified'
+    last_modified = _cache_get_many([key], version).get(key)
+    if last_modified is None:
+        # One statement, two index-only lookups on the updated_at indexes.
+        row = (
+            Product.objects.order_by('-updated_at')
+            .annotate(
+                images_updated_at=Subquery(
+                    ProductImage.objects.order_by('-updated_at').values('updated_at')[:1]
+                )
+            )
+            .values_list('updated_at', 'images_updated_at')
+            .first()
+        )
+        if row is None:
+            return None
+        last_modified = max(value for value in row if value is not None)
+        _cache_set_many({key: last_modified}, version)
+    return last_modified
+
+
+def get_catalog() -> List[Product]:
+    version = get_version()
+    key = 'catalog:products'
+    products = _cache_get_many([key], version).get(key)
+    if products is None:
+        products = list(_products_queryset())
+        # Seed the per-product keys too, so the cart on the same page does not query again.
+        entries: Dict[str, object] = {key: products}
+        for product in products:
+            entries.update(_product_keys(product))
+        _cache_set_many(entries, version)
+    return products
+
+
+def _page_key(first_line: bool, after: Optional[int], limit: int) -> str:
+    return f'catalog:page:{int(first_line)}:{after or 0}:{limit}'
+
+
+def _load_page(first_line: bool, after: Optional[int], limit: int) -> CatalogPage:
+    # Keyset pagination within one line: (first_line, id) > (first_line, after), served by the line index.
+    queryset = _listing_queryset().filter(first_line=first_line).order_by('-first_line', 'id')
+    if after:
+        queryset = queryset.filter(id__gt=after)
+    products = list(queryset[: limit + 1])
+    next_after = products[limit - 1].id if len(products) > limit else None
+    return CatalogPage(products=products[:limit], next_after=next_after)
+
+
+def _load_pages(requested: Dict[str, Tuple[bool, Optional[int]]], limit: int) -> Dict[str, CatalogPage]:
+    version = get_version()
+    pages = _cache_get_many(requested, version)
+    missing = {
+        key: _load_page(first_line, after, limit)
+        for key, (first_line, after) in requested.items()
+        if key not in pages
+    }
+    if missing:
+        # One images query for all pages; listing objects are partial, so they stay out of the per-product keys.
+        prefetch_related_objects([product for page in missing.values() for product in page.products], 'images')
+        _cache_set_many(missing, version)
+    return {**pages, **missing}
+
+
+def get_catalog_page(first_line: bool, after: Optional[int] = None, limit: Optional[int] = None) -> CatalogPage:
+    limit = limit or settings.CATALOG_PAGE_SIZE
+    key = _page_key(first_line, after, limit)
+    return _load_pages({key: (first_line, after)}, limit)[key]
+
+
+def get_catalog_lines(limit: Optional[int] = None) -> Dict[str, CatalogPage]:
+    limit = limit or settings.CATALOG_PAGE_SIZE
+    keys = {line: _page_key(first_line, None, limit) for line, first_line in LINES.items()}
+    pages = _load_pages({keys[line]: (first_line, None) for line, first_line in LINES.items()}, limit)
+    return {line: pages[key] for line, key in keys.items()}
+
+
+def get_product_by_slug(slug: str) -> Optional[Product]:
+    version = get_version()
+    key = f'catalog:product:slug:{slug}'
+    product = _cache_get_many([key], version).get(key)
+    if product is None:
+        product = _products_queryset().filter(slug=slug).first()
+        if product is not None:
+            _cache_set_many(_product_keys(product), version)
+    return product
+
+
+def get_product_by_id(product_id: int) -> Optional[Product]:
+    return get_products_by_ids([product_id]).get(int(product_id))
+
+
+def get_products_by_ids(product_ids: Iterable[int]) -> Dict[int, Product]:
+    ids = {int(product_id) for product_id in product_ids}
+    if not ids:
+        return {}
+    version = get_version()
+    keys = {f'catalog:product:id:{product_id}': product_id for product_id in ids}
+    cached = _cache_get_many(keys, version)
+    products = {keys[key]: product for key, product in cached.items()}
+    missing = ids - products.keys()
+    if missing:
+        fresh: Dict[str, Product] = {}
+        for product in _products_queryset().filter(id__in=missing):
+            products[product.id] = product
+            fresh.update(_product_keys(product))
+        _cache_set_many(fresh, version)
+    return products
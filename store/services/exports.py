@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import csv
+import json
+from datetime import date, datetime, time
+from typing import Iterable, Iterator, List, Optional
+
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from store.models import Order
+
+FORMAT_CSV = 'csv'
+FORMAT_JSONL = 'jsonl'
+FORMATS = (FORMAT_CSV, FORMAT_JSONL)
+CONTENT_TYPES = {FORMAT_CSV: 'text/csv; charset=utf-8', FORMAT_JSONL: 'application/x-ndjson; charset=utf-8'}
+DEFAULT_CHUNK_SIZE = 500
+
+ORDER_FIELDS = ('order_id', 'created_at', 'status', 'payment_id', 'total_amount', 'currency')
+METADATA_FIELDS = ('source', 'customer_name', 'customer_phone', 'customer_address', 'product_slug')
+LINE_FIELDS = ('product_id', 'product_name', 'quantity', 'unit_price', 'line_total')
+CSV_COLUMNS = ORDER_FIELDS + METADATA_FIELDS + LINE_FIELDS
+
+
+class _Echo:
+    def write(self, value: str) -> str:
+        return value
+
+
+def orders_between(start: Optional[date], end: Optional[date], statuses: Iterable[str] = ()) -> QuerySet:
+    # Dates are local calendar days; end is exclusive.
+    queryset = Order.objects.all()
+    if start:
+        queryset = queryset.filter(created_at__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end:
+        queryset = queryset.filter(created_at__lt=timezone.make_aware(datetime.combine(end, time.min)))
+    statuses = list(statuses)
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    return queryset
+
+
+def _iter_orders(queryset: QuerySet, chunk_size: int) -> Iterator[Order]:
+    # Server-side cursor on PostgreSQL; items are prefetched once per chunk.
+    return queryset.order_by('created_at', 'id').prefetch_related('items').iterator(chunk_size=chunk_size)
+
+
+def _order_lines(order: Order) -> List[dict]:
+    items = order.items.all()
+    if items:
+        return [
+            {
+                'product_id': item.product_id,
+                'product_name': item.product_name,
+                'quantity': item.quantity,
+                'unit_price': str(item.unit_price),
+                'line_total': str(item.line_total),
+            }
+            for item in items
+        ]
+    # Orders written before items were kept only have the snapshot.
+    return [
+        {
+            'product_id': line.get('product_id'),
+            'product_name': line.get('product_name', ''),
+            'quantity': line.get('quantity'),
+            'unit_price': line.get('unit_price'),
+            'line_total': None,
+        }
+        for line in order.cart_snapshot or []
+    ]
+
+
+def _order_record(order: Order) -> dict:
+    return {
+        'order_id': order.id,
+        'created_at': timezone.localtime(order.created_at).isoformat(),
+        'status': order.status,
+        'payment_id': order.payment_id,
+        'total_amount': str(order.total_amount),
+        'currency': order.currency,
+    }
+
+
+def csv_lines(queryset: QuerySet, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    # One row per order line; an order without lines still gets a row so totals reconcile.
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for order in _iter_orders(queryset, chunk_size):
+        metadata = order.metadata if isinstance(order.metadata, dict) else {}
+        record = {**_order_record(order), **{field: metadata.get(field, '') for field in METADATA_FIELDS}}
+        for line in _order_lines(order) or [dict.fromkeys(LINE_FIELDS, '')]:
+            row = {**record, **line}
+            yield writer.writerow(['' if row[column] is None else row[column] for column in CSV_COLUMNS])
+
+
+def jsonl_lines(queryset: QuerySet, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    for order in _iter_orders(queryset, chunk_size):
+        record = {**_order_record(order), 'metadata': order.metadata, 'lines': _order_lines(order)}
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def export_lines(queryset: QuerySet, export_format: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    if export_format == FORMAT_CSV:
+        return csv_lines(queryset, chunk_size)
+    if export_format == FORMAT_JSONL:
+        return jsonl_lines(queryset, chunk_size)
+    raise ValueError(f'Unknown export format: {export_format}')
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_IMAGE = 'images/main1.jpg'
+MANIFEST_NAME = 'manifest.json'
+LQIP_WIDTH = 24
+# Bump when the encoder settings change so every source is rebuilt.
+PIPELINE_VERSION = 1
+
+_FORMATS = (
+    ('webp', 'WEBP', {'method': 6}),
+    ('jpg', 'JPEG', {'optimize': True, 'progressive': True}),
+)
+
+_manifest_cache: Dict[str, object] = {'mtime': None, 'data': {}}
+
+
+@dataclass
+class BuildReport:
+    built: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    removed: int = 0
+    # The markup rendered from the manifest is different, so cached pages are stale.
+    changed: bool = False
+
+
+def variants_root() -> Path:
+    return Path(settings.STATICFILES_DIRS[0]) / settings.IMAGE_VARIANTS_DIR
+
+
+def _manifest_path() -> Path:
+    return variants_root() / MANIFEST_NAME
+
+
+def read_manifest() -> Dict[str, dict]:
+    try:
+        return json.loads(_manifest_path().read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def get_variants(path: str) -> Optional[dict]:
+    # Re-read only when build_image_variants has rewritten the manifest.
+    try:
+        mtime = _manifest_path().stat().st_mtime
+    except OSError:
+        return None
+    if _manifest_cache['mtime'] != mtime:
+        _manifest_cache['data'] = read_manifest()
+        _manifest_cache['mtime'] = mtime
+    return _manifest_cache['data'].get(path)
+
+
+def _fingerprint(source: Path) -> str:
+    digest = hashlib.sha256(source.read_bytes())
+    digest.update(json.dumps([PIPELINE_VERSION, settings.IMAGE_VARIANT_WIDTHS, settings.IMAGE_VARIANT_QUALITY]).encode())
+    return digest.hexdigest()
+
+
+def _render_variants(source: str, name: str, output_dir: str, url_prefix: str, widths: List[int], quality: int) -> dict:
+    # Runs in a worker process: only plain arguments, no Django state.
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    stem = Path(name).with_suffix('')
+    entry = {'width': image.width, 'height': image.height, 'variants': {extension: [] for extension, _, _ in _FORMATS}}
+    for width in sorted({min(width, image.width) for width in widths}):
+        height = round(image.height * width / image.width)
+        resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+        for extension, image_format, options in _FORMATS:
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, quality=quality, **options)
+            data = buffer.getvalue()
+            variant = f'{stem}.{width}w.{hashlib.sha256(data).hexdigest()[:12]}.{extension}'
+            target = Path(output_dir) / variant
+            if not target.exists():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_bytes(data)
+            entry['variants'][extension].append([width, f'{url_prefix}/{variant}'])
+    placeholder = image.copy()
+    placeholder.thumbnail((LQIP_WIDTH, LQIP_WIDTH * image.height // image.width or 1))
+    buffer = io.BytesIO()
+    placeholder.save(buffer, 'JPEG', quality=40)
+    entry['lqip'] = 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+    return entry
+
+
+def _remove_stale(manifest: Dict[str, dict]) -> int:
+    root = variants_root()
+    static_root = Path(settings.STATICFILES_DIRS[0])
+    referenced = {
+        static_root / variant
+        for entry in manifest.values()
+        for variants in entry['variants'].values()
+        for _, variant in variants
+    }
+    removed = 0
+    for path in root.rglob('*'):
+        if path.is_file() and path.name != MANIFEST_NAME and path not in referenced:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def _rendered(manifest: Dict[str, dict]) -> Dict[str, tuple]:
+    return {name: (entry['variants'], entry.get('lqip')) for name, entry in manifest.items()}
+
+
+def build_variants(
+    paths: Iterable[str],
+    workers: Optional[int] = None,
+    force: bool = False,
+    prune: bool = True,
+) -> BuildReport:
+    report = BuildReport()
+    previous = read_manifest()
+    # Without pruning, entries for sources outside this run are kept as they are.
+    manifest: Dict[str, dict] = {} if prune else dict(previous)
+    root = variants_root()
+    jobs = {}
+    for name in sorted(set(paths)):
+        source = finders.find(name)
+        if source is None:
+            report.missing.append(name)
+            continue
+        fingerprint = _fingerprint(Path(source))
+        entry = previous.get(name)
+        if not force and entry and entry.get('fingerprint') == fingerprint:
+            manifest[name] = entry
+            report.skipped.append(name)
+            continue
+        jobs[name] = (source, fingerprint)
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                name: pool.submit(
+                    _render_variants,
+                    source,
+                    name,
+                    str(root),
+                    settings.IMAGE_VARIANTS_DIR,
+                    settings.IMAGE_VARIANT_WIDTHS,
+                    settings.IMAGE_VARIANT_QUALITY,
+                )
+                for name, (source, _) in jobs.items()
+            }
+            for name, future in futures.items():
+                try:
+                    entry = future.result()
+                except Exception:  # noqa: BLE001
+                    logger.exception('Failed to build variants for %s', name)
+                    report.failed.append(name)
+                    if name in previous:
+                        manifest[name] = previous[name]
+                    continue
+                entry['fingerprint'] = jobs[name][1]
+                manifest[name] = entry
+                report.built.append(name)
+    root.mkdir(parents=True, exist_ok=True)
+    temporary = _manifest_path().with_suffix('.tmp')
+    temporary.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(temporary, _manifest_path())
+    report.changed = _rendered(manifest) != _rendered(previous)
+    if prune:
+        report.removed = _remove_stale(manifest)
+    return report
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Case, F, Q, QuerySet, Value, When
+from django.utils import timezone
+
+from store.models import Order, Product
+
+logger = logging.getLogger(__name__)
+
+RELEASING_STATUSES = {Order.STATUS_FAILED, Order.STATUS_CANCELED}
+UNPAID_STATUSES = [Order.STATUS_PENDING, Order.STATUS_AWAITING]
+
+
+class OutOfStock(Exception):
+    def __init__(self, quantities: Dict[int, int]):
+        self.quantities = quantities
+        super().__init__(f'Not enough stock for {quantities}')
+
+    def short_product_ids(self) -> List[int]:
+        # Call after the reserving transaction rolled back, when the rows are back to what the UPDATE saw.
+        available = Product.objects.filter(_enough(self.quantities), id__in=self.quantities)
+        return sorted(self.quantities.keys() - set(available.values_list('id', flat=True)))
+
+
+def _quantities(lines: Iterable[Tuple[Optional[int], int]]) -> Dict[int, int]:
+    totals: Counter = Counter()
+    for product_id, quantity in lines:
+        if product_id is not None:
+            totals[product_id] += quantity
+    return dict(totals)
+
+
+def _needed(quantities: Dict[int, int]) -> Case:
+    return Case(*(When(id=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()))
+
+
+def _enough(quantities: Dict[int, int]) -> Q:
+    return Q(stock__isnull=True) | Q(stock__gte=_needed(quantities))
+
+
+def _take(quantities: Dict[int, int]) -> int:
+    products = Product.objects.filter(_enough(quantities), id__in=quantities)
+    return products.update(stock=F('stock') - _needed(quantities))
+
+
+def reserve(lines: Iterable[Tuple[Optional[int], int]]) -> None:
+    # Must run inside the transaction that writes the order, which OutOfStock rolls back.
+    quantities = _quantities(lines)
+    # One conditional UPDATE for the whole cart: no other checkout can act between the check and the decrement.
+    if quantities and _take(quantities) != len(quantities):
+        raise OutOfStock(quantities)
+
+
+def _order_lines(order: Order) -> List[Tuple[Optional[int], int]]:
+    return [(item.product_id, item.quantity) for item in order.items.all()]
+
+
+def release_order(order: Order) -> bool:
+    with transaction.atomic():
+        # Claiming the flag first makes a release from the webhook and one from the expiry job mutually exclusive.
+        if not Order.objects.filter(id=order.id, stock_reserved=True).update(stock_reserved=False):
+            return False
+        quantities = _quantities(_order_lines(order))
+        if quantities:
+            products = Product.objects.filter(id__in=quantities, stock__isnull=False)
+            products.update(stock=F('stock') + _needed(quantities))
+    order.stock_reserved = False
+    return True
+
+
+def _reclaim_for_paid_order(order: Order) -> None:
+    # The payment landed after the reservation expired; take the stock again if it is still there.
+    try:
+        with transaction.atomic():
+            reserve(_order_lines(order))
+            Order.objects.filter(id=order.id).update(stock_reserved=True)
+    except OutOfStock:
+        logger.error('Order %s was paid after its reservation expired and is short of stock', order.id)
+        return
+    order.stock_reserved = True
+
+
+def apply_status(order: Order) -> None:
+    # Call after an order changes status, in the same transaction.
+    if order.status in RELEASING_STATUSES:
+        release_order(order)
+    elif order.status == Order.STATUS_PAID and not order.stock_reserved:
+        _reclaim_for_paid_order(order)
+
+
+def expired_reservations(cutoff) -> QuerySet:
+    return Order.objects.filter(stock_reserved=True, status__in=UNPAID_STATUSES, created_at__lt=cutoff)
+
+
+def release_expired(older_than: timedelta, batch_size: int = 200) -> int:
+    # The order keeps its status: a late payment still completes it through apply_status.
+    cutoff = timezone.now() - older_than
+    released = 0
+    while True:
+        batch = list(
+            expired_reservations(cutoff).order_by('created_at', 'id').prefetch_related('items')[:batch_size]
+        )
+        if not batch:
+            return released
+        released += sum(release_order(order) for order in batch)
@@ -1,44 +1,118 @@
 from __future__ import annotations
 
 import logging
-from typing import Iterable
+import time
+from datetime import timedelta
+from typing import List, Optional
 
 import requests
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
-from store.models import Order
+from store import metrics
+from store.models import NotificationOutbox, Order
 
 logger = logging.getLogger(__name__)
 
 
-def _send_telegram_message(token: str, chat_ids: Iterable[str], text: str) -> None:
-    for chat_id in chat_ids:
-        try:
-            requests.post(
-                f'https://api.telegram.org/bot{token}/sendMessage',
-                timeout=5,
-                data={'chat_id': chat_id, 'text': text, 'parse_mode': 'Markdown'},
-            )
-        except Exception:  # noqa: BLE001
-            logger.exception('Failed to send Telegram notification for chat %s', chat_id)
-
-
-def notify_order_paid(order: Order) -> None:
-    if not settings.TELEGRAM_BOT_TOKEN or not settings.TELEGRAM_CHAT_IDS:
-        return
+def _send_telegram_message(token: str, chat_id: str, text: str) -> None:
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        response = requests.post(
+            f'{settings.TELEGRAM_API_URL}/bot{token}/sendMessage',
+            timeout=5,
+            data={'chat_id': chat_id, 'text': text, 'parse_mode': 'Markdown'},
+        )
+        response.raise_for_status()
+        outcome = 'ok'
+    finally:
+        metrics.DEPENDENCY_DURATION.observe(
+            time.perf_counter() - started, service='telegram', operation='sendMessage', outcome=outcome
+        )
+
+
+def _is_configured() -> bool:
+    return bool(settings.TELEGRAM_BOT_TOKEN and settings.TELEGRAM_CHAT_IDS)
+
+
+def _enqueue(kind: str, text: str, order: Optional[Order] = None) -> Optional[NotificationOutbox]:
+    if not _is_configured():
+        return None
+    defaults = {'text': text, 'pending_chat_ids': list(settings.TELEGRAM_CHAT_IDS)}
+    if order is None:
+        return NotificationOutbox.objects.create(kind=kind, **defaults)
+    entry, _ = NotificationOutbox.objects.get_or_create(kind=kind, order=order, defaults=defaults)
+    return entry
+
+
+def notify_order_paid(order: Order) -> Optional[NotificationOutbox]:
     message = (
         f'Новый заказ #{order.id} оплачен.\n'
         f'Состав: {order.as_human_readable()}\n'
         f'Сумма: {order.total_amount:.2f} {order.currency}'
     )
-    _send_telegram_message(settings.TELEGRAM_BOT_TOKEN, settings.TELEGRAM_CHAT_IDS, message)
-    order.notified_at = timezone.now()
-    order.save(update_fields=['notified_at'])
+    return _enqueue(NotificationOutbox.KIND_ORDER_PAID, message, order=order)
 
 
-def notify_partnership(email: str, comment: str) -> None:
-    if not settings.TELEGRAM_BOT_TOKEN or not settings.TELEGRAM_CHAT_IDS:
-        return
+def notify_partnership(email: str, comment: str) -> Optional[NotificationOutbox]:
     text = f'Форма сотрудничества:\nEmail: {email}\nКомментарий: {comment or "—"}'
-    _send_telegram_message(settings.TELEGRAM_BOT_TOKEN, settings.TELEGRAM_CHAT_IDS, text)
+    return _enqueue(NotificationOutbox.KIND_PARTNERSHIP, text)
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    seconds = settings.NOTIFICATION_RETRY_BASE_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.NOTIFICATION_RETRY_MAX_DELAY))
+
+
+def _claim_batch(batch_size: int) -> List[NotificationOutbox]:
+    # Push claimed rows into the future so concurrent workers skip them while we deliver.
+    now = timezone.now()
+    with transaction.atomic():
+        entries = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=NotificationOutbox.STATUS_PENDING, available_at__lte=now)
+            .order_by('available_at', 'id')[:batch_size]
+        )
+        lease_until = now + timedelta(seconds=settings.NOTIFICATION_LEASE_SECONDS)
+        NotificationOutbox.objects.filter(id__in=[entry.id for entry in entries]).update(available_at=lease_until)
+    return entries
+
+
+def deliver(entry: NotificationOutbox) -> bool:
+    remaining = []
+    errors = []
+    for chat_id in entry.pending_chat_ids:
+        try:
+            _send_telegram_message(settings.TELEGRAM_BOT_TOKEN, chat_id, entry.text)
+        except Exception as error:  # noqa: BLE001
+            logger.warning('Failed to send Telegram notification %s to chat %s: %s', entry.id, chat_id, error)
+            remaining.append(chat_id)
+            errors.append(f'{chat_id}: {error}')
+    now = timezone.now()
+    entry.attempts += 1
+    entry.pending_chat_ids = remaining
+    if not remaining:
+        entry.status = NotificationOutbox.STATUS_SENT
+        entry.sent_at = now
+        entry.last_error = ''
+    elif entry.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+        entry.status = NotificationOutbox.STATUS_DEAD
+        entry.last_error = '\n'.join(errors)
+        logger.error('Giving up on notification %s after %s attempts', entry.id, entry.attempts)
+    else:
+        entry.available_at = now + _retry_delay(entry.attempts)
+        entry.last_error = '\n'.join(errors)
+    with transaction.atomic():
+        entry.save(update_fields=['status', 'attempts', 'pending_chat_ids', 'available_at', 'last_error', 'sent_at'])
+        if entry.status == NotificationOutbox.STATUS_SENT and entry.order_id:
+            Order.objects.filter(id=entry.order_id, notified_at__isnull=True).update(notified_at=now)
+    return entry.status == NotificationOutbox.STATUS_SENT
+
+
+def dispatch_pending(batch_size: int = 50) -> int:
+    entries = _claim_batch(batch_size)
+    for entry in entries:
+        deliver(entry)
+    return len(entries)
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import List, Optional
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+
+from store.models import Order, OrderItem, Product
+from store.services import inventory
+from store.services.cart import Cart
+
+
+def create_order_from_cart(cart: Cart, metadata: Optional[dict] = None) -> Order:
+    with transaction.atomic():
+        # Raises OutOfStock before anything is written; the UPDATE also locks the rows read below.
+        inventory.reserve((item.product.id, item.quantity) for item in cart.items)
+        # Cart products may come from another worker's cache; charge what the database holds now.
+        current = {
+            row['id']: row
+            for row in Product.objects.filter(id__in=[item.product.id for item in cart.items]).values(
+                'id', 'name', 'price'
+            )
+        }
+        items: List[OrderItem] = []
+        snapshot: List[dict] = []
+        total = Decimal('0.00')
+        for cart_item in cart.items:
+            product = current[cart_item.product.id]
+            items.append(
+                OrderItem(
+                    product=cart_item.product,
+                    product_name=product['name'],
+                    unit_price=product['price'],
+                    quantity=cart_item.quantity,
+                )
+            )
+            snapshot.append(
+                {
+                    'product_id': product['id'],
+                    'product_name': product['name'],
+                    'quantity': cart_item.quantity,
+                    'unit_price': str(product['price']),
+                }
+            )
+            total += product['price'] * cart_item.quantity
+        order = Order.objects.create(
+            total_amount=total,
+            currency='RUB',
+            metadata=metadata or {},
+            cart_snapshot=snapshot,
+            stock_reserved=True,
+        )
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items)
+        # One indexed read, so as_human_readable(), notifications and release_order() do not query again.
+        prefetch_related_objects([order], 'items')
+    return order
+
+
+async def acreate_order_from_cart(cart: Cart, metadata: Optional[dict] = None) -> Order:
+    # The async ORM has no transactions yet, so the atomic write runs in the sync thread.
+    return await sync_to_async(create_order_from_cart)(cart, metadata)
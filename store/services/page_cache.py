@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from django.middleware.csrf import get_token
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition
+
+from store.services import cart as cart_service
+from store.services import catalog
+
+logger = logging.getLogger(__name__)
+
+CSRF_PLACEHOLDER = mark_safe('rml-page-cache-csrf-token')
+CART_COUNT_PLACEHOLDER = mark_safe('<!--rml:cart-count-->')
+MESSAGES_PLACEHOLDER = mark_safe('<!--rml:messages-->')
+_VALIDATORS_ATTR = '_page_validators'
+
+
+def _cache_key(template_name: str) -> str:
+    return f'page:{template_name}'
+
+
+def _render_shell(request: HttpRequest, template_name: str, context: dict) -> str:
+    # Per-visitor parts are rendered as placeholders so the markup can be shared.
+    context = {
+        **context,
+        'csrf_token': CSRF_PLACEHOLDER,
+        'cart_items_count': CART_COUNT_PLACEHOLDER,
+        'messages_placeholder': MESSAGES_PLACEHOLDER,
+    }
+    return render_to_string(template_name, context, request=request)
+
+
+def _load_shell(key: str, version: Optional[int]) -> Optional[str]:
+    if version is None:
+        return None
+    try:
+        return cache.get(key, version=version)
+    except Exception:  # noqa: BLE001
+        logger.exception('Failed to read from the page cache')
+        return None
+
+
+def _store_shell(key: str, version: Optional[int], html: str) -> None:
+    if version is None:
+        return
+    try:
+        cache.set(key, html, timeout=settings.PAGE_CACHE_TIMEOUT, version=version)
+    except Exception:  # noqa: BLE001
+        logger.exception('Failed to write to the page cache')
+
+
+def _render_messages(request: HttpRequest) -> str:
+    storage = get_messages(request)
+    if not storage:
+        return ''
+    return render_to_string('store/partials/messages.html', {'messages': storage})
+
+
+def fill_holes(request: HttpRequest, html: str) -> str:
+    return (
+        html.replace(CSRF_PLACEHOLDER, get_token(request))
+        .replace(CART_COUNT_PLACEHOLDER, str(cart_service.get_cart(request).total_quantity))
+        .replace(MESSAGES_PLACEHOLDER, _render_messages(request))
+    )
+
+
+def render_cached(request: HttpRequest, template_name: str, get_context: Callable[[], dict]) -> HttpResponse:
+    if request.method != 'GET' or request.GET:
+        return render(request, template_name, get_context())
+    key = _cache_key(template_name)
+    # Keyed by the catalog version, so product changes invalidate the page too.
+    version = catalog.get_version()
+    html = _load_shell(key, version)
+    if html is None:
+        html = _render_shell(request, template_name, get_context())
+        _store_shell(key, version, html)
+    return HttpResponse(fill_holes(request, html))
+
+
+def _compute_validators(request: HttpRequest) -> Optional[Tuple[str, Optional[datetime]]]:
+    # Pending flash messages are consumed by rendering, so those responses are never revalidated.
+    if get_messages(request):
+        return None
+    last_modified = catalog.get_last_modified()
+    if last_modified is None:
+        return None
+    cart_version = cart_service.get_cart_version(request)
+    # The page embeds a CSRF token; get_token() also covers a visitor whose cookie is set by this response.
+    get_token(request)
+    state = ':'.join(
+        [
+            settings.RELEASE_ID,
+            str(catalog.get_version()),
+            last_modified.isoformat(),
+            cart_version,
+            request.META['CSRF_COOKIE'],
+        ]
+    )
+    etag = hashlib.sha256(state.encode()).hexdigest()[:32]
+    # Last-Modified cannot see the visitor's cart, so it is only offered while the cart is empty.
+    return etag, None if cart_version else last_modified
+
+
+def _validators(request: HttpRequest) -> Optional[Tuple[str, Optional[datetime]]]:
+    if not hasattr(request, _VALIDATORS_ATTR):
+        setattr(request, _VALIDATORS_ATTR, _compute_validators(request))
+    return getattr(request, _VALIDATORS_ATTR)
+
+
+def _etag(request: HttpRequest, *args, **kwargs) -> Optional[str]:
+    validators = _validators(request)
+    return validators[0] if validators else None
+
+
+def _last_modified(request: HttpRequest, *args, **kwargs) -> Optional[datetime]:
+    validators = _validators(request)
+    return validators[1] if validators else None
+
+
+def conditional_page(view):
+    conditional_view = condition(etag_func=_etag, last_modified_func=_last_modified)(view)
+
+    @wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        response = conditional_view(request, *args, **kwargs)
+        # Browsers keep the page but must ask before reusing it.
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Cookie'])
+        return response
+
+    return wrapper
@@ -4,53 +4,110 @@ import uuid
 from decimal import Decimal
 from typing import Optional
 
-from django.conf import settings
-from yookassa import Configuration, Payment
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from yookassa.domain.response import PaymentResponse as Payment
 
+from store import metrics
 from store.models import Order
+from store.services import inventory, sales
+from store.services.notifications import notify_order_paid
+from store.services.yookassa_client import get_async_client, get_client
 
+FINAL_STATUSES = {Order.STATUS_PAID, Order.STATUS_CANCELED}
 
-def _ensure_configuration() -> None:
-    if not settings.YOOKASSA_SHOP_ID or not settings.YOOKASSA_SECRET_KEY:
-        raise RuntimeError('YooKassa credentials are not configured')
-    Configuration.account_id = settings.YOOKASSA_SHOP_ID
-    Configuration.secret_key = settings.YOOKASSA_SECRET_KEY
+
+def _payment_params(order: Order, return_url: str, description: str) -> dict:
+    return {
+        'amount': {'value': f'{order.total_amount:.2f}', 'currency': order.currency},
+        'confirmation': {'type': 'redirect', 'return_url': return_url},
+        'capture': True,
+        'description': description,
+        'metadata': {'order_id': order.id},
+    }
 
 
 def create_payment(order: Order, return_url: str, description: str) -> Payment:
-    _ensure_configuration()
-    payment = Payment.create(
-        {
-            'amount': {'value': f'{order.total_amount:.2f}', 'currency': order.currency},
-            'confirmation': {'type': 'redirect', 'return_url': return_url},
-            'capture': True,
-            'description': description,
-            'metadata': {'order_id': order.id},
-        },
-        uuid.uuid4(),
-    )
+    payment = get_client().create_payment(_payment_params(order, return_url, description), uuid.uuid4())
+    previous = order.status
     order.payment_id = payment.id
     order.status = Order.STATUS_AWAITING
     order.save(update_fields=['payment_id', 'status', 'updated_at'])
+    metrics.record_order_transition(previous, order.status)
+    return payment
+
+
+async def acreate_payment(order: Order, return_url: str, description: str) -> Payment:
+    payment = await get_async_client().create_payment(_payment_params(order, return_url, description), uuid.uuid4())
+    previous = order.status
+    order.payment_id = payment.id
+    order.status = Order.STATUS_AWAITING
+    await order.asave(update_fields=['payment_id', 'status', 'updated_at'])
+    metrics.record_order_transition(previous, order.status)
     return payment
 
 
 def fetch_payment(payment_id: str) -> Optional[Payment]:
     if not payment_id:
         return None
-    _ensure_configuration()
-    return Payment.find_one(payment_id)
+    return get_client().find_payment(payment_id)
+
 
+async def afetch_payment(payment_id: str) -> Optional[Payment]:
+    if not payment_id:
+        return None
+    return await get_async_client().find_payment(payment_id)
 
-def update_order_status_from_payment(order: Order, payment: Payment) -> Order:
+
+def _status_from_payment(payment: Payment) -> str:
     status = getattr(payment, 'status', '')
     if status == 'succeeded':
-        order.status = Order.STATUS_PAID
-    elif status in {'canceled', 'canceled_by_merchant'}:
-        order.status = Order.STATUS_CANCELED
-    elif status in {'pending', 'waiting_for_capture'}:
-        order.status = Order.STATUS_AWAITING
-    else:
-        order.status = Order.STATUS_FAILED
-    order.save(update_fields=['status', 'updated_at'])
+        return Order.STATUS_PAID
+    if status in {'canceled', 'canceled_by_merchant'}:
+        return Order.STATUS_CANCELED
+    if status in {'pending', 'waiting_for_capture'}:
+        return Order.STATUS_AWAITING
+    return Order.STATUS_FAILED
+
+
+def update_order_status_from_payment(order: Order, payment: Payment, commit: bool = True) -> Order:
+    # Idempotent: repeated or out-of-order events never move an order out of a final status.
+    status = _status_from_payment(payment)
+    if order.status == status or order.status in FINAL_STATUSES:
+        return order
+    previous = order.status
+    order.status = status
+    if commit:
+        order.save(update_fields=['status', 'updated_at'])
+        metrics.record_order_transition(previous, status)
+    return order
+
+
+def _find_order_for_payment(payment: Payment) -> Optional[Order]:
+    orders = Order.objects.select_for_update()
+    order = orders.filter(payment_id=payment.id).first()
+    if order:
+        return order
+    metadata = getattr(payment, 'metadata', {}) or {}
+    order_id = metadata.get('order_id') if hasattr(metadata, 'get') else None
+    if order_id:
+        return orders.filter(id=order_id).first()
+    return None
+
+
+def apply_payment(payment: Payment) -> Optional[Order]:
+    with transaction.atomic():
+        order = _find_order_for_payment(payment)
+        if not order:
+            return None
+        previous = order.status
+        order = update_order_status_from_payment(order, payment)
+        if order.status != previous:
+            # Shared by the stock reservation, the rollup and the notification text.
+            prefetch_related_objects([order], 'items')
+            inventory.apply_status(order)
+        if order.status == Order.STATUS_PAID and previous != Order.STATUS_PAID:
+            sales.record_paid_order(order)
+        if order.status == Order.STATUS_PAID and not order.notified_at:
+            notify_order_paid(order)
     return order
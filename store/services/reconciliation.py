@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Iterator, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from store import metrics
+from store.models import Order
+from store.services import inventory, sales
+from store.services.notifications import notify_order_paid
+from store.services.payments import fetch_payment, update_order_status_from_payment
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ReconciliationReport:
+    checked: int = 0
+    unchanged: int = 0
+    errors: int = 0
+    transitions: Counter = field(default_factory=Counter)
+
+    @property
+    def updated(self) -> int:
+        return sum(self.transitions.values())
+
+
+class RateLimiter:
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def stale_awaiting_orders(cutoff) -> QuerySet:
+    return (
+        Order.objects.filter(status=Order.STATUS_AWAITING, created_at__lt=cutoff)
+        .exclude(payment_id='')
+        .order_by('created_at', 'id')
+        .only('id', 'status', 'payment_id', 'created_at')
+    )
+
+
+def _stale_order_batches(cutoff, batch_size: int) -> Iterator[List[Order]]:
+    # Keyset pagination in (created_at, id) order reads the (status, created_at) index without a sort.
+    queryset = stale_awaiting_orders(cutoff)
+    batch = list(queryset[:batch_size])
+    while batch:
+        yield batch
+        last = batch[-1]
+        after_last = Q(created_at__gt=last.created_at) | Q(created_at=last.created_at, id__gt=last.id)
+        batch = list(queryset.filter(after_last)[:batch_size])
+
+
+def _fetch(order: Order, limiter: RateLimiter) -> Tuple[Order, Optional[object]]:
+    limiter.wait()
+    try:
+        return order, fetch_payment(order.payment_id)
+    except Exception:  # noqa: BLE001
+        logger.exception('Failed to fetch payment %s for order %s', order.payment_id, order.id)
+        return order, None
+
+
+def _apply_batch(changed: List[Order]) -> List[Order]:
+    now = timezone.now()
+    with transaction.atomic():
+        # A webhook may have moved some of these orders while we were fetching.
+        still_awaiting = set(
+            Order.objects.select_for_update()
+            .filter(id__in=[order.id for order in changed], status=Order.STATUS_AWAITING)
+            .values_list('id', flat=True)
+        )
+        changed = [order for order in changed if order.id in still_awaiting]
+        for order in changed:
+            order.updated_at = now
+        Order.objects.bulk_update(changed, ['status', 'updated_at'])
+        for order in Order.objects.filter(id__in=[order.id for order in changed]).prefetch_related('items'):
+            inventory.apply_status(order)
+            if order.status == Order.STATUS_PAID:
+                sales.record_paid_order(order)
+                notify_order_paid(order)
+    for order in changed:
+        metrics.record_order_transition(Order.STATUS_AWAITING, order.status)
+    return changed
+
+
+def reconcile_awaiting_orders(
+    older_than: timedelta,
+    workers: int = 8,
+    rate: float = 10.0,
+    batch_size: int = 200,
+    dry_run: bool = False,
+) -> ReconciliationReport:
+    report = ReconciliationReport()
+    limiter = RateLimiter(rate)
+    cutoff = timezone.now() - older_than
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch in _stale_order_batches(cutoff, batch_size):
+            changed = []
+            for order, payment in pool.map(lambda order: _fetch(order, limiter), batch):
+                report.checked += 1
+                if payment is None:
+                    report.errors += 1
+                    continue
+                update_order_status_from_payment(order, payment, commit=False)
+                if order.status == Order.STATUS_AWAITING:
+                    report.unchanged += 1
+                else:
+                    changed.append(order)
+            if changed and not dry_run:
+                changed = _apply_batch(changed)
+            report.transitions.update(order.status for order in changed)
+    return report
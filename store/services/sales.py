@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, Max, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from store.models import DailyProductSales, DailySales, Order, OrderItem
+
+REVENUE_FIELD = models.DecimalField(max_digits=14, decimal_places=2)
+
+# product id -> (quantity, revenue, product name) of one order.
+Lines = Dict[Optional[int], Tuple[int, Decimal, str]]
+
+
+def _add(model, key: dict, create_defaults: Optional[dict] = None, **amounts) -> None:
+    increments = {field: F(field) + value for field, value in amounts.items()}
+    if model.objects.filter(**key).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **(create_defaults or {}), **amounts)
+    except IntegrityError:
+        # Another transaction created the row first.
+        model.objects.filter(**key).update(**increments)
+
+
+def _per_product(lines: Lines, index: int, output_field=None) -> Case:
+    return Case(
+        *(When(product_id=product_id, then=Value(line[index])) for product_id, line in lines.items()),
+        output_field=output_field,
+    )
+
+
+def _add_products(day: date, lines: Lines) -> None:
+    # One UPDATE for the products already rolled up that day and one INSERT for the rest, whatever the order size.
+    rows = DailyProductSales.objects.filter(day=day, product_id__in=lines)
+    updated = rows.update(
+        orders=F('orders') + 1,
+        quantity=F('quantity') + _per_product(lines, 0),
+        revenue=F('revenue') + _per_product(lines, 1, REVENUE_FIELD),
+    )
+    if updated == len(lines):
+        return
+    existing = set(rows.values_list('product_id', flat=True)) if updated else set()
+    missing = {product_id: line for product_id, line in lines.items() if product_id not in existing}
+    try:
+        with transaction.atomic():
+            DailyProductSales.objects.bulk_create(
+                DailyProductSales(
+                    day=day, product_id=product_id, product_name=name, orders=1, quantity=quantity, revenue=revenue
+                )
+                for product_id, (quantity, revenue, name) in missing.items()
+            )
+    except IntegrityError:
+        # Another transaction created some of the rows first; those are updated on the next pass.
+        _add_products(day, missing)
+
+
+def record_paid_order(order: Order) -> None:
+    # Call exactly once per order, in the transaction that moves it to paid.
+    day = timezone.localdate(order.created_at)
+    lines: Lines = {}
+    for item in order.items.all():
+        quantity, revenue, _ = lines.get(item.product_id, (0, Decimal('0.00'), ''))
+        lines[item.product_id] = (quantity + item.quantity, revenue + item.line_total, item.product_name)
+    if not lines:
+        return
+    _add(
+        DailySales,
+        {'day': day},
+        orders=1,
+        quantity=sum(quantity for quantity, _, _ in lines.values()),
+        revenue=sum(revenue for _, revenue, _ in lines.values()),
+    )
+    deleted = lines.pop(None, None)
+    if deleted is not None:
+        # Products deleted since the order was placed share one row per day.
+        quantity, revenue, name = deleted
+        _add(
+            DailyProductSales,
+            {'day': day, 'product_id': None},
+            create_defaults={'product_name': name},
+            orders=1,
+            quantity=quantity,
+            revenue=revenue,
+        )
+    if lines:
+        _add_products(day, lines)
+
+
+@dataclass
+class RebuildReport:
+    days: int = 0
+    rows: int = 0
+
+
+def _local_midnight(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _rebuild_window(start: date, end: date) -> int:
+    items = (
+        OrderItem.objects.filter(
+            order__status=Order.STATUS_PAID,
+            order__created_at__gte=_local_midnight(start),
+            order__created_at__lt=_local_midnight(end),
+        )
+        .annotate(day=TruncDate('order__created_at', tzinfo=timezone.get_current_timezone()))
+        .order_by()
+    )
+    totals = {
+        'total_orders': Count('order', distinct=True),
+        'total_quantity': Sum('quantity'),
+        'total_revenue': Sum(F('unit_price') * F('quantity'), output_field=REVENUE_FIELD),
+    }
+
+    def amounts(row: dict) -> dict:
+        return {'orders': row['total_orders'], 'quantity': row['total_quantity'], 'revenue': row['total_revenue']}
+
+    with transaction.atomic():
+        DailySales.objects.filter(day__gte=start, day__lt=end).delete()
+        DailyProductSales.objects.filter(day__gte=start, day__lt=end).delete()
+        daily = DailySales.objects.bulk_create(
+            DailySales(day=row['day'], **amounts(row)) for row in items.values('day').annotate(**totals)
+        )
+        per_product = DailyProductSales.objects.bulk_create(
+            DailyProductSales(day=row['day'], product_id=row['product_id'], product_name=row['name'], **amounts(row))
+            for row in items.values('day', 'product_id').annotate(name=Max('product_name'), **totals)
+        )
+    return len(daily) + len(per_product)
+
+
+def rebuild(since: Optional[date] = None, until: Optional[date] = None, chunk_days: int = 31) -> RebuildReport:
+    # Each window is replaced in its own transaction, so history is processed in bounded chunks.
+    report = RebuildReport()
+    if since is None:
+        paid = Order.objects.filter(status=Order.STATUS_PAID)
+        first = paid.order_by('created_at').values_list('created_at', flat=True).first()
+        if first is None:
+            return report
+        since = timezone.localdate(first)
+    until = until or timezone.localdate() + timedelta(days=1)
+    start = since
+    while start < until:
+        end = min(start + timedelta(days=chunk_days), until)
+        report.rows += _rebuild_window(start, end)
+        report.days += (end - start).days
+        start = end
+    return report
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import difflib
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+
+from store.models import Product
+from store.services import catalog
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CONFIG = 'russian'
+MIN_AUTOCOMPLETE_LENGTH = 2
+MAX_QUERY_LENGTH = 100
+# Cutoff for the difflib fallback, roughly one typo in a five-letter word.
+FUZZY_CUTOFF = 0.75
+
+
+def normalize(query: str) -> str:
+    return ' '.join(query.casefold().split())[:MAX_QUERY_LENGTH]
+
+
+def _use_postgres() -> bool:
+    return connection.vendor == 'postgresql'
+
+
+def _cache_key(kind: str, query: str) -> str:
+    return f'search:{kind}:{hashlib.md5(query.encode()).hexdigest()}'
+
+
+def _cache_get(key: str, version: Optional[int]) -> Optional[List[int]]:
+    if version is None:
+        return None
+    try:
+        return cache.get(key, version=version)
+    except Exception:  # noqa: BLE001
+        logger.exception('Failed to read from the search cache')
+        return None
+
+
+def _cache_set(key: str, version: Optional[int], ids: List[int]) -> None:
+    if version is None:
+        return
+    try:
+        cache.set(key, ids, timeout=settings.SEARCH_CACHE_TIMEOUT, version=version)
+    except Exception:  # noqa: BLE001
+        logger.exception('Failed to write to the search cache')
+
+
+def _search_ids_postgres(query: str, limit: int) -> List[int]:
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    ids = list(
+        Product.objects.filter(search_vector=search_query)
+        .annotate(rank=SearchRank(F('search_vector'), search_query))
+        .order_by('-rank', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    # Nothing stems to a match, so the query is probably misspelt.
+    return ids or _similar_name_ids_postgres(query, limit)
+
+
+def _similar_name_ids_postgres(query: str, limit: int) -> List[int]:
+    # name %> query is answered by the trigram GIN index.
+    return list(
+        Product.objects.filter(name__trigram_word_similar=query)
+        .annotate(similarity=TrigramWordSimilarity(query, 'name'))
+        .order_by('-similarity', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+
+
+def _words(text: str) -> List[str]:
+    return ''.join(char if char.isalnum() else ' ' for char in text.casefold()).split()
+
+
+def _fuzzy_score(term: str, words: List[str]) -> float:
+    if any(word.startswith(term) for word in words):
+        return 1.0
+    # Compare with word prefixes of the same length, so a typo in a partly typed word still matches.
+    return max((difflib.SequenceMatcher(None, term, word[: len(term)]).ratio() for word in words), default=0.0)
+
+
+def _search_ids_fallback(query: str, limit: int) -> List[int]:
+    # Without PostgreSQL the whole catalog is already cached in memory, so it is scanned in Python.
+    terms = _words(query)
+    scored = []
+    for product in catalog.get_catalog():
+        name = _words(product.name)
+        text = _words(' '.join([product.description, *map(str, product.details or [])]))
+        if all(any(term in word for word in name) for term in terms):
+            scored.append((0, product.id))
+        elif all(any(term in word for word in name + text) for term in terms):
+            scored.append((1, product.id))
+    if not scored:
+        return _similar_name_ids_fallback(query, limit)
+    return [product_id for _, product_id in sorted(scored)[:limit]]
+
+
+def _similar_name_ids_fallback(query: str, limit: int) -> List[int]:
+    terms = _words(query)
+    scored = []
+    for product in catalog.get_catalog():
+        name = _words(product.name)
+        score = min((_fuzzy_score(term, name) for term in terms), default=0.0)
+        if score >= FUZZY_CUTOFF:
+            scored.append((-score, product.id))
+    return [product_id for _, product_id in sorted(scored)[:limit]]
+
+
+def _products(ids: List[int]) -> List[Product]:
+    products = catalog.get_products_by_ids(ids)
+    return [products[product_id] for product_id in ids if product_id in products]
+
+
+def search_products(query: str, limit: Optional[int] = None) -> List[Product]:
+    query = normalize(query)
+    if not query:
+        return []
+    limit = limit or settings.SEARCH_RESULTS_LIMIT
+    version = catalog.get_version()
+    key = _cache_key(f'results:{limit}', query)
+    ids = _cache_get(key, version)
+    if ids is None:
+        ids = _search_ids_postgres(query, limit) if _use_postgres() else _search_ids_fallback(query, limit)
+        _cache_set(key, version, ids)
+    return _products(ids)
+
+
+def autocomplete(prefix: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+    prefix = normalize(prefix)
+    if len(prefix) < MIN_AUTOCOMPLETE_LENGTH:
+        return []
+    limit = limit or settings.SEARCH_AUTOCOMPLETE_LIMIT
+    # Short prefixes are typed by everyone; longer ones are rarely repeated and would only churn the cache.
+    version = catalog.get_version() if len(prefix) <= settings.SEARCH_HOT_PREFIX_LENGTH else None
+    key = _cache_key(f'autocomplete:{limit}', prefix)
+    ids = _cache_get(key, version)
+    if ids is None:
+        if _use_postgres():
+            ids = _similar_name_ids_postgres(prefix, limit)
+        else:
+            ids = _similar_name_ids_fallback(prefix, limit)
+        _cache_set(key, version, ids)
+    return [
+        {'name': product.name, 'url': product.get_absolute_url(), 'price': f'{product.price:.0f}'}
+        for product in _products(ids)
+    ]
@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+import weakref
+from base64 import b64encode
+from typing import Dict, Optional, Tuple
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3 import Retry
+from yookassa.domain.common import UserAgent
+from yookassa.domain.exceptions import (
+    ApiError,
+    BadRequestError,
+    ForbiddenError,
+    GoneError,
+    InternalServerError,
+    NotFoundError,
+    ResponseProcessingError,
+    TooManyRequestsError,
+    UnauthorizedError,
+)
+from yookassa.domain.request import PaymentRequest
+from yookassa.domain.response import PaymentResponse
+
+from store import metrics
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = [202, 429, 500, 502, 503, 504]
+
+_ERRORS_BY_STATUS = {
+    error.HTTP_CODE: error
+    for error in (
+        BadRequestError,
+        UnauthorizedError,
+        ForbiddenError,
+        NotFoundError,
+        GoneError,
+        TooManyRequestsError,
+        InternalServerError,
+        ResponseProcessingError,
+    )
+}
+
+
+class PaymentProviderUnavailable(RuntimeError):
+    pass
+
+
+def _api_error(response: requests.Response) -> ApiError:
+    try:
+        content = response.json()
+    except ValueError:
+        content = {'type': 'error', 'description': response.text[:200]}
+    return _ERRORS_BY_STATUS.get(response.status_code, ApiError)(content)
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._state = self.CLOSED
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Let a single probe through; everyone else keeps failing fast until it reports back.
+                self._state = self.HALF_OPEN
+                return
+            raise PaymentProviderUnavailable('YooKassa is temporarily unavailable')
+
+    def release_probe(self) -> None:
+        # The call ended without an answer to judge YooKassa by; the next caller probes instead.
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self._state != self.CLOSED:
+                metrics.YOOKASSA_CIRCUIT_OPEN.set(0)
+            self._state = self.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning('YooKassa circuit breaker opened after %s failures', self._failures)
+                    metrics.YOOKASSA_CIRCUIT_OPEN.set(1)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class CallStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, operation: str, seconds: float, ok: bool) -> None:
+        metrics.DEPENDENCY_DURATION.observe(
+            seconds, service='yookassa', operation=operation, outcome='ok' if ok else 'error'
+        )
+        with self._lock:
+            stats = self._stats.setdefault(operation, {'calls': 0, 'errors': 0, 'seconds_total': 0.0, 'seconds_max': 0.0})
+            stats['calls'] += 1
+            stats['errors'] += 0 if ok else 1
+            stats['seconds_total'] += seconds
+            stats['seconds_max'] = max(stats['seconds_max'], seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {operation: dict(stats) for operation, stats in self._stats.items()}
+
+
+def _auth_headers(shop_id: str, secret_key: str) -> Dict[str, str]:
+    token = b64encode(f'{shop_id}:{secret_key}'.encode()).decode('ascii')
+    return {
+        'Authorization': f'Basic {token}',
+        'Content-Type': 'application/json',
+        'YM-User-Agent': UserAgent().get_header_string(),
+    }
+
+
+def _payment_request(params: dict, idempotency_key: Optional[str]) -> Tuple[dict, Dict[str, str]]:
+    request = PaymentRequest(params)
+    request.validate()
+    return dict(request), {'Idempotence-Key': str(idempotency_key or uuid.uuid4())}
+
+
+class _BaseClient:
+    def __init__(self, api_url: str, connect_timeout: float, read_timeout: float, breaker: CircuitBreaker, stats: CallStats):
+        self.api_url = api_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker
+        self.stats = stats
+
+    def _record_error(self, operation: str, started: float) -> None:
+        self.stats.record(operation, time.perf_counter() - started, ok=False)
+        self.breaker.record_failure()
+
+    def _handle_response(self, operation: str, started: float, status_code: int, response) -> dict:
+        self.stats.record(operation, time.perf_counter() - started, ok=status_code == 200)
+        if status_code >= 500 or status_code == 429:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if status_code != 200:
+            raise _api_error(response)
+        return response.json()
+
+    def metrics(self) -> dict:
+        return {'breaker_state': self.breaker.state, 'calls': self.stats.snapshot()}
+
+
+class YooKassaClient(_BaseClient):
+    def __init__(self, shop_id: str, secret_key: str, max_retries: int, pool_size: int, **kwargs):
+        super().__init__(**kwargs)
+        self.session = requests.Session()
+        # Every call we make is idempotent (GET, or POST with an Idempotence-Key), so retrying is safe.
+        retries = Retry(
+            total=max_retries,
+            backoff_factor=0.2,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=['GET', 'POST'],
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retries)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(_auth_headers(shop_id, secret_key))
+
+    def _request(self, operation: str, method: str, path: str, **kwargs) -> dict:
+        self.breaker.before_call()
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, f'{self.api_url}{path}', timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            self._record_error(operation, started)
+            raise
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+        return self._handle_response(operation, started, response.status_code, response)
+
+    def create_payment(self, params: dict, idempotency_key: Optional[str] = None) -> PaymentResponse:
+        body, headers = _payment_request(params, idempotency_key)
+        return PaymentResponse(self._request('payment_create', 'POST', '/payments', json=body, headers=headers))
+
+    def find_payment(self, payment_id: str) -> PaymentResponse:
+        return PaymentResponse(self._request('payment_find_one', 'GET', f'/payments/{payment_id}'))
+
+
+class AsyncYooKassaClient(_BaseClient):
+    def __init__(self, shop_id: str, secret_key: str, max_retries: int, pool_size: int, **kwargs):
+        super().__init__(**kwargs)
+        self.max_retries = max_retries
+        connect_timeout, read_timeout = self.timeout
+        self.session = httpx.AsyncClient(
+            headers=_auth_headers(shop_id, secret_key),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            transport=httpx.AsyncHTTPTransport(retries=max_retries),
+        )
+
+    async def _send(self, method: str, path: str, **kwargs) -> httpx.Response:
+        # httpx only retries failed connects; mirror the sync client's status-based retries.
+        for attempt in range(self.max_retries + 1):
+            response = await self.session.request(method, f'{self.api_url}{path}', **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                return response
+            await asyncio.sleep(0.2 * 2**attempt)
+        return response
+
+    async def _request(self, operation: str, method: str, path: str, **kwargs) -> dict:
+        self.breaker.before_call()
+        started = time.perf_counter()
+        try:
+            response = await self._send(method, path, **kwargs)
+        except httpx.HTTPError:
+            self._record_error(operation, started)
+            raise
+        except BaseException:
+            # Cancelled with the request, or failed before a response; neither says anything about YooKassa.
+            self.breaker.release_probe()
+            raise
+        return self._handle_response(operation, started, response.status_code, response)
+
+    async def create_payment(self, params: dict, idempotency_key: Optional[str] = None) -> PaymentResponse:
+        body, headers = _payment_request(params, idempotency_key)
+        return PaymentResponse(await self._request('payment_create', 'POST', '/payments', json=body, headers=headers))
+
+    async def find_payment(self, payment_id: str) -> PaymentResponse:
+        return PaymentResponse(await self._request('payment_find_one', 'GET', f'/payments/{payment_id}'))
+
+
+_client: Optional[YooKassaClient] = None
+_async_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncYooKassaClient]' = weakref.WeakKeyDictionary()
+_shared: Optional[Tuple[CircuitBreaker, CallStats]] = None
+_client_lock = threading.Lock()
+
+
+def _client_options() -> dict:
+    # Sync and async clients share one breaker and one set of stats per process.
+    global _shared
+    if not settings.YOOKASSA_SHOP_ID or not settings.YOOKASSA_SECRET_KEY:
+        raise RuntimeError('YooKassa credentials are not configured')
+    if _shared is None:
+        breaker = CircuitBreaker(
+            failure_threshold=settings.YOOKASSA_BREAKER_FAILURE_THRESHOLD,
+            reset_timeout=settings.YOOKASSA_BREAKER_RESET_TIMEOUT,
+        )
+        _shared = (breaker, CallStats())
+    breaker, stats = _shared
+    return {
+        'shop_id': settings.YOOKASSA_SHOP_ID,
+        'secret_key': settings.YOOKASSA_SECRET_KEY,
+        'api_url': settings.YOOKASSA_API_URL,
+        'connect_timeout': settings.YOOKASSA_CONNECT_TIMEOUT,
+        'read_timeout': settings.YOOKASSA_READ_TIMEOUT,
+        'max_retries': settings.YOOKASSA_MAX_RETRIES,
+        'pool_size': settings.YOOKASSA_POOL_SIZE,
+        'breaker': breaker,
+        'stats': stats,
+    }
+
+
+def get_client() -> YooKassaClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = YooKassaClient(**_client_options())
+    return _client
+
+
+def get_async_client() -> AsyncYooKassaClient:
+    # httpx connection pools are bound to the event loop that created them.
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        with _client_lock:
+            client = _async_clients.get(loop)
+            if client is None:
+                client = _async_clients[loop] = AsyncYooKassaClient(**_client_options())
+    return client
+
+
+def reset_client() -> None:
+    global _client, _shared
+    with _client_lock:
+        _client = None
+        _shared = None
+        _async_clients.clear()
@@ -0,0 +1,20 @@
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from store.models import Product, ProductImage
+from store.services import catalog, yookassa_client
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductImage)
+def invalidate_catalog_cache(sender, **kwargs) -> None:
+    # Bumping before the commit would let a concurrent request cache the old rows under the new version.
+    transaction.on_commit(catalog.bump_version)
+
+
+@receiver(setting_changed)
+def reset_yookassa_client(setting, **kwargs) -> None:
+    if setting.startswith('YOOKASSA_'):
+        yookassa_client.reset_client()
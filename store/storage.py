@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import gzip
+import logging
+import re
+from typing import Dict, Iterator, List
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional, .gz siblings are still produced
+    brotli = None
+
+BUNDLES_DIR = 'bundles'
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.svg', '.txt', '.xml', '.html')
+
+_CSS_COMMENTS = re.compile(r'/\*.*?\*/', re.S)
+_CSS_WHITESPACE = re.compile(r'\s+')
+_CSS_PUNCTUATION = re.compile(r'\s*([{};:,>])\s*')
+
+
+def minify_css(source: str) -> str:
+    source = _CSS_COMMENTS.sub('', source)
+    source = _CSS_WHITESPACE.sub(' ', source)
+    source = _CSS_PUNCTUATION.sub(r'\1', source)
+    return source.replace(';}', '}').strip()
+
+
+def minify_js(source: str) -> str:
+    # Indentation and blank lines only: anything smarter needs a real JS parser.
+    return '\n'.join(line.strip() for line in source.splitlines() if line.strip())
+
+
+def bundle_path(name: str) -> str:
+    return f'{BUNDLES_DIR}/{name}'
+
+
+def compressed_variants(content: bytes) -> Dict[str, bytes]:
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content, quality=11)
+    return {suffix: data for suffix, data in variants.items() if len(data) < len(content)}
+
+
+class BundledManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Builds STATIC_BUNDLES, hashes everything and writes .gz/.br siblings during collectstatic."""
+
+    def stored_name(self, name: str) -> str:
+        # Without a manifest (development, tests) fall back to the plain name instead of failing.
+        if not self.hashed_files:
+            return name
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Product images are paths stored in the database and can be newer than the last collectstatic.
+            logger.warning('%s is missing from the static manifest, serving it unhashed', name)
+            return name
+
+    def post_process(self, paths, dry_run=False, **options) -> Iterator:
+        if dry_run:
+            return
+        for name, sources in settings.STATIC_BUNDLES.items():
+            path = bundle_path(name)
+            self._write(path, self._build_bundle(name, sources))
+            paths[path] = (self, path)
+        yield from super().post_process(paths, dry_run, **options)
+        for hashed_name in set(self.hashed_files.values()):
+            if hashed_name.endswith(COMPRESSIBLE_EXTENSIONS):
+                with self.open(hashed_name) as original:
+                    content = original.read()
+                for suffix, data in compressed_variants(content).items():
+                    self._write(hashed_name + suffix, data)
+
+    def _build_bundle(self, name: str, sources: List[str]) -> bytes:
+        parts = []
+        for source in sources:
+            with self.open(source) as original:
+                parts.append(original.read().decode('utf-8'))
+        if name.endswith('.css'):
+            return minify_css('\n'.join(parts)).encode('utf-8')
+        return ';\n'.join(minify_js(part) for part in parts).encode('utf-8')
+
+    def _write(self, name: str, content: bytes) -> None:
+        if self.exists(name):
+            self.delete(name)
+        self._save(name, ContentFile(content))
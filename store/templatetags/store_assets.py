@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from store.storage import bundle_path
+
+register = template.Library()
+
+
+@register.simple_tag
+def static_bundle(name: str):
+    # Bundles only exist after collectstatic; until then link the source files one by one.
+    path = bundle_path(name)
+    if path in getattr(staticfiles_storage, 'hashed_files', {}):
+        urls = [static(path)]
+    else:
+        urls = [static(source) for source in settings.STATIC_BUNDLES[name]]
+    markup = '<link rel="stylesheet" href="{}" />' if name.endswith('.css') else '<script src="{}"></script>'
+    return format_html_join('\n', markup, ((url,) for url in urls))
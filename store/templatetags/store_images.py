@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from store.services.images import get_variants
+
+register = template.Library()
+
+
+def _srcset(variants) -> str:
+    return ', '.join(f'{static(path)} {width}w' for width, path in variants)
+
+
+@register.simple_tag
+def responsive_image(path: str, alt: str = '', sizes: str = '100vw', css_class: str = '', loading: str = 'lazy'):
+    entry = get_variants(path)
+    if entry is None:
+        return format_html(
+            '<img class="{}" src="{}" alt="{}" loading="{}" decoding="async" />', css_class, static(path), alt, loading
+        )
+    jpeg = entry['variants']['jpg']
+    return format_html(
+        '<picture class="responsive-image">'
+        '<source type="image/webp" srcset="{}" sizes="{}" />'
+        '<img class="{}" src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="{}" decoding="async"'
+        ' style="background: url({}) center / cover no-repeat" />'
+        '</picture>',
+        _srcset(entry['variants']['webp']),
+        sizes,
+        css_class,
+        static(jpeg[-1][1]),
+        _srcset(jpeg),
+        sizes,
+        entry['width'],
+        entry['height'],
+        alt,
+        loading,
+        entry['lqip'],
+    )
@@ -1,3 +1,1264 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import json
+import multiprocessing
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import requests
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.contrib.sessions.models import Session
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import Context, Template
+from django.templatetags.static import static
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from store import metrics, ratelimit
+from store.admin import OrderAdmin
+from store.context_processors import cart as cart_context
+from store.management.commands._benchmark import is_disposable_database, summarize
+from store.management.commands._seed import remove_orders, remove_seeded, seed_catalog, seed_orders
+from store.middleware import CartCookieMiddleware, StaticAssetsMiddleware
+from store.models import DailyProductSales, DailySales, NotificationOutbox, Order, Product
+from store.query_budget import QueryBudgetTestMixin
+from store.services import cart as cart_service
+from store.services import catalog, exports, images, inventory, notifications, page_cache, sales, search, yookassa_client
+from store.services import orders as order_service
+from store.services.payments import apply_payment, update_order_status_from_payment
+
+
+def _make_request(method='get', cart=None):
+    request = getattr(RequestFactory(), method)('/')
+    request.session = SessionStore()
+    if cart is not None:
+        request.session['cart'] = cart
+    return request
+
+
+class CartResolutionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.first()
+
+    def _add_product(self, quantity=1):
+        self.client.post(reverse('store:add_to_cart', args=[self.product.slug]), {'quantity': quantity})
+
+    def test_empty_cart_costs_no_queries(self):
+        request = _make_request()
+        with self.assertNumQueries(0):
+            cart = cart_service.get_cart(request)
+        self.assertEqual(cart.total_quantity, 0)
+
+    def test_context_processor_is_lazy(self):
+        request = _make_request(cart={str(self.product.id): 2})
+        with self.assertNumQueries(0):
+            context = cart_context(request)
+        with self.assertNumQueries(2):
+            self.assertEqual(context['cart_items_count'], 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(context['cart_items']), 1)
+            self.assertEqual(context['cart_total'], self.product.price * 2)
+
+    def test_cart_resolved_once_per_request(self):
+        self._add_product(quantity=2)
+        cache.clear()
+        # Session load, products, images; the context processor reuses the view's cart.
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('store:cart'))
+        self.assertContains(response, 'data-cart-count>2<')
+
+    def test_mutation_refreshes_memoized_cart(self):
+        request = _make_request('post')
+        self.assertEqual(cart_service.get_cart(request).total_quantity, 0)
+        cart = cart_service.add_to_cart(request, self.product.id, 3)
+        self.assertEqual(cart.total_quantity, 3)
+        self.assertIs(cart_service.get_cart(request), cart)
+        cart_service.clear_cart(request)
+        self.assertEqual(cart_service.get_cart(request).total_quantity, 0)
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.first, self.second, self.third = Product.objects.order_by('id')[:3]
+        self.client.post(reverse('store:add_to_cart', args=[self.first.slug]), {'quantity': 2})
+        self.client.post(reverse('store:add_to_cart', args=[self.second.slug]), {'quantity': 1})
+        catalog.get_products_by_ids([self.third.id])
+
+    def _batch(self, operations):
+        return self.client.post(reverse('store:cart_batch'), {'operations': operations}, content_type='application/json')
+
+    def test_applies_operations_and_returns_only_changed_lines(self):
+        operations = [
+            {'product_id': self.first.id, 'delta': 3},
+            {'product_id': self.second.id, 'remove': True},
+            {'product_id': self.third.id, 'set': 4},
+        ]
+        # Session read and save only; prices come from the warm catalog cache.
+        with self.assertNumQueries(4):
+            response = self._batch(operations)
+        payload = response.json()
+        self.assertEqual(
+            payload['items'],
+            [
+                {'product_id': self.first.id, 'quantity': 5, 'total_price': f'{self.first.price * 5:.0f}'},
+                {'product_id': self.third.id, 'quantity': 4, 'total_price': f'{self.third.price * 4:.0f}'},
+            ],
+        )
+        self.assertEqual(payload['removed'], [self.second.id])
+        self.assertEqual(payload['cart']['total_quantity'], 9)
+        self.assertEqual(payload['cart']['total_amount'], f'{self.first.price * 5 + self.third.price * 4:.0f}')
+
+    def test_dropping_to_zero_removes_line(self):
+        payload = self._batch([{'product_id': self.first.id, 'delta': -2}]).json()
+        self.assertEqual(payload['removed'], [self.first.id])
+        self.assertEqual(payload['cart']['total_quantity'], 1)
+
+    def test_invalid_operations_are_rejected_without_changes(self):
+        response = self._batch([{'product_id': self.first.id, 'set': 5}, {'product_id': self.second.id, 'delta': '1'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self._batch([]).json()['cart']['total_quantity'], 3)
+
+
+@override_settings(CART_STORAGE='store.services.cart_storage.SignedCookieCartStorage')
+class SignedCookieCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.first()
+        self.url = reverse('store:add_to_cart', args=[self.product.slug])
+
+    def test_cart_round_trips_through_cookie_without_sessions(self):
+        self.client.post(self.url, {'quantity': 2})
+        self.client.post(self.url, {'quantity': 1})
+        self.assertIn(settings.CART_COOKIE_NAME, self.client.cookies)
+        self.assertFalse(Session.objects.exists())
+        cache.clear()
+        # Products and images only; nothing is read from django_session.
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('store:cart'))
+        self.assertContains(response, 'data-cart-count>3<')
+
+    def test_tampered_cookie_is_ignored(self):
+        self.client.post(self.url, {'quantity': 2})
+        self.client.cookies[settings.CART_COOKIE_NAME] = self.client.cookies[settings.CART_COOKIE_NAME].value + 'x'
+        with self.assertLogs('store.services.cart_storage', 'WARNING'):
+            response = self.client.get(reverse('store:cart'))
+        self.assertContains(response, 'data-cart-count>0<')
+
+    @override_settings(CART_COOKIE_MAX_BYTES=40)
+    def test_oversized_cart_is_rejected(self):
+        response = self.client.post(self.url, {'quantity': 1}, headers={'x-requested-with': 'XMLHttpRequest'})
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn(settings.CART_COOKIE_NAME, self.client.cookies)
+
+    def test_clearing_cart_deletes_cookie(self):
+        self.client.post(self.url, {'quantity': 1})
+        self.client.post(reverse('store:remove_from_cart', args=[self.product.slug]))
+        request = _make_request()
+        request.COOKIES = {settings.CART_COOKIE_NAME: self.client.cookies[settings.CART_COOKIE_NAME].value}
+        self.assertEqual(cart_service.get_cart(request).total_quantity, 0)
+        cart_service.clear_cart(request)
+        response = CartCookieMiddleware(lambda request: HttpResponse())(request)
+        self.assertEqual(response.cookies[settings.CART_COOKIE_NAME]['max-age'], 0)
+
+
+@override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_HEADER=True)
+class QueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.product = Product.objects.first()
+        self.client.post(reverse('store:add_to_cart', args=[self.product.slug]), {'quantity': 1})
+        self.client.get(reverse('store:cart'))
+
+    def test_pages_stay_within_budget_with_cold_cache(self):
+        xhr = {'x-requested-with': 'XMLHttpRequest'}
+        requests = [
+            lambda: self.client.get(reverse('store:catalog')),
+            lambda: self.client.get(reverse('store:product_detail', args=[self.product.slug])),
+            lambda: self.client.post(reverse('store:add_to_cart', args=[self.product.slug]), headers=xhr),
+            lambda: self.client.post(
+                reverse('store:cart_batch'),
+                {'operations': [{'product_id': self.product.id, 'delta': 1}]},
+                content_type='application/json',
+            ),
+            lambda: self.client.get(reverse('store:cart')),
+            lambda: self.client.get(reverse('store:checkout')),
+            lambda: self.client.post(reverse('store:remove_from_cart', args=[self.product.slug]), headers=xhr),
+            lambda: self.client.get(reverse('store:catalog_more'), {'line': 'first', 'after': self.product.id}),
+            lambda: self.client.get(reverse('store:search'), {'q': 'болеро'}),
+            lambda: self.client.get(reverse('store:search_autocomplete'), {'q': 'бол'}),
+        ]
+        for request in requests:
+            cache.clear()
+            response = request()
+            with self.subTest(view=response.query_stats.view_name):
+                self.assertWithinQueryBudget(response)
+
+    def test_checkout_stays_within_budget(self):
+        cache.clear()
+        payment = mock.Mock(id='pay-1', confirmation=mock.Mock(confirmation_url='https://pay.example/1'))
+        with mock.patch('store.views.acreate_payment', return_value=payment):
+            response = self.client.post(
+                reverse('store:checkout_submit'),
+                {'full_name': 'Анна Иванова', 'phone': '+7 (999) 123-45-67', 'address': 'Москва, ул. Тестовая, 1'},
+            )
+        self.assertEqual(response.status_code, 302)
+        self.assertWithinQueryBudget(response)
+
+    def test_header_reports_queries_and_duplicates(self):
+        cache.clear()
+        response = self.client.get(reverse('store:cart'))
+        self.assertRegex(
+            response['X-Query-Budget'],
+            r'^view=store:cart; queries=3; budget=3; duplicates=0; db_ms=\d+\.\d$',
+        )
+        self.assertTrue(response['Server-Timing'].startswith('db;dur='))
+
+    def test_exceeding_budget_fails_and_logs(self):
+        cache.clear()
+        with override_settings(QUERY_BUDGETS={'store:cart': 1}):
+            with self.assertLogs('store.middleware', 'WARNING'):
+                response = self.client.get(reverse('store:cart'))
+        with self.assertRaisesMessage(AssertionError, 'store:cart ran 3 queries, budget is 1'):
+            self.assertWithinQueryBudget(response)
+
+
+@override_settings(DEBUG=True, STATIC_SERVE=True)
+class AsgiMiddlewareTests(TestCase):
+    def test_chain_runs_without_thread_hops(self):
+        # Django logs at DEBUG each middleware it has to wrap in sync_to_async/async_to_sync.
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            handler = ASGIHandler()
+        self.assertTrue(iscoroutinefunction(handler._middleware_chain))
+        middleware = handler._middleware_chain
+        project = []
+        while middleware is not None:
+            if type(middleware).__module__ == 'store.middleware':
+                project.append(type(middleware).__name__)
+                self.assertTrue(middleware.async_mode)
+            # Each instance is wrapped by convert_exception_to_response, which keeps it as __wrapped__.
+            middleware = getattr(middleware, '__wrapped__', None) or getattr(middleware, 'get_response', None)
+        self.assertEqual(len(project), 5)
+
+    async def test_async_requests_are_measured(self):
+        await cache.aclear()
+        response = await AsyncClient().get(reverse('store:catalog'))
+        self.assertRegex(response['X-Query-Budget'], r'^view=store:catalog; queries=[1-9]')
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.first()
+
+    def test_catalog_served_from_cache(self):
+        with self.assertNumQueries(2):
+            catalog.get_catalog()
+        main_image = self.product.images.first()
+        with self.assertNumQueries(0):
+            products = catalog.get_catalog()
+            self.assertEqual(products[0].main_image(), main_image)
+
+    def test_lookups_by_slug_and_id_share_entries(self):
+        catalog.get_product_by_slug(self.product.slug)
+        with self.assertNumQueries(0):
+            self.assertEqual(catalog.get_product_by_id(self.product.id), self.product)
+            self.assertEqual(catalog.get_product_by_slug(self.product.slug), self.product)
+        self.assertIsNone(catalog.get_product_by_slug('missing'))
+
+    def test_saving_product_invalidates_cache(self):
+        catalog.get_catalog()
+        catalog.get_product_by_slug(self.product.slug)
+        self.product.name = 'Новое имя'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+            # Until the commit other requests still see the old row, so the cached copy stays valid.
+            self.assertNotEqual(catalog.get_catalog()[0].name, 'Новое имя')
+        self.assertEqual(catalog.get_catalog()[0].name, 'Новое имя')
+        self.assertEqual(catalog.get_product_by_slug(self.product.slug).name, 'Новое имя')
+
+    def test_saving_image_invalidates_cache(self):
+        catalog.get_product_by_id(self.product.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.images.all().delete()
+            self.product.images.create(image_path='images/new.jpg')
+        cached = catalog.get_product_by_id(self.product.id)
+        self.assertEqual([image.image_path for image in cached.images.all()], ['images/new.jpg'])
+
+    def test_version_starts_from_the_clock(self):
+        with mock.patch.object(catalog.time, 'time', return_value=1_700_000_000.5):
+            self.assertEqual(catalog.get_version(), 1_700_000_000)
+            cache.clear()
+            catalog.bump_version()
+        self.assertEqual(catalog.get_version(), 1_700_000_000)
+
+    def test_cache_outage_falls_back_to_database(self):
+        with mock.patch.object(catalog.cache, 'get', side_effect=ConnectionError):
+            with self.assertNumQueries(2), self.assertLogs('store.services.catalog', 'ERROR'):
+                products = catalog.get_catalog()
+        self.assertEqual(len(products), Product.objects.count())
+
+
+class CatalogPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.first()
+        self.client.get(reverse('store:catalog'))
+
+    def test_hit_skips_database_and_rendering(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('store:catalog'))
+        self.assertEqual(response.templates, [])
+        self.assertContains(response, self.product.name)
+        self.assertNotContains(response, page_cache.CSRF_PLACEHOLDER)
+
+    def test_holes_filled_per_visitor(self):
+        self.client.post(reverse('store:add_to_cart', args=[self.product.slug]), {'quantity': 2})
+        response = self.client.get(reverse('store:catalog'))
+        content = response.content.decode()
+        self.assertIn('data-cart-count>2<', content)
+        self.assertIn('csrftoken', response.cookies)
+        self.assertNotIn(page_cache.CSRF_PLACEHOLDER, content)
+        self.assertIn('добавлен в корзину', content)
+        self.assertNotIn(page_cache.MESSAGES_PLACEHOLDER, content)
+
+    def test_product_change_invalidates_page(self):
+        self.product.name = 'Новое имя'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertContains(self.client.get(reverse('store:catalog')), 'Новое имя')
+
+
+@override_settings(CATALOG_PAGE_SIZE=2)
+class CatalogPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_lines_are_split_and_paginated_in_the_database(self):
+        lines = catalog.get_catalog_lines()
+        first = list(Product.objects.filter(first_line=True).order_by('id'))
+        self.assertEqual(lines['first'].products, first[:2])
+        self.assertEqual(lines['first'].next_after, first[1].id)
+        self.assertTrue(all(not product.first_line for product in lines['second'].products))
+        self.assertIn('description', lines['first'].products[0].get_deferred_fields())
+        with self.assertNumQueries(0):
+            self.assertEqual(catalog.get_catalog_lines()['first'].products, first[:2])
+
+    def test_fragment_continues_from_cursor(self):
+        response = self.client.get(reverse('store:catalog'))
+        first = list(Product.objects.filter(first_line=True).order_by('id'))
+        more_url = f"{reverse('store:catalog_more')}?line=first&amp;after={first[1].id}"
+        self.assertContains(response, more_url)
+        response = self.client.get(reverse('store:catalog_more'), {'line': 'first', 'after': first[1].id})
+        self.assertContains(response, first[2].name)
+        self.assertNotContains(response, first[0].name)
+        self.assertNotContains(response, 'data-more-url')
+        self.assertContains(response, f'name="next" value="{reverse("store:catalog")}"')
+
+    def test_fragment_rejects_bad_parameters(self):
+        url = reverse('store:catalog_more')
+        self.assertEqual(self.client.get(url, {'line': 'third', 'after': 1}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'line': 'first', 'after': 'x'}).status_code, 404)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.first()
+        self.url = reverse('store:product_detail', args=[self.product.slug])
+
+    def test_repeat_visit_gets_304_without_queries(self):
+        response = self.client.get(reverse('store:catalog'))
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('store:catalog'), headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_catalog_change_invalidates_validators(self):
+        response = self.client.get(self.url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(
+            self.client.get(self.url, headers={'if-modified-since': last_modified}).status_code,
+            304,
+        )
+        self.product.price += 1
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response = self.client.get(self.url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_cart_change_invalidates_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.post(reverse('store:add_to_cart', args=[self.product.slug]), {'quantity': 1})
+        self.client.get(reverse('store:cart'))
+        response = self.client.get(self.url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.client.get(self.url, headers={'if-none-match': response['ETag']}).status_code, 304)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_search_matches_name_description_and_details(self):
+        by_name = search.search_products('болеро песок')
+        self.assertEqual([product.slug for product in by_name], ['bolero-sand'])
+        by_detail = search.search_products('ВИСКОЗОЙ')
+        self.assertIn('bolero-dark', [product.slug for product in by_detail])
+        self.assertEqual(search.search_products('   '), [])
+
+    def test_search_tolerates_typos(self):
+        self.assertIn('bolero-sand', [product.slug for product in search.search_products('болерро')])
+
+    def test_autocomplete_returns_cached_suggestions(self):
+        response = self.client.get(reverse('store:search_autocomplete'), {'q': 'Бол'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        suggestions = response.json()['suggestions']
+        self.assertTrue(suggestions)
+        self.assertTrue(all(suggestion['name'].startswith('Болеро') for suggestion in suggestions))
+        with self.assertNumQueries(0):
+            self.assertEqual(search.autocomplete('бол'), suggestions)
+        self.assertEqual(search.autocomplete('б'), [])
+
+    def test_catalog_change_invalidates_cached_results(self):
+        self.assertEqual(search.search_products('пелерина'), [])
+        product = Product.objects.get(slug='bolero-sand')
+        product.name = 'Пелерина'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual([item.slug for item in search.search_products('пелерина')], ['bolero-sand'])
+
+    def test_search_page_lists_results(self):
+        response = self.client.get(reverse('store:search'), {'q': 'песок'})
+        self.assertContains(response, reverse('store:product_detail', args=['bolero-sand']))
+        response = self.client.get(reverse('store:search'), {'q': 'zzzz'})
+        self.assertContains(response, 'ничего не найдено')
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        self.static_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.static_dir)
+        (self.static_dir / 'images').mkdir()
+        Image.new('RGB', (900, 600), 'brown').save(self.static_dir / 'images' / 'photo.jpg')
+        settings_override = override_settings(STATICFILES_DIRS=[self.static_dir])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _build(self):
+        out = StringIO()
+        call_command('build_image_variants', 'images/photo.jpg', '--workers', '1', stdout=out)
+        return out.getvalue()
+
+    def test_builds_hashed_variants_once_and_renders_srcset(self):
+        version = catalog.get_version()
+        self.assertIn('Built 1', self._build())
+        self.assertNotEqual(catalog.get_version(), version)
+        version = catalog.get_version()
+        self.assertIn('unchanged 1', self._build())
+        self.assertEqual(catalog.get_version(), version)
+        entry = images.get_variants('images/photo.jpg')
+        self.assertEqual([width for width, _ in entry['variants']['webp']], [160, 320, 480, 640, 900])
+        for _, path in entry['variants']['webp'] + entry['variants']['jpg']:
+            self.assertTrue((self.static_dir / path).exists())
+        self.assertTrue(entry['lqip'].startswith('data:image/jpeg;base64,'))
+        html = Template('{% load store_images %}{% responsive_image "images/photo.jpg" alt="Фото" sizes="200px" %}').render(
+            Context()
+        )
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f'/static/{entry["variants"]["jpg"][1][1]} 320w', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('width="900" height="600"', html)
+
+    def test_unknown_image_falls_back_to_original(self):
+        html = Template('{% load store_images %}{% responsive_image "images/other.jpg" %}').render(Context())
+        self.assertEqual(html, '<img class="" src="/static/images/other.jpg" alt="" loading="lazy" decoding="async" />')
+
+
+class StaticAssetsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = Path(tempfile.mkdtemp())
+        cls.addClassCleanup(shutil.rmtree, cls.static_root)
+        settings_override = override_settings(STATIC_ROOT=cls.static_root, STATIC_SERVE=True)
+        settings_override.enable()
+        cls.addClassCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def _get(self, name, **headers):
+        middleware = StaticAssetsMiddleware(lambda request: HttpResponse(status=404))
+        return middleware(RequestFactory().get(f'/static/{name}', headers=headers))
+
+    def test_bundles_are_minified_hashed_and_precompressed(self):
+        hashed = staticfiles_storage.stored_name('bundles/base.css')
+        self.assertRegex(hashed, r'^bundles/base\.[0-9a-f]{12}\.css$')
+        content = (self.static_root / hashed).read_bytes()
+        self.assertIn(b'.header{', content)
+        self.assertIn(b'.footer{', content)
+        self.assertNotIn(b'\n', content)
+        self.assertEqual(gzip.decompress((self.static_root / f'{hashed}.gz').read_bytes()), content)
+        html = Template("{% load store_assets %}{% static_bundle 'base.css' %}").render(Context())
+        self.assertEqual(html, f'<link rel="stylesheet" href="/static/{hashed}" />')
+
+    def test_serves_precompressed_hashed_files_as_immutable(self):
+        hashed = staticfiles_storage.stored_name('bundles/cart.js')
+        response = self._get(hashed, accept_encoding='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(response['Content-Type'], 'text/javascript')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(b''.join(response.streaming_content), (self.static_root / f'{hashed}.br').read_bytes())
+        response.close()
+        response = self._get('bundles/cart.js', accept_encoding='br;q=0')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        response.close()
+        self.assertEqual(self._get('missing.css').status_code, 404)
+
+    def test_files_missing_from_manifest_are_linked_unhashed(self):
+        with self.assertLogs('store.storage', 'WARNING'):
+            url = static('images/added-after-collectstatic.jpg')
+        self.assertEqual(url, '/static/images/added-after-collectstatic.jpg')
+
+
+@override_settings(TELEGRAM_BOT_TOKEN='token', TELEGRAM_CHAT_IDS=['1', '2'])
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(total_amount=Decimal('100.00'), status=Order.STATUS_PAID)
+
+    def test_enqueue_is_idempotent_per_order(self):
+        with mock.patch.object(notifications.requests, 'post') as post:
+            notifications.notify_order_paid(self.order)
+            notifications.notify_order_paid(self.order)
+        post.assert_not_called()
+        self.assertEqual(NotificationOutbox.objects.filter(order=self.order).count(), 1)
+
+    def test_successful_delivery_marks_order_notified(self):
+        notifications.notify_order_paid(self.order)
+        with mock.patch.object(notifications.requests, 'post') as post:
+            self.assertEqual(notifications.dispatch_pending(), 1)
+        self.assertEqual(post.call_count, 2)
+        entry = NotificationOutbox.objects.get(order=self.order)
+        self.assertEqual(entry.status, NotificationOutbox.STATUS_SENT)
+        self.order.refresh_from_db()
+        self.assertIsNotNone(self.order.notified_at)
+
+    def test_failed_chat_is_retried_with_backoff(self):
+        notifications.notify_order_paid(self.order)
+        response = mock.Mock()
+        response.raise_for_status.side_effect = [None, requests.HTTPError('502')]
+        with mock.patch.object(notifications.requests, 'post', return_value=response):
+            with self.assertLogs('store.services.notifications', 'WARNING'):
+                notifications.dispatch_pending()
+        entry = NotificationOutbox.objects.get(order=self.order)
+        self.assertEqual(entry.status, NotificationOutbox.STATUS_PENDING)
+        self.assertEqual(entry.pending_chat_ids, ['2'])
+        self.assertGreater(entry.available_at, timezone.now())
+        self.order.refresh_from_db()
+        self.assertIsNone(self.order.notified_at)
+        self.assertEqual(notifications.dispatch_pending(), 0)
+
+    @override_settings(NOTIFICATION_MAX_ATTEMPTS=1)
+    def test_exhausted_entries_are_dead_lettered(self):
+        notifications.notify_partnership('a@example.com', '')
+        with mock.patch.object(notifications.requests, 'post', side_effect=requests.ConnectionError):
+            with self.assertLogs('store.services.notifications', 'ERROR'):
+                notifications.dispatch_pending()
+        entry = NotificationOutbox.objects.get()
+        self.assertEqual(entry.status, NotificationOutbox.STATUS_DEAD)
+        self.assertIn('1:', entry.last_error)
+
+
+@override_settings(TELEGRAM_BOT_TOKEN='token', TELEGRAM_CHAT_IDS=['1'])
+class YooKassaWebhookTests(TestCase):
+    trusted_ip = '185.71.76.1'
+
+    def setUp(self):
+        self.order = Order.objects.create(
+            total_amount=Decimal('100.00'),
+            status=Order.STATUS_AWAITING,
+            payment_id='pay-1',
+        )
+
+    def _post(self, event='payment.succeeded', status='succeeded', ip=trusted_ip):
+        body = {
+            'type': 'notification',
+            'event': event,
+            'object': {'id': 'pay-1', 'status': status, 'metadata': {'order_id': str(self.order.id)}},
+        }
+        return self.client.post(
+            reverse('store:yookassa_webhook'),
+            data=json.dumps(body),
+            content_type='application/json',
+            REMOTE_ADDR=ip,
+        )
+
+    def test_trusted_event_marks_order_paid_and_enqueues_notification(self):
+        with mock.patch('store.views.fetch_payment') as fetch:
+            response = self._post()
+        fetch.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.STATUS_PAID)
+        self.assertEqual(NotificationOutbox.objects.filter(order=self.order).count(), 1)
+
+    def test_repeated_events_are_idempotent(self):
+        self._post()
+        self._post(event='payment.canceled', status='canceled')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.STATUS_PAID)
+        self.assertEqual(NotificationOutbox.objects.filter(order=self.order).count(), 1)
+
+    def test_untrusted_source_is_verified_by_refetch(self):
+        payment = mock.Mock(id='pay-1', status='canceled', metadata={})
+        with mock.patch('store.views.fetch_payment', return_value=payment) as fetch:
+            self._post(ip='10.0.0.1')
+        fetch.assert_called_once_with('pay-1')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.STATUS_CANCELED)
+
+    def test_malformed_body_is_rejected(self):
+        response = self.client.post(reverse('store:yookassa_webhook'), data='{}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_payment_success_renders_from_database(self):
+        session = self.client.session
+        session['last_payment_id'] = 'pay-1'
+        session.save()
+        with mock.patch('store.views.fetch_payment') as fetch:
+            response = self.client.get(reverse('store:payment_success'))
+        fetch.assert_not_called()
+        self.assertContains(response, f'Заказ #{self.order.id}')
+
+
+@override_settings(TELEGRAM_BOT_TOKEN='token', TELEGRAM_CHAT_IDS=['1'])
+class ReconcilePaymentsTests(TestCase):
+    def setUp(self):
+        statuses = {'pay-paid': 'succeeded', 'pay-canceled': 'canceled', 'pay-pending': 'pending'}
+        self.payments = {payment_id: mock.Mock(id=payment_id, status=status) for payment_id, status in statuses.items()}
+        for payment_id in statuses:
+            Order.objects.create(payment_id=payment_id, status=Order.STATUS_AWAITING)
+        Order.objects.update(created_at=timezone.now() - timedelta(hours=2))
+        self.fresh = Order.objects.create(payment_id='pay-fresh', status=Order.STATUS_AWAITING)
+
+    def _run(self, *args):
+        out = StringIO()
+        with mock.patch('store.services.reconciliation.fetch_payment', side_effect=self.payments.get) as fetch:
+            call_command('reconcile_payments', '--rate=0', '--batch-size=2', *args, stdout=out)
+        return fetch, out.getvalue()
+
+    def test_updates_stale_orders_in_batches(self):
+        fetch, output = self._run()
+        self.assertEqual(fetch.call_count, 3)
+        self.assertEqual(Order.objects.get(payment_id='pay-paid').status, Order.STATUS_PAID)
+        self.assertEqual(Order.objects.get(payment_id='pay-canceled').status, Order.STATUS_CANCELED)
+        self.assertEqual(Order.objects.get(payment_id='pay-pending').status, Order.STATUS_AWAITING)
+        self.assertEqual(Order.objects.get(payment_id='pay-fresh').status, Order.STATUS_AWAITING)
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+        self.assertIn('Checked 3 orders: 2 updated, 1 still awaiting, 0 errors', output)
+
+    def test_dry_run_saves_nothing(self):
+        _, output = self._run('--dry-run')
+        self.assertEqual(Order.objects.filter(status=Order.STATUS_AWAITING).count(), 4)
+        self.assertIn('[dry run]', output)
+
+
+def _increment_in_child():
+    metrics.record_order_transition(Order.STATUS_AWAITING, Order.STATUS_PAID)
+    metrics.YOOKASSA_CIRCUIT_OPEN.set(1)
+
+
+@override_settings(RATE_LIMITS={'store:add_to_cart': '2/m'})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        ratelimit.reset()
+        self.product = Product.objects.first()
+        self.url = reverse('store:add_to_cart', args=[self.product.slug])
+
+    def test_sliding_window_weights_the_previous_window(self):
+        self.assertEqual(ratelimit.parse_rate('5/10m'), (5, 600))
+        with self.assertRaises(ValueError):
+            ratelimit.parse_rate('5/fortnight')
+        results = [ratelimit.hit('scope', '1.2.3.4', '3/m', now=60.0 + second) for second in range(4)]
+        self.assertEqual(results, [None, None, None, 57])
+        # Halfway through the next window, half of the four earlier hits still count.
+        self.assertIsNone(ratelimit.hit('scope', '1.2.3.4', '3/m', now=150.0))
+        self.assertEqual(ratelimit.hit('scope', '1.2.3.4', '3/m', now=150.0), 30)
+        self.assertIsNone(ratelimit.hit('scope', '5.6.7.8', '3/m', now=150.0))
+
+    def test_check_costs_one_cache_round_trip(self):
+        ratelimit.hit('scope', 'ip', '10/m', now=61.0)
+        with mock.patch.object(cache, 'get', wraps=cache.get) as get:
+            ratelimit.hit('scope', 'ip', '10/m', now=62.0)
+        get.assert_not_called()
+
+    def test_limited_request_gets_429_before_any_query(self):
+        self.client.post(self.url)
+        self.client.post(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(int(response['Retry-After']) >= 1)
+        response = self.client.post(self.url, headers={'x-requested-with': 'XMLHttpRequest'})
+        self.assertEqual(response.json(), {'error': ratelimit.RATE_LIMITED_MESSAGE})
+        other = self.client.post(self.url, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(other.status_code, 302)
+
+    def test_decorator_and_cache_outage(self):
+        view = ratelimit.rate_limit('1/h', scope='test')(lambda request: HttpResponse('ok'))
+        request = RequestFactory().post('/')
+        self.assertEqual(view(request).status_code, 200)
+        self.assertEqual(view(request).status_code, 429)
+        with mock.patch.object(cache, 'incr', side_effect=ConnectionError):
+            with self.assertLogs('store.ratelimit', 'ERROR'):
+                self.assertEqual(view(request).status_code, 200)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_requests_are_timed_per_view_and_status(self):
+        product = Product.objects.first()
+        cache.clear()
+        self.client.get(reverse('store:product_detail', args=[product.slug]))
+        self.client.get('/no-such-page/')
+        with override_settings(METRICS_TOKEN='secret'):
+            response = self.client.get(reverse('store:metrics'), headers={'authorization': 'Bearer secret'})
+        body = response.content.decode()
+        self.assertIn('rml_http_request_duration_seconds_count{status="200",view="store:product_detail"} 1.0', body)
+        self.assertIn('rml_http_request_duration_seconds_bucket{le="+Inf",status="404",view="unmatched"} 1.0', body)
+        self.assertRegex(body, r'rml_db_queries_total\{view="store:product_detail"\} [1-9]')
+        # The scrape itself is in flight while the page is rendered.
+        self.assertIn('rml_http_requests_in_progress 1.0', body)
+
+    def test_dependency_calls_and_transitions(self):
+        order = Order.objects.create(total_amount=Decimal('10.00'))
+        with mock.patch.object(notifications.requests, 'post', side_effect=requests.ConnectionError):
+            with self.assertRaises(requests.ConnectionError):
+                notifications._send_telegram_message('token', '1', 'text')
+        update_order_status_from_payment(order, mock.Mock(status='succeeded'))
+        body = metrics.render()
+        self.assertIn(
+            'rml_dependency_duration_seconds_count{operation="sendMessage",outcome="error",service="telegram"} 1.0',
+            body,
+        )
+        self.assertIn('rml_order_status_transitions_total{from_status="pending",to_status="paid"} 1.0', body)
+
+    def test_token_is_required_when_configured(self):
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('store:metrics')).status_code, 403)
+            response = self.client.get(reverse('store:metrics'), headers={'authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+
+    def test_endpoint_is_hidden_without_token_unless_debug(self):
+        self.assertEqual(self.client.get(reverse('store:metrics')).status_code, 404)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('store:metrics')).status_code, 200)
+
+    def test_worker_processes_are_aggregated_through_shared_directory(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(METRICS_DIR=directory):
+            metrics.record_order_transition(Order.STATUS_AWAITING, Order.STATUS_PAID)
+            child = multiprocessing.get_context('fork').Process(target=_increment_in_child)
+            child.start()
+            child.join()
+            self.assertEqual(child.exitcode, 0)
+            body = metrics.render()
+            self.assertIn('rml_order_status_transitions_total{from_status="awaiting_confirmation",to_status="paid"} 2.0', body)
+            self.assertIn('rml_yookassa_circuit_open 1.0', body)
+            metrics.mark_process_dead(child.pid)
+            self.assertNotIn('rml_yookassa_circuit_open 1.0', metrics.render())
+
+
+class BenchmarkHarnessTests(TestCase):
+    def test_percentiles_use_nearest_rank(self):
+        summary = summarize([float(value) for value in range(100, 0, -1)])
+        self.assertEqual(
+            summary,
+            {'count': 100, 'p50_ms': 50.0, 'p95_ms': 95.0, 'p99_ms': 99.0, 'max_ms': 100.0},
+        )
+
+    def test_seeded_data_is_removed_afterwards(self):
+        products = seed_catalog(4)
+        self.assertEqual(seed_orders(30, products, batch_size=7), 30)
+        orders = Order.objects.filter(payment_id__startswith='bench-')
+        self.assertEqual(orders.count(), 30)
+        order = orders.prefetch_related('items').first()
+        self.assertEqual(order.total_amount, sum(item.line_total for item in order.items.all()))
+        remove_seeded()
+        self.assertFalse(Product.objects.filter(slug__startswith='bench-').exists())
+        self.assertFalse(orders.exists())
+
+    def test_order_query_benchmark_rolls_everything_back(self):
+        orders = Order.objects.count()
+        constraints = connection.introspection.get_constraints(connection.cursor(), 'store_order')
+        out = StringIO()
+        call_command('benchmark_order_queries', orders=40, batch_size=15, repeat=1, stdout=out)
+        for name in ('payment lookup', 'awaiting by age', 'paid, not notified', 'admin: status, month'):
+            self.assertIn(f'== {name}', out.getvalue())
+        self.assertIn('USING INDEX store_order_created_id_idx', out.getvalue())
+        self.assertEqual(Order.objects.count(), orders)
+        self.assertEqual(connection.introspection.get_constraints(connection.cursor(), 'store_order'), constraints)
+
+    @override_settings(DEBUG=True)
+    def test_only_the_database_decides_whether_benchmarks_may_run(self):
+        for name, disposable in [('rml', False), ('/srv/rml/db.sqlite3', False), ('test_rml', True), ('rml_bench', True)]:
+            with self.subTest(name=name), mock.patch.dict(connection.settings_dict, {'NAME': name}):
+                self.assertEqual(is_disposable_database(), disposable)
+
+    def test_order_query_benchmark_refuses_a_database_that_may_be_live(self):
+        with mock.patch.dict(connection.settings_dict, {'NAME': '/srv/rml/db.sqlite3'}):
+            with self.assertRaisesMessage(CommandError, '--i-know'):
+                call_command('benchmark_order_queries', orders=10, stdout=StringIO())
+        self.assertFalse(Order.objects.filter(payment_id__startswith='bench-').exists())
+
+
+class OrderCreationTests(TestCase):
+    def test_order_created_in_constant_queries_with_items_prepopulated(self):
+        products = list(Product.objects.all())
+        cart = cart_service.Cart(items=[cart_service.CartItem(product=product, quantity=2) for product in products])
+        # Savepoint, stock UPDATE, price SELECT, order INSERT, bulk INSERT and read of items, savepoint release.
+        with self.assertNumQueries(7):
+            order = order_service.create_order_from_cart(cart, metadata={'source': 'cart'})
+        with self.assertNumQueries(0):
+            summary = order.as_human_readable()
+        self.assertEqual(order.total_amount, sum(product.price * 2 for product in products))
+        self.assertEqual(len(order.cart_snapshot), len(products))
+        self.assertEqual(order.items.count(), len(products))
+        self.assertIn(products[0].name, summary)
+
+    def test_order_is_priced_from_the_database_not_the_cached_product(self):
+        product = Product.objects.first()
+        Product.objects.filter(id=product.id).update(price=product.price + 100, name='Новое имя')
+        cart = cart_service.Cart(items=[cart_service.CartItem(product=product, quantity=2)])
+        order = order_service.create_order_from_cart(cart)
+        item = order.items.get()
+        self.assertEqual((item.unit_price, item.product_name), (product.price + 100, 'Новое имя'))
+        self.assertEqual(order.total_amount, (product.price + 100) * 2)
+        self.assertEqual(order.cart_snapshot[0]['unit_price'], str(product.price + 100))
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.product, self.other = Product.objects.order_by('id')[:2]
+        Product.objects.filter(id=self.product.id).update(stock=3)
+        self.product.refresh_from_db()
+
+    def _order(self, quantity=1, *products):
+        items = [cart_service.CartItem(product=product, quantity=quantity) for product in products or [self.product]]
+        return order_service.create_order_from_cart(cart_service.Cart(items=items))
+
+    def _stock(self, product=None):
+        return Product.objects.values_list('stock', flat=True).get(id=(product or self.product).id)
+
+    def test_checkout_takes_stock_and_never_oversells(self):
+        order = self._order(2, self.product, self.other)
+        self.assertTrue(order.stock_reserved)
+        self.assertEqual(self._stock(), 1)
+        self.assertIsNone(self._stock(self.other))
+        with self.assertRaises(inventory.OutOfStock) as raised:
+            self._order(2, self.other, self.product)
+        self.assertEqual(raised.exception.short_product_ids(), [self.product.id])
+        self.assertEqual(self._stock(), 1)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_out_of_stock_checkout_redirects_to_cart(self):
+        Product.objects.filter(id=self.product.id).update(stock=0)
+        url = reverse('store:buy_product', args=[self.product.slug])
+        response = self.client.post(url, {'quantity': 1}, follow=True)
+        self.assertRedirects(response, reverse('store:cart'))
+        self.assertContains(response, f'Недостаточно товара на складе: {self.product.name}')
+        self.assertFalse(Order.objects.exists())
+
+    def test_failed_payment_releases_stock_once(self):
+        order = self._order(2)
+        Order.objects.filter(id=order.id).update(status=Order.STATUS_AWAITING, payment_id='pay-stock')
+        apply_payment(mock.Mock(id='pay-stock', status='canceled', metadata={}))
+        self.assertEqual(self._stock(), 3)
+        self.assertFalse(inventory.release_order(order))
+        self.assertEqual(self._stock(), 3)
+
+    def test_expired_reservation_is_released_and_late_payment_takes_it_again(self):
+        order = self._order(2)
+        Order.objects.filter(id=order.id).update(
+            status=Order.STATUS_AWAITING, payment_id='pay-late', created_at=timezone.now() - timedelta(hours=2)
+        )
+        out = StringIO()
+        call_command('release_expired_reservations', '--older-than=60', stdout=out)
+        self.assertIn('Released stock of 1 unpaid orders', out.getvalue())
+        self.assertEqual(self._stock(), 3)
+        apply_payment(mock.Mock(id='pay-late', status='succeeded', metadata={}))
+        self.assertEqual(self._stock(), 1)
+        self.assertTrue(Order.objects.get(id=order.id).stock_reserved)
+
+
+class StockContentionTests(TransactionTestCase):
+    serialized_rollback = True
+
+    def test_parallel_checkouts_of_a_hot_product_do_not_oversell(self):
+        out = StringIO()
+        # The command fails if more units were sold than stocked or the remaining stock does not add up.
+        call_command('benchmark_stock_contention', checkouts=60, workers=6, stock=25, stdout=out, stderr=StringIO())
+        # The in-memory SQLite test database rejects some concurrent writers outright; PostgreSQL queues them.
+        self.assertRegex(out.getvalue(), r'reserved=\d+')
+        self.assertIn('oversold=0', out.getvalue())
+        self.assertFalse(Order.objects.exists())
+
+    def test_refuses_a_database_that_may_be_live(self):
+        with mock.patch.dict(connection.settings_dict, {'NAME': 'rml'}):
+            with self.assertRaisesMessage(CommandError, '--i-know'):
+                call_command('benchmark_stock_contention', stdout=StringIO(), stderr=StringIO())
+        self.assertFalse(Product.objects.filter(slug__startswith='bench-').exists())
+
+
+class LoadtestCheckoutTests(TransactionTestCase):
+    serialized_rollback = True
+
+    def test_run_leaves_no_orders_or_products_behind(self):
+        products = Product.objects.count()
+        out = StringIO()
+        call_command('loadtest_checkout', '--requests=4', '--concurrency=2', '--latency=0', stdout=out)
+        self.assertIn('statuses: 302=4', out.getvalue())
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.count(), products)
+
+    def test_refuses_a_database_that_may_be_live(self):
+        with mock.patch.dict(connection.settings_dict, {'NAME': 'rml'}):
+            with self.assertRaisesMessage(CommandError, '--i-know'):
+                call_command('loadtest_checkout', stdout=StringIO())
+        self.assertFalse(Product.objects.filter(slug__startswith='bench-').exists())
+
+
+class BenchmarkScenarioTests(TransactionTestCase):
+    serialized_rollback = True
+
+    def test_orders_without_a_payment_are_removed_too(self):
+        orders = Order.objects.count()
+        products = Product.objects.count()
+        call_command(
+            'benchmark_scenario',
+            '--users=1',
+            '--iterations=2',
+            '--products=3',
+            '--orders=5',
+            '--yookassa-latency=0',
+            '--telegram-latency=0',
+            '--error-rate=1',
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+        self.assertEqual(Order.objects.count(), orders)
+        self.assertEqual(Product.objects.count(), products)
+
+    def test_refuses_a_database_that_may_be_live(self):
+        with mock.patch.dict(connection.settings_dict, {'NAME': 'rml'}):
+            with self.assertRaisesMessage(CommandError, '--i-know'):
+                call_command('benchmark_scenario', stdout=StringIO(), stderr=StringIO())
+        self.assertFalse(Product.objects.filter(slug__startswith='bench-').exists())
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.products = list(Product.objects.all())[:2]
+
+    def _paid_order(self, quantities, days_ago=0):
+        cart = cart_service.Cart(
+            items=[cart_service.CartItem(product=product, quantity=qty) for product, qty in zip(self.products, quantities)]
+        )
+        order = order_service.create_order_from_cart(cart)
+        Order.objects.filter(pk=order.pk).update(
+            created_at=timezone.now() - timedelta(days=days_ago), status=Order.STATUS_AWAITING, payment_id=f'pay-{order.pk}'
+        )
+        apply_payment(mock.Mock(id=f'pay-{order.pk}', status='succeeded', metadata={}))
+        apply_payment(mock.Mock(id=f'pay-{order.pk}', status='succeeded', metadata={}))
+        return order
+
+    def _snapshot(self):
+        daily = list(DailySales.objects.values_list('day', 'orders', 'quantity', 'revenue').order_by('day'))
+        products = list(
+            DailyProductSales.objects.values_list('day', 'product_id', 'orders', 'quantity', 'revenue').order_by(
+                'day', 'product_id'
+            )
+        )
+        return daily, products
+
+    def test_paid_orders_are_counted_once(self):
+        first = self._paid_order([1, 2])
+        self._paid_order([3])
+        today = DailySales.objects.get(day=timezone.localdate())
+        self.assertEqual((today.orders, today.quantity), (2, 6))
+        product = DailyProductSales.objects.get(day=today.day, product=self.products[0])
+        self.assertEqual((product.orders, product.quantity), (2, 4))
+        self.assertEqual(today.revenue, first.total_amount + self.products[0].price * 3)
+
+    def test_rollup_queries_do_not_grow_with_order_size(self):
+        self.products = list(Product.objects.all())[:3]
+        self._paid_order([1, 1, 1])
+        counts = []
+        for quantities in ([1], [1, 2, 3]):
+            cart = cart_service.Cart(
+                items=[cart_service.CartItem(product=product, quantity=qty) for product, qty in zip(self.products, quantities)]
+            )
+            order = order_service.create_order_from_cart(cart)
+            with CaptureQueriesContext(connection) as queries:
+                sales.record_paid_order(order)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        product = DailyProductSales.objects.get(day=timezone.localdate(), product=self.products[2])
+        self.assertEqual((product.orders, product.quantity), (2, 4))
+
+    def test_removed_benchmark_orders_leave_the_rollups(self):
+        self._paid_order([1, 2])
+        before = self._snapshot()
+        benchmark = self._paid_order([2, 1], days_ago=2)
+        Order.objects.filter(pk=benchmark.pk).update(payment_id=f'loadtest-{benchmark.pk}')
+        self.assertNotEqual(self._snapshot(), before)
+        remove_orders(Order.objects.filter(payment_id__startswith='loadtest-'))
+        self.assertEqual(self._snapshot(), before)
+
+    def test_rebuild_in_chunks_matches_incremental_rollups(self):
+        self._paid_order([1, 1], days_ago=10)
+        self._paid_order([2], days_ago=3)
+        self._paid_order([1, 4])
+        Order.objects.create(total_amount=Decimal('10.00'))
+        incremental = self._snapshot()
+        DailyProductSales.objects.create(day=timezone.localdate(), product_name='stale', quantity=99)
+        out = StringIO()
+        call_command('rebuild_sales_rollups', '--chunk-days=4', stdout=out)
+        self.assertEqual(self._snapshot(), incremental)
+        self.assertIn('Rebuilt 11 days', out.getvalue())
+
+    def test_dashboard_reads_only_rollups(self):
+        self._paid_order([1, 2])
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:store_dailysales_changelist'), {'days': 30})
+        self.assertContains(response, self.products[1].name)
+        self.assertEqual(response.context['totals']['orders'], 1)
+        self.assertFalse([query for query in queries if 'store_order' in query['sql']])
+
+
+class OrderExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        products = list(Product.objects.all())[:2]
+        cart = cart_service.Cart(items=[cart_service.CartItem(product=product, quantity=2) for product in products])
+        cls.orders = [
+            order_service.create_order_from_cart(cart, metadata={'source': 'cart', 'customer_name': 'Анна'})
+            for _ in range(5)
+        ]
+        Order.objects.filter(pk=cls.orders[0].pk).update(created_at=timezone.now() - timedelta(days=40))
+        legacy = Order.objects.create(
+            total_amount=Decimal('100.00'),
+            cart_snapshot=[{'product_id': products[0].id, 'product_name': 'Болеро', 'quantity': 1, 'unit_price': '100.00'}],
+        )
+        cls.orders.append(legacy)
+
+    def test_csv_has_one_row_per_line_within_range(self):
+        out = StringIO()
+        since = (timezone.localdate() - timedelta(days=7)).isoformat()
+        call_command('export_orders', f'--since={since}', stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual(len(rows), 4 * 2 + 1)
+        self.assertNotIn(str(self.orders[0].id), {row['order_id'] for row in rows})
+        first = rows[0]
+        self.assertEqual(first['customer_name'], 'Анна')
+        self.assertEqual(Decimal(first['line_total']), Decimal(first['unit_price']) * 2)
+        legacy = rows[-1]
+        self.assertEqual((legacy['product_name'], legacy['quantity'], legacy['line_total']), ('Болеро', '1', ''))
+
+    def test_items_are_prefetched_per_chunk(self):
+        # One query for the orders, one per chunk of two for their items.
+        with self.assertNumQueries(1 + 3):
+            lines = list(exports.jsonl_lines(Order.objects.all(), chunk_size=2))
+        self.assertEqual(len(lines), len(self.orders))
+
+    def test_status_filter_and_file_output(self):
+        Order.objects.filter(pk=self.orders[1].pk).update(status=Order.STATUS_PAID)
+        path = Path(tempfile.mkdtemp()) / 'orders.jsonl'
+        self.addCleanup(shutil.rmtree, path.parent)
+        call_command('export_orders', status=['paid'], format='jsonl', output=str(path), stderr=StringIO())
+        records = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+        self.assertEqual([record['order_id'] for record in records], [self.orders[1].id])
+
+
+class OrderAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        products = list(Product.objects.all())
+        cls.orders = []
+        for index in range(5):
+            items = [cart_service.CartItem(product=product, quantity=1) for product in products[: index % 2 + 1]]
+            cls.orders.append(
+                order_service.create_order_from_cart(
+                    cart_service.Cart(items=items), metadata={'customer_name': f'Покупатель {index}'}
+                )
+            )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('admin:store_order_changelist')
+
+    def test_changelist_pages_by_cursor(self):
+        seen = []
+        url = self.url
+        with mock.patch.object(OrderAdmin, 'list_per_page', 2):
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                changelist = response.context['cl']
+                seen.extend(order.id for order in changelist.result_list)
+                url = changelist.next_page_url and self.url + changelist.next_page_url
+        newest_first = sorted(self.orders, key=lambda order: (order.created_at, order.id), reverse=True)
+        self.assertEqual(seen, [order.id for order in newest_first])
+        self.assertContains(response, 'Покупатель 0')
+        self.assertEqual(changelist.result_list[0].items_count, 1)
+
+    def test_changelist_queries_do_not_grow_with_page_size(self):
+        def count_queries(per_page):
+            with mock.patch.object(OrderAdmin, 'list_per_page', per_page):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(self.url)
+            return len(queries)
+
+        count_queries(1)
+        self.assertEqual(count_queries(1), count_queries(5))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'cursor': 'garbage'})
+        self.assertRedirects(response, self.url + '?e=1', fetch_redirect_response=False)
+
+    def test_search_matches_order_number_or_payment_id_exactly(self):
+        order = self.orders[0]
+        Order.objects.filter(pk=order.pk).update(payment_id='pay-123')
+        for term in (f'#{order.id}', 'pay-123'):
+            response = self.client.get(self.url, {'q': term})
+            self.assertEqual([row.id for row in response.context['cl'].result_list], [order.id])
+        response = self.client.get(self.url, {'q': 'pay-'})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+
+    def test_large_tables_use_the_planner_estimate(self):
+        with mock.patch('store.admin.estimate_count', return_value=250000):
+            response = self.client.get(self.url)
+        self.assertEqual(response.context['cl'].result_count, 250000)
+        self.assertContains(response, '≈ 250000')
+
+    def test_export_action_streams_selected_orders(self):
+        selected = self.orders[:2]
+        response = self.client.post(
+            self.url,
+            {'action': 'export_jsonl', '_selected_action': [order.id for order in selected]},
+        )
+        self.assertIsInstance(response, StreamingHttpResponse)
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([record['order_id'] for record in records], [order.id for order in selected])
+        self.assertEqual(records[1]['metadata']['customer_name'], 'Покупатель 1')
+        self.assertEqual(len(records[1]['lines']), 2)
+
+    def test_change_view_queries_do_not_grow_with_items(self):
+        def count_queries(order):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('admin:store_order_change', args=[order.id]))
+            return len(queries)
+
+        count_queries(self.orders[0])  # Warms the content type cache.
+        self.assertEqual(count_queries(self.orders[0]), count_queries(self.orders[1]))
+
+
+@override_settings(
+    YOOKASSA_SHOP_ID='shop',
+    YOOKASSA_SECRET_KEY='secret',
+    YOOKASSA_BREAKER_FAILURE_THRESHOLD=2,
+    YOOKASSA_BREAKER_RESET_TIMEOUT=60,
+)
+class YooKassaClientTests(TestCase):
+    def setUp(self):
+        yookassa_client.reset_client()
+
+    def _response(self, status_code, body=None):
+        response = mock.Mock(status_code=status_code)
+        response.json.return_value = body or {'type': 'error', 'code': 'internal_server_error'}
+        return response
+
+    def test_client_is_shared_and_uses_timeouts(self):
+        client = yookassa_client.get_client()
+        self.assertIs(yookassa_client.get_client(), client)
+        payload = {'id': 'pay-1', 'status': 'pending'}
+        with mock.patch.object(client.session, 'request', return_value=self._response(200, payload)) as request:
+            payment = client.find_payment('pay-1')
+        self.assertEqual(payment.status, 'pending')
+        self.assertEqual(request.call_args.kwargs['timeout'], client.timeout)
+        self.assertEqual(client.metrics()['calls']['payment_find_one']['calls'], 1)
+
+    def test_breaker_opens_and_fails_fast(self):
+        client = yookassa_client.get_client()
+        with mock.patch.object(client.session, 'request', side_effect=requests.ConnectTimeout) as request:
+            with self.assertRaises(requests.ConnectTimeout):
+                client.find_payment('pay-1')
+            with self.assertRaises(requests.ConnectTimeout), self.assertLogs(yookassa_client.logger, 'WARNING'):
+                client.find_payment('pay-1')
+            with self.assertRaises(yookassa_client.PaymentProviderUnavailable):
+                client.find_payment('pay-1')
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(client.metrics()['breaker_state'], yookassa_client.CircuitBreaker.OPEN)
+
+    def test_half_open_probe_closes_breaker(self):
+        breaker = yookassa_client.CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        with self.assertLogs(yookassa_client.logger, 'WARNING'):
+            breaker.record_failure()
+        breaker.before_call()
+        with self.assertRaises(yookassa_client.PaymentProviderUnavailable):
+            breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, yookassa_client.CircuitBreaker.CLOSED)
+
+    def test_interrupted_probe_does_not_block_the_breaker(self):
+        client = yookassa_client.get_client()
+        client.breaker.reset_timeout = 0
+        with mock.patch.object(client.session, 'request', side_effect=requests.ConnectTimeout):
+            with self.assertLogs(yookassa_client.logger, 'WARNING'):
+                for _ in range(2):
+                    with self.assertRaises(requests.ConnectTimeout):
+                        client.find_payment('pay-1')
+        # The probe is cancelled with its request and never reports back.
+        with mock.patch.object(client.session, 'request', side_effect=asyncio.CancelledError):
+            with self.assertRaises(asyncio.CancelledError):
+                client.find_payment('pay-1')
+        payload = {'id': 'pay-1', 'status': 'pending'}
+        with mock.patch.object(client.session, 'request', return_value=self._response(200, payload)):
+            self.assertEqual(client.find_payment('pay-1').status, 'pending')
+        self.assertEqual(client.metrics()['breaker_state'], yookassa_client.CircuitBreaker.CLOSED)
+
+    def test_checkout_fails_fast_with_friendly_message(self):
+        product = Product.objects.first()
+        with mock.patch('store.views.acreate_payment', side_effect=yookassa_client.PaymentProviderUnavailable):
+            response = self.client.post(reverse('store:buy_product', args=[product.slug]), follow=True)
+        self.assertContains(response, 'Платежный сервис временно недоступен')
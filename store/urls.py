@@ -6,13 +6,19 @@ app_name = 'store'
 
 urlpatterns = [
     path('', views.index, name='catalog'),
+    path('catalog/more/', views.catalog_more, name='catalog_more'),
     path('product/<slug:slug>/', views.product_detail, name='product_detail'),
+    path('search/', views.search, name='search'),
+    path('search/autocomplete/', views.search_autocomplete, name='search_autocomplete'),
     path('cart/', views.cart_view, name='cart'),
+    path('cart/batch/', views.cart_batch, name='cart_batch'),
     path('cart/add/<slug:slug>/', views.add_to_cart, name='add_to_cart'),
     path('cart/remove/<slug:slug>/', views.remove_from_cart, name='remove_from_cart'),
     path('checkout/', views.checkout, name='checkout'),
     path('checkout/submit/', views.checkout_submit, name='checkout_submit'),
     path('buy/<slug:slug>/', views.buy_product, name='buy_product'),
     path('payment/success/', views.payment_success, name='payment_success'),
+    path('payment/webhook/', views.yookassa_webhook, name='yookassa_webhook'),
     path('partnership/submit/', views.partnership_submit, name='partnership_submit'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
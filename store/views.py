@@ -1,20 +1,42 @@
 from __future__ import annotations
 
+import json
+import logging
 from decimal import Decimal
-from typing import Any, Optional
+from typing import Optional, Set
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
-from django.db import transaction
-from django.http import HttpRequest, HttpResponse, JsonResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
+from django.shortcuts import redirect, render
 from django.urls import reverse
-from django.views.decorators.http import require_POST
-
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from yookassa.domain.common.security_helper import SecurityHelper
+from yookassa.domain.response import PaymentResponse
+
+from store import metrics
 from store.forms import OrderDetailsForm, PartnershipForm
-from store.models import Order, OrderItem, Product
+from store.models import Order, Product
 from store.services import cart as cart_service
-from store.services.notifications import notify_order_paid, notify_partnership
-from store.services.payments import create_payment, fetch_payment, update_order_status_from_payment
+from store.services import catalog, inventory, page_cache
+from store.services import orders as order_service
+from store.services import search as search_service
+from store.services.cart_storage import CartTooLarge
+from store.services.inventory import OutOfStock
+from store.services.notifications import notify_partnership
+from store.services.payments import acreate_payment, apply_payment, fetch_payment
+from store.services.yookassa_client import PaymentProviderUnavailable
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PAYMENT_EVENTS = {'payment.succeeded', 'payment.canceled'}
+CART_BATCH_MAX_OPERATIONS = 50
+AUTOCOMPLETE_MAX_AGE = 60
+CART_TOO_LARGE_MESSAGE = 'В корзине слишком много разных товаров. Оформите заказ или уберите часть позиций.'
 
 
 def _is_ajax(request: HttpRequest) -> bool:
@@ -42,26 +64,82 @@ def _build_cart_payload(cart: cart_service.Cart, item: Optional[cart_service.Car
     return payload
 
 
-def index(request: HttpRequest) -> HttpResponse:
-    products = Product.objects.prefetch_related('images').all()
-    first_line_products = [product for product in products if product.first_line]
-    second_line_products = [product for product in products if not product.first_line]
-    return render(
-        request,
-        'store/index.html',
+def _build_cart_delta(cart: cart_service.Cart, changed: Set[int]) -> dict:
+    payload = _build_cart_payload(cart)
+    items = {item.product.id: item for item in cart.items if item.product.id in changed}
+    payload['items'] = [
         {
-            'first_line_products': first_line_products,
-            'second_line_products': second_line_products,
-            'partnership_form': PartnershipForm(),
-        },
-    )
+            'product_id': item.product.id,
+            'quantity': item.quantity,
+            'total_price': _format_amount(item.total_price),
+        }
+        for item in items.values()
+    ]
+    payload['removed'] = sorted(changed - items.keys())
+    return payload
+
+
+def _get_product_or_404(slug: str) -> Product:
+    product = catalog.get_product_by_slug(slug)
+    if product is None:
+        raise Http404('Product not found')
+    return product
+
 
+def _more_url(line: str, page: catalog.CatalogPage) -> Optional[str]:
+    if page.next_after is None:
+        return None
+    return f"{reverse('store:catalog_more')}?line={line}&after={page.next_after}"
 
+
+def _catalog_context() -> dict:
+    context = {'partnership_form': PartnershipForm()}
+    for line, page in catalog.get_catalog_lines().items():
+        context[f'{line}_line_products'] = page.products
+        context[f'{line}_line_more_url'] = _more_url(line, page)
+    return context
+
+
+@page_cache.conditional_page
+def index(request: HttpRequest) -> HttpResponse:
+    return page_cache.render_cached(request, 'store/index.html', _catalog_context)
+
+
+@require_GET
+def catalog_more(request: HttpRequest) -> HttpResponse:
+    line = request.GET.get('line')
+    try:
+        after = int(request.GET.get('after', ''))
+    except ValueError:
+        raise Http404('Invalid cursor') from None
+    if line not in catalog.LINES:
+        raise Http404('Unknown catalog line')
+    page = catalog.get_catalog_page(catalog.LINES[line], after=after)
+    context = {'products': page.products, 'more_url': _more_url(line, page), 'next_url': reverse('store:catalog')}
+    return render(request, 'store/partials/product_cards.html', context)
+
+
+@page_cache.conditional_page
 def product_detail(request: HttpRequest, slug: str) -> HttpResponse:
-    product = get_object_or_404(Product.objects.prefetch_related('images'), slug=slug)
+    product = _get_product_or_404(slug)
     return render(request, 'store/product_detail.html', {'product': product})
 
 
+@require_GET
+def search(request: HttpRequest) -> HttpResponse:
+    query = request.GET.get('q', '').strip()
+    products = search_service.search_products(query)
+    return render(request, 'store/search.html', {'query': query, 'products': products})
+
+
+@require_GET
+def search_autocomplete(request: HttpRequest) -> HttpResponse:
+    response = JsonResponse({'suggestions': search_service.autocomplete(request.GET.get('q', ''))})
+    # Identical for every visitor, so browsers and proxies may reuse it while the user keeps typing.
+    patch_cache_control(response, public=True, max_age=AUTOCOMPLETE_MAX_AGE)
+    return response
+
+
 def cart_view(request: HttpRequest) -> HttpResponse:
     cart = cart_service.get_cart(request)
     return render(request, 'store/cart.html', {'cart': cart})
@@ -69,10 +147,16 @@ def cart_view(request: HttpRequest) -> HttpResponse:
 
 @require_POST
 def add_to_cart(request: HttpRequest, slug: str) -> HttpResponse:
-    product = get_object_or_404(Product, slug=slug)
+    product = _get_product_or_404(slug)
     quantity = max(int(request.POST.get('quantity', 1)), 1)
     replace = request.POST.get('replace') == '1'
-    cart = cart_service.add_to_cart(request, product.id, quantity, replace=replace)
+    try:
+        cart = cart_service.add_to_cart(request, product.id, quantity, replace=replace)
+    except CartTooLarge:
+        if _is_ajax(request):
+            return JsonResponse({'error': CART_TOO_LARGE_MESSAGE}, status=400)
+        messages.error(request, CART_TOO_LARGE_MESSAGE)
+        return redirect(reverse('store:cart'))
     if _is_ajax(request):
         item = next((entry for entry in cart.items if entry.product.id == product.id), None)
         return JsonResponse(_build_cart_payload(cart, item=item))
@@ -80,9 +164,26 @@ def add_to_cart(request: HttpRequest, slug: str) -> HttpResponse:
     return redirect(request.POST.get('next') or reverse('store:cart'))
 
 
+@require_POST
+def cart_batch(request: HttpRequest) -> HttpResponse:
+    try:
+        operations = json.loads(request.body)['operations']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Ожидается JSON с полем operations'}, status=400)
+    if not isinstance(operations, list) or len(operations) > CART_BATCH_MAX_OPERATIONS:
+        return JsonResponse({'error': 'Некорректный список операций'}, status=400)
+    try:
+        cart, changed = cart_service.apply_operations(request, operations)
+    except CartTooLarge:
+        return JsonResponse({'error': CART_TOO_LARGE_MESSAGE}, status=400)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse(_build_cart_delta(cart, changed))
+
+
 @require_POST
 def remove_from_cart(request: HttpRequest, slug: str) -> HttpResponse:
-    product = get_object_or_404(Product, slug=slug)
+    product = _get_product_or_404(slug)
     cart = cart_service.remove_from_cart(request, product.id)
     if _is_ajax(request):
         payload = _build_cart_payload(cart)
@@ -93,35 +194,20 @@ def remove_from_cart(request: HttpRequest, slug: str) -> HttpResponse:
     return redirect(reverse('store:cart'))
 
 
-def _build_order_from_cart(cart: cart_service.Cart, metadata: Optional[dict] = None) -> Order:
-    metadata = metadata or {}
-    with transaction.atomic():
-        order = Order.objects.create(
-            total_amount=cart.total_amount,
-            currency='RUB',
-            metadata=metadata,
-            cart_snapshot=cart_service.serialize_cart(cart),
-        )
-        for item in cart.items:
-            OrderItem.objects.create(
-                order=order,
-                product=item.product,
-                product_name=item.product.name,
-                unit_price=item.product.price,
-                quantity=item.quantity,
-            )
-    return order
-
-
-def _start_payment_flow(request: HttpRequest, order: Order) -> HttpResponse:
+async def _start_payment_flow(request: HttpRequest, order: Order) -> HttpResponse:
     return_url = request.build_absolute_uri(reverse('store:payment_success'))
     description = f'Заказ #{order.id} в RML'
     try:
-        payment = create_payment(order, return_url=return_url, description=description)
+        payment = await acreate_payment(order, return_url=return_url, description=description)
+    except PaymentProviderUnavailable:
+        await sync_to_async(inventory.release_order)(order)
+        messages.error(request, 'Платежный сервис временно недоступен. Попробуйте оформить заказ через несколько минут.')
+        return redirect(reverse('store:cart'))
     except Exception as error:  # noqa: BLE001
+        await sync_to_async(inventory.release_order)(order)
         messages.error(request, f'Не удалось создать оплату: {error}')
         return redirect(reverse('store:cart'))
-    request.session['last_payment_id'] = payment.id
+    await request.session.aset('last_payment_id', payment.id)
     confirmation_url = getattr(payment.confirmation, 'confirmation_url', None)
     if confirmation_url:
         return redirect(confirmation_url)
@@ -129,6 +215,13 @@ def _start_payment_flow(request: HttpRequest, order: Order) -> HttpResponse:
     return redirect(reverse('store:cart'))
 
 
+def _out_of_stock_redirect(request: HttpRequest, cart: cart_service.Cart, error: OutOfStock) -> HttpResponse:
+    short = error.short_product_ids()
+    names = ', '.join(item.product.name for item in cart.items if item.product.id in short)
+    messages.error(request, f'Недостаточно товара на складе: {names}. Уменьшите количество и попробуйте снова.')
+    return redirect(reverse('store:cart'))
+
+
 def checkout(request: HttpRequest) -> HttpResponse:
     cart = cart_service.get_cart(request)
     if not cart.items:
@@ -145,14 +238,14 @@ def checkout(request: HttpRequest) -> HttpResponse:
 
 
 @require_POST
-def checkout_submit(request: HttpRequest) -> HttpResponse:
-    cart = cart_service.get_cart(request)
+async def checkout_submit(request: HttpRequest) -> HttpResponse:
+    cart = await sync_to_async(cart_service.get_cart)(request)
     if not cart.items:
         messages.error(request, 'Корзина пуста')
         return redirect(reverse('store:catalog'))
     form = OrderDetailsForm(request.POST)
     if not form.is_valid():
-        return render(
+        return await sync_to_async(render)(
             request,
             'store/checkout.html',
             {
@@ -166,48 +259,87 @@ def checkout_submit(request: HttpRequest) -> HttpResponse:
         'customer_phone': form.cleaned_data['phone'],
         'customer_address': form.cleaned_data['address'],
     }
-    order = _build_order_from_cart(cart, metadata=metadata)
-    return _start_payment_flow(request, order)
+    try:
+        order = await order_service.acreate_order_from_cart(cart, metadata=metadata)
+    except OutOfStock as error:
+        return await sync_to_async(_out_of_stock_redirect)(request, cart, error)
+    return await _start_payment_flow(request, order)
 
 
 @require_POST
-def buy_product(request: HttpRequest, slug: str) -> HttpResponse:
-    product = get_object_or_404(Product, slug=slug)
+async def buy_product(request: HttpRequest, slug: str) -> HttpResponse:
+    product = await sync_to_async(_get_product_or_404)(slug)
     quantity = max(int(request.POST.get('quantity', 1)), 1)
     cart = cart_service.Cart(items=[cart_service.CartItem(product=product, quantity=quantity)])
-    order = _build_order_from_cart(cart, metadata={'source': 'product', 'product_slug': product.slug})
-    return _start_payment_flow(request, order)
+    try:
+        order = await order_service.acreate_order_from_cart(
+            cart, metadata={'source': 'product', 'product_slug': product.slug}
+        )
+    except OutOfStock as error:
+        return await sync_to_async(_out_of_stock_redirect)(request, cart, error)
+    return await _start_payment_flow(request, order)
 
 
-def _resolve_payment_id(request: HttpRequest) -> Optional[str]:
-    return request.GET.get('paymentId') or request.GET.get('payment_id') or request.session.get('last_payment_id')
+async def _resolve_payment_id(request: HttpRequest) -> Optional[str]:
+    return (
+        request.GET.get('paymentId')
+        or request.GET.get('payment_id')
+        or await request.session.aget('last_payment_id')
+    )
 
 
-def payment_success(request: HttpRequest) -> HttpResponse:
-    payment_id = _resolve_payment_id(request)
-    order = Order.objects.filter(payment_id=payment_id).first()
-    payment: Optional[Any] = None
+async def payment_success(request: HttpRequest) -> HttpResponse:
+    payment_id = await _resolve_payment_id(request)
+    order = None
     if payment_id:
-        try:
-            payment = fetch_payment(payment_id)
-        except Exception as error:  # noqa: BLE001
-            messages.warning(request, f'Не удалось обновить статус оплаты: {error}')
-    if payment and not order:
-        metadata = getattr(payment, 'metadata', {}) or {}
-        order_id = metadata.get('order_id') if hasattr(metadata, 'get') else None
-        if order_id:
-            order = Order.objects.filter(id=order_id).first()
-    if payment and order:
-        order = update_order_status_from_payment(order, payment)
-        if order.status == Order.STATUS_PAID and not order.notified_at:
-            notify_order_paid(order)
-        cart_service.clear_cart(request)
+        order = await Order.objects.filter(payment_id=payment_id).prefetch_related('items').afirst()
+    if order:
+        await sync_to_async(cart_service.clear_cart)(request)
     context = {
         'order': order,
         'payment_id': payment_id,
-        'payment_status': getattr(payment, 'status', None),
     }
-    return render(request, 'store/payment_success.html', context)
+    return await sync_to_async(render)(request, 'store/payment_success.html', context)
+
+
+def _webhook_client_ip(request: HttpRequest) -> str:
+    value = request.META.get(settings.YOOKASSA_WEBHOOK_IP_HEADER, '')
+    return value.split(',')[0].strip()
+
+
+def _is_trusted_webhook_source(request: HttpRequest) -> bool:
+    ip = _webhook_client_ip(request)
+    try:
+        return bool(ip) and SecurityHelper().is_ip_trusted(ip)
+    except Exception:  # noqa: BLE001
+        return False
+
+
+@csrf_exempt
+@require_POST
+def yookassa_webhook(request: HttpRequest) -> HttpResponse:
+    try:
+        event = json.loads(request.body)
+        event_type = event['event']
+        payment_data = event['object']
+        payment_id = payment_data['id']
+    except (ValueError, KeyError, TypeError):
+        return HttpResponse(status=400)
+    if event_type not in WEBHOOK_PAYMENT_EVENTS:
+        return HttpResponse(status=200)
+    if _is_trusted_webhook_source(request):
+        payment = PaymentResponse(payment_data)
+    else:
+        # Never trust the body from an unknown source: ask YooKassa for the real state.
+        try:
+            payment = fetch_payment(payment_id)
+        except Exception:  # noqa: BLE001
+            logger.exception('Failed to verify YooKassa webhook for payment %s', payment_id)
+            return HttpResponse(status=503)
+    order = apply_payment(payment) if payment else None
+    if not order:
+        logger.warning('YooKassa webhook for unknown payment %s', payment_id)
+    return HttpResponse(status=200)
 
 
 @require_POST
@@ -226,4 +358,16 @@ def partnership_submit(request: HttpRequest) -> HttpResponse:
     messages.success(request, 'Спасибо! Мы получили заявку и свяжемся с вами.')
     return redirect(f"{reverse('store:catalog')}#partnership")
 
+
+@require_GET
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    token = settings.METRICS_TOKEN
+    if not token:
+        # Route names, order transitions and the breaker state are not for the public.
+        if not settings.DEBUG:
+            raise Http404
+    elif not constant_time_compare(request.headers.get('authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 # Create your views here.